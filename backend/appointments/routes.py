@@ -1,23 +1,40 @@
 from flask import Blueprint, request, jsonify
 from models import Appointment, db
+from stats.counters import apply_change, appointment_snapshot
+from events.hub import emit_change
+from writes import insert_returning, update_returning, write_error
+from schemas import Schema, Field, accepts, integer, string, boolean, timestamp
+from sqlalchemy.exc import IntegrityError
 
 appointments_bp = Blueprint('appointments', __name__)
 
+APPOINTMENT_REFERENCES = {'patient_id': 'Patient not found', 'doctor_id': 'Doctor not found'}
+
+APPOINTMENT_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'doctor_id': Field(integer, required=True),
+    'start_time': Field(timestamp, required=True),
+    'end_time': Field(timestamp, required=True),
+    'location': Field(string(200)),
+})
+APPOINTMENT_UPDATE_SCHEMA = Schema({
+    **APPOINTMENT_SCHEMA.partial('patient_id', 'doctor_id', 'start_time', 'end_time', 'location').fields,
+    'active': Field(boolean, nullable=False),
+})
+
 @appointments_bp.route('/', methods=['POST'])
-def create_appointment():
-    data = request.get_json()
+@accepts(APPOINTMENT_SCHEMA)
+def create_appointment(data):
+    if data['end_time'] < data['start_time']:
+        return jsonify({'error': 'end_time must not be before start_time'}), 400
     try:
-        appointment = Appointment(
-            patient_id=data['patient_id'],
-            doctor_id=data['doctor_id'],
-            start_time=data['start_time'],
-            end_time=data['end_time'],
-            location=data.get('location'),
-            active=True
-        )
-        db.session.add(appointment)
+        appointment = insert_returning(Appointment, {**data, 'active': True})
+        apply_change(after=appointment_snapshot(appointment))
+        emit_change('appointments', 'created', appointment.aid, appointment.patient_id)
         db.session.commit()
         return jsonify({'message': 'Appointment created', 'aid': appointment.aid}), 201
+    except IntegrityError as e:
+        return write_error(e, APPOINTMENT_REFERENCES)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -40,7 +57,10 @@ def get_appointment(aid):
 
 @appointments_bp.route('/', methods=['GET'])
 def list_appointments():
-    appointments = Appointment.query.all()
+    query = Appointment.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    appointments = query.all()
     return jsonify([
         {
             'aid': a.aid,
@@ -55,31 +75,36 @@ def list_appointments():
     ])
 
 @appointments_bp.route('/<int:aid>', methods=['PUT'])
-def update_appointment(aid):
-    data = request.get_json()
-    appointment = Appointment.query.get(aid)
-    if not appointment:
-        return jsonify({'error': 'Appointment not found'}), 404
+@accepts(APPOINTMENT_UPDATE_SCHEMA)
+def update_appointment(data, aid):
+    if 'start_time' in data and 'end_time' in data and data['end_time'] < data['start_time']:
+        return jsonify({'error': 'end_time must not be before start_time'}), 400
     try:
-        appointment.patient_id = data.get('patient_id', appointment.patient_id)
-        appointment.doctor_id = data.get('doctor_id', appointment.doctor_id)
-        appointment.start_time = data.get('start_time', appointment.start_time)
-        appointment.end_time = data.get('end_time', appointment.end_time)
-        appointment.location = data.get('location', appointment.location)
-        appointment.active = data.get('active', appointment.active)
+        changed = update_returning(Appointment, aid, data)
+        if changed is None:
+            return jsonify({'error': 'Appointment not found'}), 404
+        before, appointment = changed
+        apply_change(appointment_snapshot(before), appointment_snapshot(appointment))
+        if before.patient_id != appointment.patient_id:
+            emit_change('appointments', 'deleted', appointment.aid, before.patient_id)
+        emit_change('appointments', 'updated', appointment.aid, appointment.patient_id)
         db.session.commit()
         return jsonify({'message': 'Appointment updated'})
+    except IntegrityError as e:
+        return write_error(e, APPOINTMENT_REFERENCES)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @appointments_bp.route('/<int:aid>', methods=['DELETE'])
 def delete_appointment(aid):
-    appointment = Appointment.query.get(aid)
-    if not appointment:
-        return jsonify({'error': 'Appointment not found'}), 404
     try:
-        db.session.delete(appointment)
+        changed = update_returning(Appointment, aid, {'active': False})
+        if changed is None:
+            return jsonify({'error': 'Appointment not found'}), 404
+        before, appointment = changed
+        apply_change(appointment_snapshot(before), appointment_snapshot(appointment))
+        emit_change('appointments', 'deleted', appointment.aid, appointment.patient_id)
         db.session.commit()
         return jsonify({'message': 'Appointment deleted'})
     except Exception as e:
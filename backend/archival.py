@@ -0,0 +1,79 @@
+"""
+Move long-inactive rows into the *_archive tables.
+
+Soft-deleted rows stay in the hot tables for ARCHIVE_AFTER_DAYS so they can
+still be restored with PUT {"active": true}; after that this job moves them in
+small batches (one DELETE ... RETURNING / INSERT per batch, committed
+separately) so it never holds long locks. Run it on a schedule:
+
+    python archival.py
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import db, Reminder, Task, Appointment, Medication, Condition, Recommendation, Resource
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+BATCH_PAUSE_S = float(os.getenv('ARCHIVE_BATCH_PAUSE_S', '0.05'))
+
+# Reminders go first so tasks they point at become movable in the same run
+ARCHIVED_MODELS = (Reminder, Task, Appointment, Medication, Condition, Recommendation, Resource)
+
+# Rows still referenced from a hot table cannot be moved yet
+REFERENCE_GUARDS = {
+    'tasks': 'AND NOT EXISTS (SELECT 1 FROM reminders r WHERE r.task_id = t.tid)',
+    'resources': 'AND NOT EXISTS (SELECT 1 FROM recommendations r WHERE r.resource_id = t.rid)',
+}
+
+
+def move_batch(model, cutoff, batch_size=BATCH_SIZE):
+    """Move one batch of archivable rows for a model; returns the number moved"""
+    table = model.__tablename__
+    pk = model.__mapper__.primary_key[0].name
+    columns = ', '.join(column.name for column in model.__table__.columns)
+    sql = text(f"""
+        WITH moved AS (
+            DELETE FROM {table} WHERE {pk} IN (
+                SELECT t.{pk} FROM {table} t
+                WHERE NOT t.active AND t.deleted_at < :cutoff
+                {REFERENCE_GUARDS.get(table, '')}
+                ORDER BY t.deleted_at
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {columns}
+        )
+        INSERT INTO {table}_archive ({columns})
+        SELECT {columns} FROM moved
+    """)
+    result = db.session.execute(sql, {'cutoff': cutoff, 'batch_size': batch_size})
+    db.session.commit()
+    return result.rowcount
+
+
+def archive_inactive(after_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """Archive every row soft-deleted more than ``after_days`` ago; returns counts per table"""
+    cutoff = datetime.utcnow() - timedelta(days=after_days)
+    counts = {}
+    for model in ARCHIVED_MODELS:
+        total = 0
+        while True:
+            moved = move_batch(model, cutoff, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+            time.sleep(BATCH_PAUSE_S)
+        counts[model.__tablename__] = total
+    return counts
+
+
+if __name__ == '__main__':
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        for table, count in archive_inactive().items():
+            print(f"Archived {count} rows from {table}")
@@ -0,0 +1,230 @@
+"""
+Audit trail of who viewed or changed patient data.
+
+Every API request is recorded after it is handled (``init_app`` installs the
+hook), and code outside a request can call ``record`` directly. ``record_now``
+instead inserts the event with the caller's session, so it commits with the
+change it describes; command-line tools use it, since the queue is only flushed
+at exit where ``init_app`` ran. Events go into a
+bounded in-process queue. A background thread writes them to the partitioned
+``audit_log`` table in multi-row INSERTs every AUDIT_FLUSH_INTERVAL_S seconds or
+AUDIT_BATCH_SIZE events, so a request never waits on the audit write.
+
+When the queue is full, callers wait up to AUDIT_PUT_TIMEOUT_S for the writer to
+catch up. After that the event is dropped, counted in ``stats()`` and printed in
+full to the server log, which is then the only record of it. The same happens to
+a batch the database rejects WRITE_ATTEMPTS times. The queue is flushed at
+interpreter exit.
+
+Values longer than their column are cut to fit; one overlong value would
+otherwise fail the whole multi-row INSERT.
+"""
+
+from datetime import datetime
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import current_app, request
+from sqlalchemy import insert
+
+from models import db, AuditEvent
+from schemas import integer, ValidationError
+
+QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '500'))
+FLUSH_INTERVAL_S = float(os.getenv('AUDIT_FLUSH_INTERVAL_S', '1'))
+PUT_TIMEOUT_S = float(os.getenv('AUDIT_PUT_TIMEOUT_S', '0.05'))
+SHUTDOWN_TIMEOUT_S = 10.0
+WRITE_ATTEMPTS = 3
+
+ACTIONS = {'GET': 'view', 'HEAD': 'view', 'POST': 'create', 'PUT': 'update', 'PATCH': 'update', 'DELETE': 'delete'}
+# Blueprints whose requests are not about patient data
+SKIP_BLUEPRINTS = {'events'}
+EVENT_COLUMNS = [c.name for c in AuditEvent.__table__.columns if c.name != 'id']
+MAX_LENGTHS = {c.name: c.type.length for c in AuditEvent.__table__.columns if getattr(c.type, 'length', None)}
+
+
+def log_dropped(row, reason):
+    print(f"Audit event dropped ({reason}): {json.dumps(row, default=str)}")
+
+
+def event_row(event):
+    """An AuditEvent row from column values, stamped and cut to fit"""
+    # Multi-row inserts need every row to carry the same columns
+    row = dict.fromkeys(EVENT_COLUMNS)
+    row.update(event)
+    row['occurred_at'] = row['occurred_at'] or datetime.utcnow()
+    for name, limit in MAX_LENGTHS.items():
+        if isinstance(row[name], str) and len(row[name]) > limit:
+            row[name] = row[name][:limit]
+    return row
+
+
+class AuditWriter:
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self._app = app
+        atexit.register(self.close)
+
+    def record(self, **event):
+        """Queue one audit event (AuditEvent column values)"""
+        self._ensure_thread()
+        row = event_row(event)
+        try:
+            self._queue.put(row, timeout=PUT_TIMEOUT_S)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            log_dropped(row, 'queue full')
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def close(self, timeout=SHUTDOWN_TIMEOUT_S):
+        """Write out everything still queued and stop the thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use in this process (or first use after a fork): start fresh
+            if self._app is None:
+                self._app = current_app._get_current_object()
+            self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        with self._app.app_context():
+            try:
+                from audit.partitions import ensure_partitions
+                ensure_partitions()
+            except Exception as e:
+                print(f"Audit partition check failed: {e}")
+            while True:
+                batch = self._drain()
+                if batch:
+                    self._write(batch)
+                elif self._stop.is_set():
+                    return
+
+    def _drain(self):
+        batch = []
+        deadline = time.monotonic() + FLUSH_INTERVAL_S
+        while len(batch) < BATCH_SIZE and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Shutting down: take what is left without waiting
+        while self._stop.is_set() and len(batch) < BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(AuditEvent.__table__), batch)
+                with self._lock:
+                    self.written += len(batch)
+                return
+            except Exception as e:
+                print(f"Audit write failed (attempt {attempt + 1}): {e}")
+                if not self._stop.is_set():
+                    time.sleep(FLUSH_INTERVAL_S * (attempt + 1))
+        with self._lock:
+            self.dropped += len(batch)
+        for row in batch:
+            log_dropped(row, 'write failed')
+
+
+writer = AuditWriter()
+
+
+def record(action, resource, resource_id=None, patient_id=None, actor=None):
+    writer.record(action=action, resource=resource,
+                  resource_id=None if resource_id is None else str(resource_id),
+                  patient_id=patient_id, actor=actor)
+
+
+def record_now(action, resource, resource_id=None, patient_id=None, actor=None):
+    """Insert one event in the current transaction; the caller commits it"""
+    db.session.execute(insert(AuditEvent.__table__).values(event_row({
+        'action': action, 'resource': resource, 'resource_id': None if resource_id is None else str(resource_id),
+        'patient_id': patient_id, 'actor': actor,
+    })))
+
+
+def request_patient_id():
+    """The patient the request is about, or None; ids outside int4 are dropped"""
+    view_args = request.view_args or {}
+    patient_id = next((view_args[key] for key in ('patient_id', 'pid') if key in view_args), None)
+    if patient_id is None:
+        patient_id = request.args.get('patient_id')
+    if patient_id is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            patient_id = body.get('patient_id', body.get('patientId'))
+    # An out-of-range id would fail the whole multi-row INSERT it is batched in
+    try:
+        return integer(patient_id) if patient_id is not None else None
+    except ValidationError:
+        return None
+
+
+def record_request(response):
+    if request.method == 'OPTIONS' or request.blueprint is None or request.blueprint in SKIP_BLUEPRINTS:
+        return response
+    from routing import request_identity
+    view_args = request.view_args or {}
+    resource_id = next(iter(view_args.values()), None)
+    identity = request_identity()
+    writer.record(
+        actor=None if identity is None else str(identity),
+        ip=request.remote_addr,
+        action=ACTIONS.get(request.method, request.method.lower()),
+        resource=request.blueprint,
+        resource_id=None if resource_id is None else str(resource_id),
+        patient_id=request_patient_id(),
+        method=request.method,
+        path=request.path[:500],
+        status=response.status_code,
+    )
+    return response
+
+
+def init_app(app):
+    writer.init_app(app)
+    app.after_request(record_request)
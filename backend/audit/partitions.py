@@ -0,0 +1,76 @@
+"""
+Monthly partitions for the audit log.
+
+    python -m audit.partitions [--months-ahead 3]
+
+The audit writer runs this when it starts; schedule it as well (e.g. daily) so
+partitions exist before rows arrive. Rows outside every partition land in
+audit_log_default. Postgres will not create a partition whose range already has
+rows in the default partition, so those rows are moved into a new table first,
+which is then attached as the partition, all in one transaction.
+"""
+
+import argparse
+from datetime import date
+
+from sqlalchemy import text
+
+from models import db
+
+MONTHS_AHEAD = 3
+
+DEFAULT_ROWS_SQL = text("""
+SELECT EXISTS (SELECT 1 FROM audit_log_default WHERE occurred_at >= :start AND occurred_at < :end)
+""")
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def ensure_partitions(months_ahead=MONTHS_AHEAD, today=None):
+    """Create any missing partitions from this month to ``months_ahead`` months out"""
+    month = (today or date.today()).replace(day=1)
+    created = []
+    with db.engine.begin() as conn:
+        for _ in range(months_ahead + 1):
+            following = next_month(month)
+            name = f'audit_log_{month:%Y_%m}'
+            exists = conn.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar()
+            if exists is None:
+                bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                range_ = {'start': month, 'end': following}
+                if conn.execute(DEFAULT_ROWS_SQL, range_).scalar():
+                    move_default_rows(conn, name, bounds, range_)
+                else:
+                    conn.execute(text(f"CREATE TABLE {name} PARTITION OF audit_log {bounds}"))
+                created.append(name)
+            month = following
+    return created
+
+
+def move_default_rows(conn, name, bounds, range_):
+    """Create partition ``name`` from the rows audit_log_default holds for its range"""
+    conn.execute(text(f"CREATE TABLE {name} (LIKE audit_log INCLUDING DEFAULTS)"))
+    # The append-only trigger lets this one transaction delete from the default partition
+    conn.execute(text("SET LOCAL audit.maintenance = 'on'"))
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM audit_log_default WHERE occurred_at >= :start AND occurred_at < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), range_)
+    conn.execute(text("SET LOCAL audit.maintenance = 'off'"))
+    conn.execute(text(f"ALTER TABLE audit_log ATTACH PARTITION {name} {bounds}"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create upcoming audit log partitions')
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    args = parser.parse_args()
+
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        created = ensure_partitions(args.months_ahead)
+        print(f"Created partitions: {', '.join(created) or 'none'}")
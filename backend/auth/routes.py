@@ -2,9 +2,22 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from datetime import timedelta
 from models import User, db
+from schemas import Schema, Field, accepts, string
 
 auth_bp = Blueprint('auth', __name__)
 
+SIGNUP_SCHEMA = Schema({
+    'email': Field(string(120), required=True),
+    'password': Field(string(), required=True),
+    'name': Field(string(100), required=True),
+    'phone': Field(string(20)),
+})
+LOGIN_SCHEMA = Schema({
+    'email': Field(string(), default=''),
+    'password': Field(string(), default=''),
+})
+USER_UPDATE_SCHEMA = SIGNUP_SCHEMA.partial('name', 'phone', 'email')
+
 # Handle OPTIONS requests for CORS preflight
 @auth_bp.before_request
 def handle_preflight():
@@ -16,15 +29,11 @@ def handle_preflight():
         return response, 200
 
 @auth_bp.route('/signup', methods=['POST', 'OPTIONS'])
-def signup():
+@accepts(SIGNUP_SCHEMA)
+def signup(data):
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        data = request.get_json()
-        required_fields = ['email', 'password', 'name']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already registered'}), 409
         new_user = User(
@@ -55,12 +64,12 @@ def signup():
 
 
 @auth_bp.route('/login', methods=['POST', 'OPTIONS'])
-def login():
+@accepts(LOGIN_SCHEMA)
+def login(data):
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        data = request.get_json()
-        if not data.get('email') or not data.get('password'):
+        if not data['email'] or not data['password']:
             return jsonify({'error': 'Email and password are required'}), 400
         user = User.query.filter_by(email=data['email']).first()
         if not user or not user.check_password(data['password']):
@@ -104,15 +113,15 @@ def get_user(uid):
 
 @auth_bp.route('/user/<int:uid>', methods=['PUT', 'OPTIONS'])
 @jwt_required()
-def update_user(uid):
+@accepts(USER_UPDATE_SCHEMA)
+def update_user(data, uid):
     if request.method == 'OPTIONS':
         return '', 200
     try:
         user = User.query.get(uid)
         if not user:
             return jsonify({'error': 'User not found'}), 404
-        data = request.get_json()
-        
+
         if 'name' in data:
             user.name = data['name']
         if 'phone' in data:
@@ -0,0 +1,330 @@
+"""
+Query-count budgets for every endpoint.
+
+Seeds a caretaker and patient with N rows of every kind for each N in --sizes,
+calls every registered route against that data and counts the SQL statements
+each request runs. A route passes when its count is the same at every size (a
+count that grows with N is an N+1 query) and within its budget in BUDGETS.
+Routes missing from BUDGETS fail too, so every new endpoint has to declare one.
+A route that answers with an error status fails as well, so a budget is never
+met by a request that was turned away. Failures list the statements that ran.
+
+The budgets are the counts measured against a migrated Postgres 16 database at
+sizes 1, 10 and 50. Lower one when a route gets cheaper. The invalid bodies in REJECTS must get a
+400 before any statement runs.
+
+It inserts rows and leaves them, so point it at a scratch database that has
+been migrated (``flask --app main db upgrade``):
+
+    python benchmarks/query_budget.py
+    python benchmarks/query_budget.py --sizes 1 10 100 --json
+    python benchmarks/query_budget.py --only tasks.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import sys
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def calendar_feed_path(kind, owner_id):
+    from calendars.feeds import feed_token
+    return f'/calendars/{kind}/{owner_id}.ics?token={feed_token(kind, owner_id)}'
+
+
+# endpoint -> (statement budget, request builder). A builder takes the seeded ids
+# and returns (method, path, json body).
+BUDGETS = {
+    'health': (0, lambda s: ('GET', '/', None)),
+    'auth.signup': (3, lambda s: ('POST', '/auth/signup', {
+        'email': f"{s['tag']}-signup@example.com", 'password': 'pw', 'name': 'Signup'})),
+    'auth.login': (1, lambda s: ('POST', '/auth/login', {'email': s['email'], 'password': 'pw'})),
+    'auth.get_user': (1, lambda s: ('GET', f"/auth/user/{s['uid']}", None)),
+    'auth.update_user': (3, lambda s: ('PUT', f"/auth/user/{s['uid']}", {'name': 'Renamed'})),
+    'chat.admission_stats': (0, lambda s: ('GET', '/chat/admission', None)),
+    'patients.create_patient': (1, lambda s: ('POST', '/patients/', {
+        'caretaker_id': s['free_uid'], 'name': 'New patient'})),
+    'patients.get_patient': (1, lambda s: ('GET', f"/patients/{s['pid']}", None)),
+    'patients.list_patients': (1, lambda s: ('GET', '/patients/', None)),
+    'patients.get_patient_timeline': (2, lambda s: ('GET', f"/patients/{s['pid']}/timeline?limit=20", None)),
+    'patients.update_patient': (2, lambda s: ('PUT', f"/patients/{s['pid']}", {'age': 80})),
+    'patients.delete_patient': (1, lambda s: ('DELETE', f"/patients/{s['spare_pid']}", None)),
+    'tasks.create_task': (3, lambda s: ('POST', '/tasks/', {
+        'patient_id': s['pid'], 'caretaker_id': s['uid'], 'title': 'New task'})),
+    'tasks.get_task': (1, lambda s: ('GET', f"/tasks/{s['tid']}", None)),
+    'tasks.list_tasks': (1, lambda s: ('GET', '/tasks/', None)),
+    'tasks.update_task': (2, lambda s: ('PUT', f"/tasks/{s['tid']}", {'title': 'Updated'})),
+    'tasks.next_tasks': (1, lambda s: ('GET', f"/tasks/next?caretaker_id={s['uid']}", None)),
+    'tasks.claim_task': (2, lambda s: ('POST', f"/tasks/{s['tid']}/claim", {'caretaker_id': s['uid']})),
+    'tasks.release_task': (2, lambda s: ('DELETE', f"/tasks/{s['tid']}/claim?caretaker_id={s['uid']}", None)),
+    'tasks.delete_task': (4, lambda s: ('DELETE', f"/tasks/{s['spare_tid']}", None)),
+    'appointments.create_appointment': (3, lambda s: ('POST', '/appointments/', {
+        'patient_id': s['pid'], 'doctor_id': s['doctor_uid'],
+        'start_time': s['start'], 'end_time': s['end']})),
+    'appointments.get_appointment': (1, lambda s: ('GET', f"/appointments/{s['aid']}", None)),
+    'appointments.list_appointments': (1, lambda s: ('GET', '/appointments/', None)),
+    'appointments.update_appointment': (2, lambda s: ('PUT', f"/appointments/{s['aid']}", {'location': 'Clinic'})),
+    'appointments.delete_appointment': (3, lambda s: ('DELETE', f"/appointments/{s['spare_aid']}", None)),
+    'conditions.create_condition': (2, lambda s: ('POST', '/conditions/', {'patient_id': s['pid'], 'status': 'stable'})),
+    'conditions.get_condition': (1, lambda s: ('GET', f"/conditions/{s['cid']}", None)),
+    'conditions.list_conditions': (1, lambda s: ('GET', '/conditions/', None)),
+    'conditions.update_condition': (3, lambda s: ('PUT', f"/conditions/{s['cid']}", {'status': 'improving'})),
+    'conditions.delete_condition': (2, lambda s: ('DELETE', f"/conditions/{s['spare_cid']}", None)),
+    'medications.create_medication': (3, lambda s: ('POST', '/medications/', {'patient_id': s['pid'], 'name': 'Aspirin'})),
+    'medications.get_medication': (1, lambda s: ('GET', f"/medications/{s['mid']}", None)),
+    'medications.list_medications': (1, lambda s: ('GET', '/medications/', None)),
+    'medications.update_medication': (2, lambda s: ('PUT', f"/medications/{s['mid']}", {'dose': '10mg'})),
+    'medications.delete_medication': (3, lambda s: ('DELETE', f"/medications/{s['spare_mid']}", None)),
+    'recommendations.create_recommendation': (1, lambda s: ('POST', '/recommendations/', {
+        'patient_id': s['pid'], 'title': 'Walk daily'})),
+    'recommendations.get_recommendation': (1, lambda s: ('GET', f"/recommendations/{s['rec_id']}", None)),
+    'recommendations.list_recommendations': (1, lambda s: ('GET', '/recommendations/', None)),
+    'recommendations.update_recommendation': (1, lambda s: ('PUT', f"/recommendations/{s['rec_id']}", {'title': 'Walk'})),
+    'recommendations.recommend_resources': (4, lambda s: ('GET', f"/recommendations/resources/{s['pid']}", None)),
+    'recommendations.delete_recommendation': (1, lambda s: ('DELETE', f"/recommendations/{s['spare_rec_id']}", None)),
+    'resources.create_resource': (2, lambda s: ('POST', '/resources/', {'title': 'Support group', 'category': 'support'})),
+    'resources.get_resource': (1, lambda s: ('GET', f"/resources/{s['res_id']}", None)),
+    'resources.list_resources': (1, lambda s: ('GET', '/resources/', None)),
+    'resources.update_resource': (1, lambda s: ('PUT', f"/resources/{s['res_id']}", {'description': 'Weekly'})),
+    'resources.delete_resource': (1, lambda s: ('DELETE', f"/resources/{s['spare_res_id']}", None)),
+    'reminders.create_reminder_for_appointment': (2, lambda s: ('POST', '/reminders/appointment', {
+        'patient_id': s['pid'], 'task_id': s['tid'], 'remind_at': s['start']})),
+    'reminders.get_reminders_for_appointment': (1, lambda s: ('GET', f"/reminders/appointment/{s['tid']}", None)),
+    'stats.list_patient_stats': (1, lambda s: ('GET', f"/stats/patients?ids={s['pid']}", None)),
+    'stats.get_patient_stats': (1, lambda s: ('GET', f"/stats/patients/{s['pid']}", None)),
+    'wellness.get_wellness': (1, lambda s: ('GET', f"/wellness/{s['pid']}", None)),
+    'sync.sync': (8, lambda s: ('GET', f"/sync/?caretaker_id={s['uid']}", None)),
+    'events.event_stats': (0, lambda s: ('GET', '/events/stats', None)),
+    'jobs.create_job': (2, lambda s: ('POST', '/jobs/', {
+        'kind': 'wellness_recompute', 'payload': {'patient_ids': [s['pid']]}})),
+    'jobs.get_job': (1, lambda s: ('GET', f"/jobs/{s['job_id']}", None)),
+    'reports.request_report': (8, lambda s: ('POST', f"/reports/{s['pid']}", None)),
+    'calendars.get_feed_url': (1, lambda s: ('GET', f"/calendars/patients/{s['pid']}/url", None)),
+    'calendars.get_feed': (2, lambda s: ('GET', calendar_feed_path('doctors', s['doctor_uid']), None)),
+}
+
+# endpoint -> request builder with an invalid body; it must be rejected with a 400
+# before any statement runs
+REJECTS = {
+    'tasks.create_task': lambda s: ('POST', '/tasks/', {
+        'patient_id': s['pid'], 'caretaker_id': s['uid'], 'title': 'Bad', 'due_at': 'tomorrow'}),
+    'tasks.update_task': lambda s: ('PUT', f"/tasks/{s['tid']}", {'status': 'done'}),
+    'appointments.create_appointment': lambda s: ('POST', '/appointments/', {
+        'patient_id': s['pid'], 'doctor_id': s['doctor_uid'], 'start_time': s['end'], 'end_time': s['start']}),
+    'medications.create_medication': lambda s: ('POST', '/medications/', {'patient_id': str(s['pid']) + 'x', 'name': 'X'}),
+    'conditions.update_condition': lambda s: ('PUT', f"/conditions/{s['cid']}", {'onset_date': 'last spring'}),
+    'patients.update_patient': lambda s: ('PUT', f"/patients/{s['pid']}", {'age': 'old'}),
+    'resources.create_resource': lambda s: ('POST', '/resources/', {'title': 'x' * 201}),
+}
+
+# Routes the harness cannot exercise meaningfully, with the reason
+SKIPPED = {
+    'static': 'serves files',
+    'chat.chat_gemini': 'calls the model backend',
+    'events.stream_events': 'streams until the client disconnects',
+    'imports.import_file': 'takes a file upload; it runs a fixed number of statements per batch',
+    'reports.get_report_file': 'serves files',
+}
+
+
+class StatementLog:
+    """Collects SQL statements run on the calling thread while enabled"""
+
+    def __init__(self):
+        self.statements = []
+        self.enabled = False
+        self.thread = None
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        # The audit writer and event listener run on their own threads
+        if self.enabled and threading.get_ident() == self.thread:
+            self.statements.append(' '.join(statement.split()))
+
+    def start(self):
+        self.statements = []
+        self.thread = threading.get_ident()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        return self.statements
+
+
+def seed(size):
+    """Create a caretaker, patient and ``size`` rows of every kind; return their ids"""
+    from models import (db, User, Patient, Task, Appointment, Medication, Condition,
+                        Recommendation, Resource, Reminder, Job)
+    tag = f'qb-{uuid.uuid4().hex[:12]}'
+    now = datetime.utcnow()
+
+    def user(suffix):
+        u = User(email=f'{tag}-{suffix}@example.com', name=f'{tag} {suffix}')
+        u.set_password('pw')
+        db.session.add(u)
+        return u
+
+    caretaker, doctor, spare_caretaker, free = user('caretaker'), user('doctor'), user('spare'), user('free')
+    db.session.flush()
+    patient = Patient(caretaker_id=caretaker.uid, name=f'{tag} patient', age=78)
+    spare_patient = Patient(caretaker_id=spare_caretaker.uid, name=f'{tag} spare')
+    db.session.add_all([patient, spare_patient])
+    db.session.flush()
+
+    rows = {}
+    for kind, make in [
+        ('tasks', lambda i: Task(patient_id=patient.pid, caretaker_id=caretaker.uid, title=f'Task {i}',
+                                 due_at=now + timedelta(days=i))),
+        ('appointments', lambda i: Appointment(patient_id=patient.pid, doctor_id=doctor.uid,
+                                               start_time=now + timedelta(days=i),
+                                               end_time=now + timedelta(days=i, hours=1))),
+        ('medications', lambda i: Medication(patient_id=patient.pid, name=f'Medication {i}',
+                                             prescriber_id=doctor.uid)),
+        ('conditions', lambda i: Condition(patient_id=patient.pid, status='stable', note=f'Note {i}')),
+        ('recommendations', lambda i: Recommendation(patient_id=patient.pid, title=f'Recommendation {i}')),
+        ('resources', lambda i: Resource(title=f'{tag} resource {i}', category='support')),
+    ]:
+        # One extra row per kind for the DELETE routes
+        rows[kind] = [make(i) for i in range(size + 1)]
+        db.session.add_all(rows[kind])
+    db.session.flush()
+    db.session.add_all([Reminder(patient_id=patient.pid, task_id=rows['tasks'][0].tid,
+                                 remind_at=now + timedelta(hours=i)) for i in range(size)])
+    job = Job(kind='wellness_recompute', payload={'patient_ids': [patient.pid]})
+    db.session.add(job)
+    db.session.commit()
+    # /wellness serves stored aggregates only
+    from wellness.engine import recompute_patients
+    recompute_patients([patient.pid])
+
+    return {
+        'tag': tag,
+        'email': caretaker.email,
+        'uid': caretaker.uid,
+        'doctor_uid': doctor.uid,
+        'free_uid': free.uid,
+        'pid': patient.pid,
+        'spare_pid': spare_patient.pid,
+        'tid': rows['tasks'][0].tid,
+        'spare_tid': rows['tasks'][-1].tid,
+        'aid': rows['appointments'][0].aid,
+        'spare_aid': rows['appointments'][-1].aid,
+        'mid': rows['medications'][0].mid,
+        'spare_mid': rows['medications'][-1].mid,
+        'cid': rows['conditions'][0].cid,
+        'spare_cid': rows['conditions'][-1].cid,
+        'rec_id': rows['recommendations'][0].rid,
+        'spare_rec_id': rows['recommendations'][-1].rid,
+        'res_id': rows['resources'][0].rid,
+        'spare_res_id': rows['resources'][-1].rid,
+        'job_id': job.id,
+        'start': (now + timedelta(days=1)).isoformat(),
+        'end': (now + timedelta(days=1, hours=1)).isoformat(),
+    }
+
+
+def endpoints(app, only=None):
+    """(endpoint, budget, builder) for every registered route; unbudgeted routes get None"""
+    names = sorted({rule.endpoint for rule in app.url_map.iter_rules()} - set(SKIPPED))
+    if only:
+        names = [name for name in names if name.startswith(only)]
+    return [(name, *BUDGETS.get(name, (None, None))) for name in names]
+
+
+def run(sizes, only=None):
+    from sqlalchemy import event
+    from flask_jwt_extended import create_access_token
+    from main import create_app
+    from models import db
+
+    app = create_app()
+    log = StatementLog()
+    results = {}
+    failures = {}
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', log)
+        client = app.test_client()
+        plan = endpoints(app, only)
+        for size in sizes:
+            ids = seed(size)
+            # JWT subjects must be strings; an int identity gets a 422 from every protected route
+            headers = {'Authorization': f"Bearer {create_access_token(identity=str(ids['uid']))}"}
+            for name, budget, builder in plan:
+                if builder is None:
+                    continue
+                method, path, body = builder(ids)
+                log.start()
+                response = client.open(path, method=method, json=body, headers=headers)
+                statements = log.stop()
+                results.setdefault(name, {'budget': budget, 'runs': []})['runs'].append({
+                    'size': size,
+                    'status': response.status_code,
+                    'count': len(statements),
+                    'statements': statements,
+                })
+        for name, builder in REJECTS.items():
+            if only and not name.startswith(only):
+                continue
+            method, path, body = builder(ids)
+            log.start()
+            response = client.open(path, method=method, json=body, headers=headers)
+            statements = log.stop()
+            if response.status_code != 400 or statements:
+                failures[f'{name} (invalid body)'] = (
+                    f'returned {response.status_code} after {len(statements)} statements, '
+                    f'expected 400 before any' + ''.join(f'\n      {statement[:200]}' for statement in statements))
+        event.remove(db.engine, 'before_cursor_execute', log)
+
+    for name, budget, builder in plan:
+        if builder is None:
+            failures[name] = 'no query budget declared in BUDGETS'
+            continue
+        runs = results[name]['runs']
+        counts = [run['count'] for run in runs]
+        worst = max(runs, key=lambda run: run['count'])
+        if len(set(counts)) > 1:
+            failures[name] = f'statement count grows with data: {counts} for sizes {sizes}'
+        elif worst['count'] > budget:
+            failures[name] = f"{worst['count']} statements, budget is {budget}"
+        elif any(run['status'] >= 400 for run in runs):
+            failures[name] = f"returned {[run['status'] for run in runs]}"
+        else:
+            continue
+        failures[name] += ''.join(f'\n      {statement[:200]}' for statement in worst['statements'])
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50], help='rows of each kind to seed per run')
+    parser.add_argument('--only', help='only check endpoints starting with this prefix, e.g. "tasks."')
+    parser.add_argument('--json', action='store_true', help='print per-endpoint counts as JSON')
+    args = parser.parse_args()
+
+    results, failures = run(args.sizes, args.only)
+    if args.json:
+        print(json.dumps({
+            name: {'budget': r['budget'], 'counts': [run['count'] for run in r['runs']]}
+            for name, r in sorted(results.items())
+        }, indent=2))
+    else:
+        for name, r in sorted(results.items()):
+            counts = ' '.join(f"{run['count']:>3}" for run in r['runs'])
+            flag = 'FAIL' if name in failures else 'ok'
+            print(f"{name:<48} budget {r['budget']:>3}  counts {counts}  {flag}")
+        for name in SKIPPED:
+            print(f"{name:<48} skipped: {SKIPPED[name]}")
+
+    if failures:
+        print(file=sys.stderr)
+        for name, reason in sorted(failures.items()):
+            print(f"{name}: {reason}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
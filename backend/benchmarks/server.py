@@ -0,0 +1,317 @@
+"""
+Throughput and memory of the production server per worker model.
+
+For each configuration in CONFIGS it starts ``gunicorn -c gunicorn.conf.py
+wsgi:app`` and drives a mixed workload for --duration seconds from --clients
+threads with keep-alive connections:
+
+- reads: next tasks, a patient, a medication, an appointment
+- writes: create a task, update a task
+- recommendations for the patient
+- chat turns, answered by fake_model_server.py with --model-latency-ms
+
+with --streams ``/events`` streams held open alongside, as browser tabs would.
+It then reports requests per second, p50/p99 latency per kind, errors, the 503s
+the chat bulkhead and the stream cap shed, how many streams were accepted, and
+the memory of the master and workers from /proc: PSS (shared pages split between the
+processes that map them) and each worker's private memory. Linux only.
+
+Like query_budget.py it seeds rows and leaves them, so point it at a scratch,
+migrated database:
+
+    python benchmarks/server.py
+    python benchmarks/server.py --configs sync-5 gthread-3x8 --duration 60 --clients 64
+    python benchmarks/server.py --streams 24
+    python benchmarks/server.py --json > server.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> gunicorn.conf.py environment
+CONFIGS = {
+    'sync-5': {'WEB_WORKER_CLASS': 'sync', 'WEB_WORKERS': '5'},
+    'sync-5-nopreload': {'WEB_WORKER_CLASS': 'sync', 'WEB_WORKERS': '5', 'WEB_PRELOAD': '0'},
+    'gthread-3x8': {'WEB_WORKER_CLASS': 'gthread', 'WEB_WORKERS': '3', 'WEB_THREADS': '8'},
+    'gthread-3x8-nopreload': {'WEB_WORKER_CLASS': 'gthread', 'WEB_WORKERS': '3', 'WEB_THREADS': '8',
+                              'WEB_PRELOAD': '0'},
+    'gthread-5x16': {'WEB_WORKER_CLASS': 'gthread', 'WEB_WORKERS': '5', 'WEB_THREADS': '16'},
+    'gevent-3x200': {'WEB_WORKER_CLASS': 'gevent', 'WEB_WORKERS': '3', 'WEB_WORKER_CONNECTIONS': '200'},
+}
+
+# kind -> (weight, request builder). A builder takes the seeded ids and returns
+# (method, path, json body).
+MIX = {
+    'read': (55, lambda s: random.choice([
+        ('GET', f"/tasks/next?caretaker_id={s['uid']}", None),
+        ('GET', f"/patients/{s['pid']}", None),
+        ('GET', f"/medications/{s['mid']}", None),
+        ('GET', f"/appointments/{s['aid']}", None),
+    ])),
+    'write': (25, lambda s: random.choice([
+        ('POST', '/tasks/', {'patient_id': s['pid'], 'caretaker_id': s['uid'], 'title': 'Benchmark task',
+                             'due_at': s['start'], 'priority': 'high'}),
+        ('PUT', f"/tasks/{s['tid']}", {'title': f'Benchmark {random.random():.6f}'}),
+    ])),
+    'recommend': (10, lambda s: ('GET', f"/recommendations/resources/{s['pid']}?k=5", None)),
+    'chat': (10, lambda s: ('POST', '/chat/gemini', {
+        'message': 'What should we focus on this week?', 'sessionId': f"bench-{uuid.uuid4().hex[:12]}",
+        'patientId': s['pid']})),
+}
+
+# The benchmark measures the server, not the chat rate limits
+SERVER_ENV = {
+    'CHAT_SESSION_RATE_PER_MIN': '1000000',
+    'CHAT_SESSION_BURST': '1000000',
+    'CHAT_CARETAKER_RATE_PER_MIN': '1000000',
+    'CHAT_CARETAKER_BURST': '1000000',
+    'GEMINI_API_KEY': 'fake',
+    'WEB_ACCESS_LOG': '',
+}
+
+
+def seed_data(size):
+    from flask_jwt_extended import create_access_token
+    from main import create_app
+    from query_budget import seed
+    app = create_app()
+    with app.app_context():
+        ids = seed(size)
+        ids['token'] = create_access_token(identity=str(ids['uid']))
+    return ids
+
+
+def wait_until_up(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not come up')
+
+
+def process_tree(pid):
+    """The pid and its direct children"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [pid] + [int(child) for child in f.read().split()]
+    except OSError:
+        return [pid]
+
+
+def memory_kb(pid):
+    """{'pss', 'private'} in kB from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0])
+    return {'pss': values['Pss'], 'private': values['Private_Clean'] + values['Private_Dirty']}
+
+
+def drive(port, ids, duration, clients):
+    """Run the mixed workload; returns [(kind, status, ms)]"""
+    kinds = list(MIX)
+    weights = [MIX[kind][0] for kind in kinds]
+    headers = {'Content-Type': 'application/json', 'Authorization': f"Bearer {ids['token']}"}
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def connect():
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def send(conn, method, path, body):
+        conn.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def client():
+        conn = connect()
+        local = []
+        while time.monotonic() < deadline:
+            kind = random.choices(kinds, weights)[0]
+            method, path, body = MIX[kind][1](ids)
+            start = time.perf_counter()
+            try:
+                status = send(conn, method, path, body)
+            except (OSError, http.client.HTTPException):
+                # The server closes idle keep-alive connections; retry once on a new one
+                conn.close()
+                conn = connect()
+                try:
+                    status = send(conn, method, path, body)
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = connect()
+                    status = 0
+            local.append((kind, status, (time.perf_counter() - start) * 1000))
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def open_streams(port, ids, count):
+    """Open ``count`` event streams; returns (open connections, refused count)"""
+    streams, refused = [], 0
+    for _ in range(count):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            conn.request('GET', f"/events/stream?caretaker_id={ids['uid']}")
+            response = conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            # A sync worker busy with an earlier stream never answers
+            conn.close()
+            refused += 1
+            continue
+        if response.status == 200:
+            # Keep the response so the connection stays open
+            streams.append((conn, response))
+        else:
+            response.read()
+            conn.close()
+            refused += 1
+    return streams, refused
+
+
+def is_error(status):
+    return status == 0 or (status >= 500 and status != 503)
+
+
+def summarize(results, duration, memory):
+    by_kind = {}
+    for kind, status, ms in results:
+        by_kind.setdefault(kind, []).append((status, ms))
+    summary = {
+        'rps': round(len(results) / duration, 1),
+        'errors': sum(1 for _, status, _ in results if is_error(status)),
+        'shed': sum(1 for _, status, _ in results if status == 503),
+        'memory_mb': memory,
+        'kinds': {},
+    }
+    for kind, samples in sorted(by_kind.items()):
+        latencies = sorted(ms for _, ms in samples)
+        summary['kinds'][kind] = {
+            'count': len(samples),
+            'p50_ms': round(statistics.median(latencies), 1),
+            'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+            'errors': sum(1 for status, _ in samples if is_error(status)),
+            'shed': sum(1 for status, _ in samples if status == 503),
+        }
+    return summary
+
+
+def run_config(name, settings, ids, args, model_url):
+    port = args.port
+    env = dict(os.environ, **SERVER_ENV, **settings, WEB_BIND=f'127.0.0.1:{port}', GEMINI_BASE_URL=model_url)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                               cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    streams = []
+    try:
+        wait_until_up(port, process)
+        # Let every worker load the lazily imported modules before measuring
+        drive(port, ids, args.warmup, args.clients)
+        streams, refused = open_streams(port, ids, args.streams)
+        results = drive(port, ids, args.duration, args.clients)
+        pids = process_tree(process.pid)
+        usage = {pid: memory_kb(pid) for pid in pids}
+        workers = [usage[pid]['private'] for pid in pids[1:]]
+        memory = {
+            'total_pss': round(sum(u['pss'] for u in usage.values()) / 1024, 1),
+            'master_pss': round(usage[process.pid]['pss'] / 1024, 1),
+            'worker_private_avg': round(statistics.mean(workers) / 1024, 1) if workers else None,
+            'workers': len(workers),
+        }
+        summary = summarize(results, args.duration, memory)
+        summary['streams'] = {'open': len(streams), 'refused': refused}
+        return summary
+    finally:
+        for conn, _ in streams:
+            conn.close()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            # Workers stuck in a request would keep the port for the next configuration
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', nargs='+', choices=sorted(CONFIGS), default=list(CONFIGS))
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load per configuration')
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent client connections')
+    parser.add_argument('--streams', type=int, default=0, help='/events streams to hold open during the run')
+    parser.add_argument('--size', type=int, default=50, help='rows of each kind to seed')
+    parser.add_argument('--port', type=int, default=5081)
+    parser.add_argument('--model-port', type=int, default=5056)
+    parser.add_argument('--model-latency-ms', type=int, default=800)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    ids = seed_data(args.size)
+    model = subprocess.Popen([sys.executable, 'fake_model_server.py', '--port', str(args.model_port),
+                              '--latency-ms', str(args.model_latency_ms), '--jitter-ms', '200',
+                              '--function-call-rate', '0'],
+                             cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        for name in args.configs:
+            try:
+                results[name] = run_config(name, CONFIGS[name], ids, args, f'http://127.0.0.1:{args.model_port}')
+            except RuntimeError as e:
+                results[name] = {'error': str(e)}
+            if not args.json:
+                print_row(name, results[name])
+    finally:
+        model.terminate()
+        model.wait()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def print_row(name, result):
+    if 'error' in result:
+        print(f"{name:<24} failed: {result['error']}")
+        return
+    memory = result['memory_mb']
+    latencies = '  '.join(f"{kind} {k['p50_ms']}/{k['p99_ms']}ms" for kind, k in result['kinds'].items())
+    print(f"{name:<24} {result['rps']:>8} req/s  errors {result['errors']:>4}  shed {result['shed']:>4}  "
+          f"streams {result['streams']['open']}/{result['streams']['open'] + result['streams']['refused']}  "
+          f"pss {memory['total_pss']:>7} MB  worker private {memory['worker_private_avg']} MB  {latencies}")
+
+
+if __name__ == '__main__':
+    main()
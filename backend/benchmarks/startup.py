@@ -0,0 +1,108 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters, how long it takes to import ``main``, build the
+full app, build the database-only app used by CLI scripts, and import the model
+SDK that the chat blueprint now loads on first use. Per-module import cost comes
+from ``python -X importtime``.
+
+    python benchmarks/startup.py                 # table of scenarios and slowest modules
+    python benchmarks/startup.py --json          # machine-readable, for tracking over time
+    python benchmarks/startup.py --budget-ms 800 # exit 1 if building the app is slower
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'import_main': 'import main',
+    'create_app': 'import main; main.create_app()',
+    'create_cli_app': 'import main; main.create_app(with_blueprints=False)',
+    'model_sdk': 'import google.genai',
+}
+
+# create_app() only needs these to be set; nothing connects to the database
+PLACEHOLDER_ENV = {
+    'POSTGRES_USER': 'bench',
+    'POSTGRES_PASSWORD': 'bench',
+    'POSTGRES_HOST': 'localhost',
+    'POSTGRES_PORT': '5432',
+    'POSTGRES_DB': 'bench',
+}
+
+
+def run_scenario(code):
+    """Run ``code`` in a fresh interpreter; return (wall ms, {module: cumulative ms})"""
+    env = dict(PLACEHOLDER_ENV, **os.environ)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f'{code!r} failed:\n{proc.stderr[-2000:]}')
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level entries are the ones not indented under another import
+        if name.startswith('   '):
+            continue
+        modules[name.strip()] = int(cumulative) / 1000
+    return wall_ms, modules
+
+
+def benchmark(repeat):
+    results = {}
+    for scenario, code in SCENARIOS.items():
+        walls = []
+        module_samples = {}
+        for _ in range(repeat):
+            wall_ms, modules = run_scenario(code)
+            walls.append(wall_ms)
+            for name, ms in modules.items():
+                module_samples.setdefault(name, []).append(ms)
+        results[scenario] = {
+            'wall_ms': round(statistics.median(walls), 1),
+            'modules_ms': {
+                name: round(statistics.median(samples), 2)
+                for name, samples in sorted(module_samples.items(), key=lambda kv: -statistics.median(kv[1]))
+            },
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per scenario; the median is reported')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list per scenario')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--budget-ms', type=float, help='fail if create_app takes longer than this')
+    args = parser.parse_args()
+
+    results = benchmark(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for scenario, result in results.items():
+            print(f"{scenario:<16} {result['wall_ms']:>8.1f} ms (process wall time)")
+            for name, ms in list(result['modules_ms'].items())[:args.top]:
+                print(f"    {ms:>8.2f} ms  {name}")
+            print()
+
+    if args.budget_ms is not None and results['create_app']['wall_ms'] > args.budget_ms:
+        print(f"create_app took {results['create_app']['wall_ms']} ms, budget is {args.budget_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
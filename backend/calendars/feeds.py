@@ -0,0 +1,129 @@
+"""
+iCalendar feeds of appointments, per patient and per doctor.
+
+Calendar apps poll a feed every few minutes, and it rarely changes. Each feed
+has a version: a counter in change_versions that a trigger on appointments bumps
+for the patient and the doctor in the writing transaction, so edits and deletes
+both bump it, and a reader sees the new version exactly when the change commits.
+(max(updated_at) would miss a row that was stamped earlier but committed later.)
+Reading the version is a single primary key probe. The ETag comes from it and
+Last-Modified from the time of the last bump, together with the day the feed
+window starts (feeds hold appointments from CALENDAR_FEED_PAST_DAYS
+ago onwards), so a poll of an unchanged feed is answered 304 without reading
+any appointments. A changed feed is streamed row by row. Renaming a patient or
+doctor does not bump the version; calendars pick the new name up with the next
+appointment change.
+
+Feed URLs carry an HMAC token so they can be handed to calendar apps, which
+cannot send a login header.
+"""
+
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import os
+
+from flask import current_app
+from sqlalchemy import text
+
+FEED_PAST_DAYS = int(os.getenv('CALENDAR_FEED_PAST_DAYS', '90'))
+FETCH_SIZE = 500
+PRODID = '-//DemenCare//Appointments//EN'
+
+VERSION_SQL = text("SELECT version, changed_at FROM change_versions WHERE scope = :scope AND owner_id = :owner_id")
+VERSION_SCOPES = {'patient_id': 'appointments:patient', 'doctor_id': 'appointments:doctor'}
+# owner column -> SQL
+EVENTS_SQL = {
+    owner: text(f"""
+        SELECT a.aid, a.start_time, a.end_time, a.location, a.updated_at,
+               p.name AS patient_name, d.name AS doctor_name
+        FROM appointments a
+        JOIN patients p ON p.pid = a.patient_id
+        JOIN users d ON d.uid = a.doctor_id
+        WHERE a.{owner} = :owner_id AND a.active AND a.start_time >= :since
+        ORDER BY a.start_time, a.aid
+    """)
+    for owner in ('patient_id', 'doctor_id')
+}
+
+
+def window_start():
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=FEED_PAST_DAYS)
+
+
+def feed_etag(kind, owner_id, version, since):
+    return f'{kind}-{owner_id}-{version or 0}-{since:%Y%m%d}'
+
+
+def feed_token(kind, owner_id):
+    key = (current_app.config.get('JWT_SECRET_KEY') or '').encode('utf-8')
+    return hmac.new(key, f'{kind}:{owner_id}'.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def check_token(kind, owner_id, token):
+    return bool(token) and hmac.compare_digest(feed_token(kind, owner_id), token)
+
+
+def feed_version(session, owner, owner_id):
+    """(version, changed_at) of the feed, or (None, None) if it has never changed"""
+    row = session.execute(VERSION_SQL, {'scope': VERSION_SCOPES[owner], 'owner_id': owner_id}).first()
+    return (row.version, row.changed_at) if row else (None, None)
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line at 75 octets as RFC 5545 asks"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, limit = [], 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Do not split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_event(row, owner):
+    if owner == 'patient_id':
+        summary = f"Appointment with {row['doctor_name']}"
+    else:
+        summary = f"Appointment: {row['patient_name']}"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:appointment-{row['aid']}@demencare",
+        f"DTSTAMP:{format_time(row['updated_at'])}",
+        f"DTSTART:{format_time(row['start_time'])}",
+        f"DTEND:{format_time(row['end_time'])}",
+        f'SUMMARY:{escape_text(summary)}',
+    ]
+    if row['location']:
+        lines.append(f"LOCATION:{escape_text(row['location'])}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def stream_feed(session, owner, owner_id, name, since):
+    """Yield the feed in chunks, reading appointments FETCH_SIZE rows at a time"""
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ])
+    result = session.execute(EVENTS_SQL[owner], {'owner_id': owner_id, 'since': since},
+                             execution_options={'yield_per': FETCH_SIZE})
+    for partition in result.mappings().partitions():
+        yield ''.join(format_event(row, owner) for row in partition)
+    yield 'END:VCALENDAR\r\n'
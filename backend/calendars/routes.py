@@ -0,0 +1,66 @@
+from datetime import timezone
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required
+from models import db, Patient, User
+from calendars import feeds
+
+calendars_bp = Blueprint('calendars', __name__)
+
+# URL kind -> (appointments column, owner model)
+OWNERS = {
+    'patients': ('patient_id', Patient),
+    'doctors': ('doctor_id', User),
+}
+
+
+def owner_name(model, owner_id):
+    owner = db.session.get(model, owner_id)
+    if owner is None or not getattr(owner, 'active', True):
+        return None
+    return owner.name
+
+
+# Subscription URL for a calendar app; the token stands in for the login
+@calendars_bp.route('/<kind>/<int:owner_id>/url', methods=['GET'])
+@jwt_required()
+def get_feed_url(kind, owner_id):
+    if kind not in OWNERS:
+        return jsonify({'error': 'Unknown calendar'}), 404
+    if owner_name(OWNERS[kind][1], owner_id) is None:
+        return jsonify({'error': 'Calendar not found'}), 404
+    token = feeds.feed_token(kind, owner_id)
+    return jsonify({'url': f'{request.host_url}calendars/{kind}/{owner_id}.ics?token={token}'}), 200
+
+
+# Answered 304 from the version probe alone while the feed is unchanged
+@calendars_bp.route('/<kind>/<int:owner_id>.ics', methods=['GET'])
+def get_feed(kind, owner_id):
+    if kind not in OWNERS:
+        return jsonify({'error': 'Unknown calendar'}), 404
+    if not feeds.check_token(kind, owner_id, request.args.get('token')):
+        return jsonify({'error': 'Invalid feed token'}), 403
+    owner, model = OWNERS[kind]
+
+    version, changed_at = feeds.feed_version(db.session, owner, owner_id)
+    since = feeds.window_start()
+    etag = feeds.feed_etag(kind, owner_id, version, since)
+    last_modified = changed_at.replace(tzinfo=timezone.utc) if changed_at else None
+    if request.if_none_match:
+        unchanged = request.if_none_match.contains(etag)
+    else:
+        unchanged = (last_modified is not None and request.if_modified_since is not None
+                     and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if unchanged:
+        response = Response(status=304)
+    else:
+        name = owner_name(model, owner_id)
+        if name is None:
+            return jsonify({'error': 'Calendar not found'}), 404
+        response = Response(stream_with_context(feeds.stream_feed(db.session, owner, owner_id, name, since)),
+                            mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,183 @@
+"""
+Admission control for chat turns.
+
+A chat turn holds a worker thread for as long as the model takes, so a burst of
+chat traffic could otherwise occupy every thread and starve the CRUD routes.
+Each turn must pass two checks before it runs:
+
+- token buckets per session and per caretaker (CHAT_SESSION_RATE_PER_MIN and
+  CHAT_CARETAKER_RATE_PER_MIN, with bursts of CHAT_*_BURST); over the limit the
+  request is answered 429 with Retry-After. The caretaker is the caller's
+  identity, or else the caretaker of the turn's patientId (a primary key lookup,
+  cached for CHAT_CARETAKER_CACHE_TTL_S). Only callers with neither are limited
+  per address.
+- a bulkhead of CHAT_MAX_CONCURRENT turns per worker process; when it is full
+  the request waits at most CHAT_ADMIT_WAIT_S and is then shed with 503.
+
+Limits are per worker process. A sync worker (WEB_WORKER_CLASS=sync) serves one
+request at a time, so its bulkhead never fills and only the rate limits apply.
+Counters are served at /chat/admission.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import math
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+from models import db, Patient
+from schemas import ValidationError, integer
+
+SESSION_RATE_PER_MIN = float(os.getenv('CHAT_SESSION_RATE_PER_MIN', '20'))
+SESSION_BURST = float(os.getenv('CHAT_SESSION_BURST', '5'))
+CARETAKER_RATE_PER_MIN = float(os.getenv('CHAT_CARETAKER_RATE_PER_MIN', '60'))
+CARETAKER_BURST = float(os.getenv('CHAT_CARETAKER_BURST', '10'))
+MAX_CONCURRENT = int(os.getenv('CHAT_MAX_CONCURRENT', '4'))
+ADMIT_WAIT_S = float(os.getenv('CHAT_ADMIT_WAIT_S', '0.1'))
+SHED_RETRY_AFTER_S = int(os.getenv('CHAT_SHED_RETRY_AFTER_S', '2'))
+MAX_BUCKETS = 10000
+CARETAKER_CACHE_TTL_S = float(os.getenv('CHAT_CARETAKER_CACHE_TTL_S', '300'))
+MAX_CACHED_CARETAKERS = 10000
+
+# patient id -> (expires at, caretaker id)
+_caretakers = OrderedDict()
+_caretakers_lock = threading.Lock()
+
+
+class TokenBuckets:
+    """Token buckets by key; idle buckets are forgotten LRU-first past MAX_BUCKETS"""
+
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self._buckets = OrderedDict()
+
+    def level(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait_time(self, tokens):
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def set(self, key, tokens, now):
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > MAX_BUCKETS:
+            self._buckets.popitem(last=False)
+
+
+class Admission:
+    def __init__(self):
+        self.sessions = TokenBuckets(SESSION_RATE_PER_MIN, SESSION_BURST)
+        self.caretakers = TokenBuckets(CARETAKER_RATE_PER_MIN, CARETAKER_BURST)
+        self._slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+        self._lock = threading.Lock()
+        self.counters = {
+            'admitted': 0,
+            'rate_limited_session': 0,
+            'rate_limited_caretaker': 0,
+            'shed': 0,
+            'in_flight': 0,
+            'peak_in_flight': 0,
+        }
+
+    def take(self, session_key, caretaker_key):
+        """Take a token from both buckets, or none; return seconds to wait (0 if admitted)"""
+        now = time.monotonic()
+        with self._lock:
+            checks = [(self.sessions, session_key, 'rate_limited_session'),
+                      (self.caretakers, caretaker_key, 'rate_limited_caretaker')]
+            checks = [(buckets, key, counter) for buckets, key, counter in checks if key is not None]
+            levels = [buckets.level(key, now) for buckets, key, _ in checks]
+            waits = [buckets.wait_time(tokens) for (buckets, _, _), tokens in zip(checks, levels)]
+            if any(waits):
+                worst = max(range(len(waits)), key=waits.__getitem__)
+                self.counters[checks[worst][2]] += 1
+                return waits[worst]
+            for (buckets, key, _), tokens in zip(checks, levels):
+                buckets.set(key, tokens - 1, now)
+            return 0.0
+
+    def enter(self):
+        if not self._slots.acquire(timeout=ADMIT_WAIT_S):
+            with self._lock:
+                self.counters['shed'] += 1
+            return False
+        with self._lock:
+            self.counters['admitted'] += 1
+            self.counters['in_flight'] += 1
+            self.counters['peak_in_flight'] = max(self.counters['peak_in_flight'], self.counters['in_flight'])
+        return True
+
+    def leave(self):
+        with self._lock:
+            self.counters['in_flight'] -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, max_concurrent=MAX_CONCURRENT)
+
+
+admission = Admission()
+
+
+def reject(status, error, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({'error': error, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+
+def patient_caretaker(patient_id):
+    """Caretaker of a patient, or None if the id is not a known patient"""
+    try:
+        patient_id = integer(patient_id)
+    except ValidationError:
+        return None
+    if patient_id is None:
+        return None
+    now = time.monotonic()
+    with _caretakers_lock:
+        cached = _caretakers.get(patient_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    caretaker_id = db.session.query(Patient.caretaker_id).filter_by(pid=patient_id).scalar()
+    with _caretakers_lock:
+        _caretakers[patient_id] = (now + CARETAKER_CACHE_TTL_S, caretaker_id)
+        _caretakers.move_to_end(patient_id)
+        while len(_caretakers) > MAX_CACHED_CARETAKERS:
+            _caretakers.popitem(last=False)
+    return caretaker_id
+
+
+def caretaker_key(body):
+    from routing import request_identity
+    caretaker_id = request_identity()
+    if caretaker_id is None and isinstance(body, dict) and body.get('patientId') is not None:
+        caretaker_id = patient_caretaker(body['patientId'])
+    # Anonymous callers are limited by address instead
+    return f'ip:{request.remote_addr}' if caretaker_id is None else f'user:{caretaker_id}'
+
+
+def admit(view):
+    """Apply rate limits and the chat bulkhead to a view"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'OPTIONS':
+            return view(*args, **kwargs)
+        body = request.get_json(silent=True)
+        session_id = body.get('sessionId') if isinstance(body, dict) else None
+        wait = admission.take(None if session_id is None else str(session_id), caretaker_key(body))
+        if wait:
+            return reject(429, 'Too many chat requests, slow down', wait)
+        if not admission.enter():
+            return reject(503, 'Chat is busy, try again shortly', SHED_RETRY_AFTER_S)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            admission.leave()
+    return wrapper
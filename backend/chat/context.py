@@ -0,0 +1,91 @@
+"""
+Compact patient context attached to chat turns.
+
+When a turn carries a patientId, the pipeline fetches the patient's active
+medications, conditions, upcoming appointments and open tasks in one query and
+hands them to the model with the turn, so it can answer directly instead of
+calling generate_health_report and paying for a second model round trip.
+
+Contexts are cached per worker for CHAT_CONTEXT_TTL_S. Every write that emits a
+change notification drops the patient's cached context in every worker, through
+the events hub's LISTEN thread.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from events.hub import hub
+from models import db
+
+PREFETCH_CONTEXT = os.getenv('CHAT_PREFETCH_CONTEXT', '1') == '1'
+CONTEXT_TTL_S = float(os.getenv('CHAT_CONTEXT_TTL_S', '60'))
+MAX_CACHED_CONTEXTS = int(os.getenv('CHAT_CONTEXT_CACHE_SIZE', '1024'))
+
+PATIENT_CONTEXT_SQL = text("""
+SELECT
+    p.name, p.age, p.gender, p.medical_summary,
+    (SELECT json_agg(json_build_object('name', m.name, 'dose', m.dose, 'schedule', m.schedule_text))
+       FROM medications m
+      WHERE m.patient_id = p.pid AND m.active) AS medications,
+    (SELECT json_agg(json_build_object('status', c.status, 'onset_date', c.onset_date, 'note', c.note))
+       FROM conditions c
+      WHERE c.patient_id = p.pid AND c.active) AS conditions,
+    (SELECT json_agg(json_build_object('start', a.start_time, 'end', a.end_time, 'location', a.location))
+       FROM (SELECT start_time, end_time, location FROM appointments
+              WHERE patient_id = p.pid AND active AND start_time >= now()
+              ORDER BY start_time LIMIT :max_appointments) a) AS upcoming_appointments,
+    (SELECT json_agg(json_build_object('title', t.title, 'due_at', t.due_at, 'priority', lower(t.priority::text)))
+       FROM (SELECT title, due_at, priority FROM tasks
+              WHERE patient_id = p.pid AND active AND status IN ('PENDING', 'IN_PROGRESS')
+              ORDER BY due_at NULLS LAST LIMIT :max_tasks) t) AS open_tasks
+FROM patients p
+WHERE p.pid = :pid
+""")
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def fetch_patient_context(patient_id, max_appointments=5, max_tasks=10):
+    """Return the patient's context as a dict, or None if the patient does not exist"""
+    row = db.session.execute(PATIENT_CONTEXT_SQL, {
+        'pid': patient_id,
+        'max_appointments': max_appointments,
+        'max_tasks': max_tasks,
+    }).mappings().first()
+    if row is None:
+        return None
+    # Drop empty sections to keep the prompt small
+    return {key: value for key, value in row.items() if value not in (None, [], '')}
+
+
+def get_patient_context(patient_id):
+    """Return the patient's context as compact JSON text, cached for CONTEXT_TTL_S"""
+    # Invalidations arrive through the hub, so it has to be listening before we cache
+    hub.start()
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(patient_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    context = fetch_patient_context(patient_id)
+    payload = json.dumps(context, separators=(',', ':'), default=str) if context else None
+    with _lock:
+        _cache[patient_id] = (now + CONTEXT_TTL_S, payload)
+        _cache.move_to_end(patient_id)
+        while len(_cache) > MAX_CACHED_CONTEXTS:
+            _cache.popitem(last=False)
+    return payload
+
+
+def invalidate_patient_context(patient_id):
+    with _lock:
+        _cache.pop(patient_id, None)
+
+
+hub.watch(lambda change: invalidate_patient_context(change.get('patient_id')))
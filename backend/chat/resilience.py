@@ -0,0 +1,152 @@
+"""
+Deadlines, retries and circuit breaking for model calls.
+
+Every model call goes through ``call_model``: transient failures (timeouts,
+connection errors, 408/429/5xx) are retried with jittered exponential backoff
+until the turn deadline runs out, and a process-wide circuit breaker stops
+calling the backend for a cool-down period once it keeps failing.
+"""
+
+import os
+import random
+import threading
+import time
+
+MODEL_TIMEOUT_MS = int(os.getenv('CHAT_MODEL_TIMEOUT_MS', '20000'))
+TURN_DEADLINE_S = float(os.getenv('CHAT_TURN_DEADLINE_S', '45'))
+MAX_ATTEMPTS = int(os.getenv('CHAT_MAX_ATTEMPTS', '3'))
+BACKOFF_BASE_S = float(os.getenv('CHAT_BACKOFF_BASE_S', '0.5'))
+BACKOFF_MAX_S = float(os.getenv('CHAT_BACKOFF_MAX_S', '4'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('CHAT_BREAKER_FAILURES', '5'))
+BREAKER_RESET_S = float(os.getenv('CHAT_BREAKER_RESET_S', '30'))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ModelUnavailable(Exception):
+    """Raised when the model backend could not produce a response in time"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may proceed; half-open lets a single probe through"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            return max(1, int(remaining + 0.999))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """End a call that says nothing about the backend's health"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_S)
+
+
+def is_transient(exc):
+    import httpx
+    from google.genai import errors
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+def with_timeout(config, timeout_ms):
+    """
+    A genai request ``config`` (None, a dict or a config object) with its own
+    timeout. ``Chat.send_message`` uses a per-call config instead of the chat's,
+    so pass the chat's full config here, not just overrides.
+    """
+    if config is None:
+        return {'http_options': {'timeout': timeout_ms}}
+    if isinstance(config, dict):
+        return {**config, 'http_options': {**(config.get('http_options') or {}), 'timeout': timeout_ms}}
+    from google.genai import types
+    http_options = (config.http_options or types.HttpOptions()).model_copy(update={'timeout': timeout_ms})
+    return config.model_copy(update={'http_options': http_options})
+
+
+def call_model(fn, *args, deadline=None, config=None, **kwargs):
+    """
+    Call ``fn`` with retries for transient failures.
+
+    ``deadline`` is a ``time.monotonic()`` timestamp shared by every call in a
+    turn; each call's timeout is cut to the time left, and no retry is started
+    if its backoff would overrun it. ``config`` is passed on to ``fn`` with that
+    timeout. Non-transient errors are raised unchanged; transient ones end in
+    ``ModelUnavailable``.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + TURN_DEADLINE_S
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            break
+        if not breaker.allow():
+            raise ModelUnavailable('Model backend circuit is open', retry_after=breaker.retry_after())
+        try:
+            result = fn(*args, config=with_timeout(config, min(MODEL_TIMEOUT_MS, remaining_ms)), **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                # A bad request says nothing about the backend; leave the breaker as it is
+                breaker.release()
+                raise
+            breaker.record_failure()
+            last_error = e
+            delay = backoff_delay(attempt)
+            if attempt + 1 >= MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+    raise ModelUnavailable(f'Model backend unavailable: {last_error or "turn deadline passed"}',
+                           retry_after=int(BACKOFF_MAX_S))
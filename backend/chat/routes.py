@@ -1,18 +1,53 @@
 from flask import Blueprint, request, jsonify
-import google.genai as genai
-from google.genai import types
 from datetime import datetime, timedelta
 from models import db, Appointment, Patient, Medication, Condition, Resource
+from chat import sessions
+from stats.counters import apply_change, appointment_snapshot
+from events.hub import emit_change
+from chat.context import PREFETCH_CONTEXT, get_patient_context, invalidate_patient_context
+from chat.admission import admission, admit
+from chat.resilience import call_model, ModelUnavailable, MODEL_TIMEOUT_MS, TURN_DEADLINE_S
+from schemas import Schema, Field, ValidationError, integer
 import json
+import os
+import time
 
 chat_bp = Blueprint('chat', __name__)
 
-chat_sessions = {}
-clients = {}
+_client = None
+_types = None
 SESSION_ID = "default"
+MODEL_NAME = "gemini-2.5-flash"
+SYSTEM_INSTRUCTION = """You are a helpful healthcare assistant for caregivers managing patient care. 
+            You can help with:
+            1. Creating appointments and calendar events
+            2. Generating health reports with patient information
+            3. Recommending community events and resources
+            
+            Be friendly, clear, and helpful. When creating appointments, confirm the details with the user.
+            Always prioritize patient safety and encourage users to consult healthcare professionals for medical decisions."""
+CONTEXT_INSTRUCTION = """
+            
+            Current data for the patient being discussed is included below as JSON. Use it to answer
+            questions about medications, conditions, appointments and tasks directly; only call
+            generate_health_report when the user explicitly asks for a full report.
+            
+            Patient context: """
+CHAT_IDS_SCHEMA = Schema({'patientId': Field(integer), 'doctorId': Field(integer)})
+FALLBACK_REPLY = ("I'm having trouble reaching the assistant right now. "
+                  "Please try again in a moment.")
+
+def genai_types():
+    """``google.genai.types``, imported on first use; the SDK is slow to import"""
+    global _types
+    if _types is None:
+        from google.genai import types
+        _types = types
+    return _types
 
 # Define AI function tools
 def get_function_declarations():
+    types = genai_types()
     return [
         types.FunctionDeclaration(
             name="create_appointment",
@@ -96,6 +131,9 @@ def create_appointment_impl(title, date, start_time, end_time, location=None, pa
             active=True
         )
         db.session.add(appointment)
+        apply_change(after=appointment_snapshot(appointment))
+        db.session.flush()
+        emit_change('appointments', 'created', appointment.aid, appointment.patient_id)
         db.session.commit()
         
         return {
@@ -151,10 +189,18 @@ def generate_health_report_impl(patient_id):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def recommend_community_events_impl(category, limit=5):
-    """Recommend community events based on category"""
+def recommend_community_events_impl(category, limit=5, patient_id=None):
+    """Recommend community events in a category, ranked for the patient when there is one"""
     try:
-        resources = Resource.query.filter_by(category=category, active=True).limit(limit).all()
+        resources = []
+        if patient_id:
+            # NumPy comes with the engine; keep it out of app startup
+            from recommendations.engine import recommend_for_patient
+            ranked = recommend_for_patient(db.session, int(patient_id), limit, category) or []
+            by_id = {r.rid: r for r in Resource.query.filter(Resource.rid.in_([rid for rid, _ in ranked]))} if ranked else {}
+            resources = [by_id[rid] for rid, _ in ranked if rid in by_id]
+        if not resources:
+            resources = Resource.query.filter_by(category=category, active=True).limit(limit).all()
         
         recommendations = [
             {
@@ -169,54 +215,105 @@ def recommend_community_events_impl(category, limit=5):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def get_client():
+    global _client
+    if _client is None:
+        # GEMINI_BASE_URL points the client at fake_model_server.py for offline testing
+        # The SDK is slow to import, so load it on the first chat request
+        import google.genai as genai
+        _client = genai.Client(http_options=genai_types().HttpOptions(
+            base_url=os.getenv('GEMINI_BASE_URL'),
+            timeout=MODEL_TIMEOUT_MS
+        ))
+    return _client
+
+def get_chat_config(patient_context=None):
+    system_instruction = SYSTEM_INSTRUCTION
+    if patient_context:
+        system_instruction += CONTEXT_INSTRUCTION + patient_context
+    return {
+        "system_instruction": system_instruction,
+        "tools": [genai_types().Tool(function_declarations=get_function_declarations())]
+    }
+
+def get_chat_session(session_id):
+    """Return the cached chat for a session, rehydrating it from the database if needed"""
+    entry = sessions.get_cached(session_id)
+    # Another worker may have stored turns this copy has not seen
+    if entry is not None and sessions.stored_length(session_id) == entry.persisted:
+        return entry
+    history = sessions.load_history(session_id)
+    chat = get_client().chats.create(
+        model=MODEL_NAME,
+        config=get_chat_config(),
+        history=history
+    )
+    return sessions.put_cached(session_id, chat, len(history))
+
+def persist_chat_session(session_id, entry):
+    """Append the entries added during this turn to the session history"""
+    history = entry.chat.get_history(curated=True)
+    if sessions.append_history(session_id, entry.persisted, history[entry.persisted:]):
+        entry.persisted = len(history)
+    else:
+        # Another worker advanced this session and our turn went after its entries;
+        # rehydrate on the next turn
+        sessions.evict(session_id)
+
+def fallback_response(error, tool_results=None):
+    """Reply shown to the user when the model backend is degraded"""
+    reply = FALLBACK_REPLY
+    # Surface the outcome of any tool that already ran so the user knows it happened
+    done = [r['message'] for r in tool_results or [] if r.get('success') and r.get('message')]
+    if done:
+        reply = ' '.join(done) + ' ' + reply
+    response = jsonify({'reply': reply, 'degraded': True})
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+@chat_bp.route('/admission', methods=['GET'])
+def admission_stats():
+    return jsonify(admission.stats()), 200
+
 @chat_bp.route('/gemini', methods=['POST', 'OPTIONS'])
+@admit
 def chat_gemini():
     if request.method == 'OPTIONS':
         return '', 204
     
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    try:
+        ids = CHAT_IDS_SCHEMA.load(data)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     user_message = data.get('message')
     clear_history = data.get('clearHistory', False)
     session_id = data.get('sessionId', SESSION_ID)
-    patient_id = data.get('patientId')
-    doctor_id = data.get('doctorId')
+    patient_id = ids.get('patientId')
+    doctor_id = ids.get('doctorId')
+    prefetch_context = data.get('prefetchContext', PREFETCH_CONTEXT)
+    tool_results = []
     
     try:
         if clear_history:
-            if session_id in chat_sessions:
-                del chat_sessions[session_id]
-            if session_id in clients:
-                del clients[session_id]
+            sessions.delete_history(session_id)
             return jsonify({'reply': 'Chat history cleared'})
         
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # Get or create client
-        if session_id not in clients:
-            clients[session_id] = genai.Client()
-        
-        # Create chat with function declarations
-        if session_id not in chat_sessions:
-            system_instruction = """You are a helpful healthcare assistant for caregivers managing patient care. 
-            You can help with:
-            1. Creating appointments and calendar events
-            2. Generating health reports with patient information
-            3. Recommending community events and resources
-            
-            Be friendly, clear, and helpful. When creating appointments, confirm the details with the user.
-            Always prioritize patient safety and encourage users to consult healthcare professionals for medical decisions."""
-            
-            chat_sessions[session_id] = clients[session_id].chats.create(
-                model="gemini-2.5-flash",
-                config={
-                    "system_instruction": system_instruction,
-                    "tools": [types.Tool(function_declarations=get_function_declarations())]
-                }
-            )
-        
-        chat = chat_sessions[session_id]
-        response = chat.send_message(user_message)
+        deadline = time.monotonic() + TURN_DEADLINE_S
+        entry = get_chat_session(session_id)
+        chat = entry.chat
+        # Attach the patient's data to this turn's system instruction rather than the
+        # message itself, so it is not repeated in the stored history. A per-call
+        # config replaces the chat's own, so every turn passes the full one
+        patient_context = None
+        if patient_id and prefetch_context:
+            patient_context = get_patient_context(patient_id)
+        turn_config = get_chat_config(patient_context)
+        response = call_model(chat.send_message, user_message, config=turn_config, deadline=deadline)
         
         # Handle function calls
         if response.candidates and response.candidates[0].content.parts:
@@ -242,6 +339,8 @@ def chat_gemini():
                             patient_id=patient_id,
                             doctor_id=doctor_id
                         )
+                        if patient_id and result.get('success'):
+                            invalidate_patient_context(patient_id)
                     elif func_name == "generate_health_report":
                         result = generate_health_report_impl(
                             patient_id=func_args.get('patient_id', patient_id)
@@ -249,28 +348,41 @@ def chat_gemini():
                     elif func_name == "recommend_community_events":
                         result = recommend_community_events_impl(
                             category=func_args.get('category'),
-                            limit=func_args.get('limit', 5)
+                            limit=func_args.get('limit', 5),
+                            patient_id=patient_id
                         )
                     
                     # Send function result back to model
                     if result:
-                        function_response = types.Part.from_function_response(
+                        tool_results.append(result)
+                        function_response = genai_types().Part.from_function_response(
                             name=func_name,
                             response=result
                         )
-                        follow_up = chat.send_message(function_response)
+                        follow_up = call_model(chat.send_message, function_response, config=turn_config, deadline=deadline)
                         if follow_up.text:
                             final_reply += follow_up.text
             
+            persist_chat_session(session_id, entry)
             return jsonify({'reply': final_reply or response.text})
         
+        persist_chat_session(session_id, entry)
         return jsonify({'reply': response.text})
+    except sessions.HistoryConflict:
+        db.session.rollback()
+        sessions.evict(session_id)
+        return jsonify({'error': 'The conversation was changed elsewhere and this turn was not saved, '
+                                 'please send it again'}), 409
+    except ModelUnavailable as e:
+        print(f"Chat degraded: {e}")
+        db.session.rollback()
+        # The in-memory chat may hold a half-finished turn; rebuild it from stored history
+        sessions.evict(session_id)
+        return fallback_response(e, tool_results)
     except Exception as e:
         print(f"Chat error: {e}")
         import traceback
         traceback.print_exc()
-        if session_id in chat_sessions:
-            del chat_sessions[session_id]
-        if session_id in clients:
-            del clients[session_id]
+        db.session.rollback()
+        sessions.evict(session_id)
         return jsonify({'error': str(e)}), 500
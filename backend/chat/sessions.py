@@ -0,0 +1,120 @@
+"""
+Chat session persistence.
+
+History is stored append-only in ``chat_messages`` (one row per Content, keyed by
+session_id + seq) so any worker can rehydrate a conversation. Each worker keeps a
+bounded LRU of live chat objects in front of the table. A cached chat is reused
+only if nothing was stored after it, which one probe of the (session_id, seq)
+index checks; when another worker has served the session since, the chat is
+rebuilt from the table before the model sees it.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import os
+import threading
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ChatMessage
+
+MAX_CACHED_SESSIONS = int(os.getenv('CHAT_CACHE_SIZE', '512'))
+APPEND_ATTEMPTS = 3
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class HistoryConflict(Exception):
+    """The turn could not be appended because other workers kept advancing the session"""
+
+
+class CachedChat:
+    __slots__ = ('chat', 'persisted')
+
+    def __init__(self, chat, persisted):
+        self.chat = chat
+        # Number of history entries already written to chat_messages
+        self.persisted = persisted
+
+
+def get_cached(session_id):
+    with _lock:
+        entry = _cache.get(session_id)
+        if entry is not None:
+            _cache.move_to_end(session_id)
+        return entry
+
+
+def put_cached(session_id, chat, persisted):
+    entry = CachedChat(chat, persisted)
+    with _lock:
+        _cache[session_id] = entry
+        _cache.move_to_end(session_id)
+        while len(_cache) > MAX_CACHED_SESSIONS:
+            _cache.popitem(last=False)
+    return entry
+
+
+def evict(session_id):
+    with _lock:
+        _cache.pop(session_id, None)
+
+
+def stored_length(session_id):
+    """Number of history entries stored for a session (its next seq)"""
+    return db.session.execute(
+        select(func.coalesce(func.max(ChatMessage.seq) + 1, 0)).where(ChatMessage.session_id == session_id)
+    ).scalar()
+
+
+def load_history(session_id):
+    """Load the stored history for a session as genai Content objects."""
+    from google.genai import types
+    rows = (
+        db.session.query(ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.seq)
+        .all()
+    )
+    return [types.Content.model_validate(row.content) for row in rows]
+
+
+def append_history(session_id, start_seq, contents):
+    """
+    Append new history entries in a single multi-row INSERT.
+
+    If another worker already wrote these sequence numbers, the entries are
+    written after its entries instead, and False is returned: the turn is saved,
+    but our cached chat no longer matches storage and should be rehydrated on
+    the next turn. Raises HistoryConflict if that keeps failing.
+    """
+    if not contents:
+        return True
+    now = datetime.utcnow()
+    rows = [
+        {
+            'session_id': session_id,
+            'role': content.role or 'user',
+            'content': content.model_dump(mode='json', exclude_none=True),
+            'created_at': now,
+        }
+        for content in contents
+    ]
+    seq = start_seq
+    for _ in range(APPEND_ATTEMPTS):
+        try:
+            db.session.execute(insert(ChatMessage), [dict(row, seq=seq + i) for i, row in enumerate(rows)])
+            db.session.commit()
+            return seq == start_seq
+        except IntegrityError:
+            db.session.rollback()
+            seq = stored_length(session_id)
+    raise HistoryConflict(session_id)
+
+
+def delete_history(session_id):
+    evict(session_id)
+    db.session.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
+    db.session.commit()
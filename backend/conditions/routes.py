@@ -1,30 +1,45 @@
 from flask import Blueprint, request, jsonify
-from models import Condition, Patient, db
+from models import Condition, ConditionStatusChange, db
+from writes import update_returning, write_error
+from events.hub import emit_change
+from schemas import Schema, Field, accepts, integer, string, boolean, timestamp
 from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 
 conditions_bp = Blueprint('conditions', __name__)
 
+CONDITION_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'status': Field(string(50), default=None),
+    'onset_date': Field(timestamp, default=None),
+    'note': Field(string(), default=None),
+    'active': Field(boolean, default=True, nullable=False),
+})
+CONDITION_UPDATE_SCHEMA = CONDITION_SCHEMA.partial('status', 'onset_date', 'note', 'active')
+
+# The condition and its first status history row in one statement
+CREATE_CONDITION_SQL = text("""
+WITH c AS (
+    INSERT INTO conditions (patient_id, status, onset_date, note, active, created_at)
+    VALUES (:patient_id, :status, :onset_date, :note, :active, :created_at)
+    RETURNING cid, patient_id, status, coalesce(onset_date, created_at) AS changed_at
+)
+INSERT INTO condition_status_changes (condition_id, patient_id, status, changed_at)
+SELECT cid, patient_id, status, changed_at FROM c
+RETURNING condition_id
+""")
+
 @conditions_bp.route('/', methods=['POST'])
-def create_condition():
-    data = request.get_json()
-    required_fields = ['patient_id']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    patient = Patient.query.get(data['patient_id'])
-    if not patient:
-        return jsonify({'error': 'Patient not found'}), 404
-    condition = Condition(
-        patient_id=data['patient_id'],
-        status=data.get('status'),
-        onset_date=data.get('onset_date'),
-        note=data.get('note'),
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
-    db.session.add(condition)
+@accepts(CONDITION_SCHEMA)
+def create_condition(data):
+    try:
+        cid = db.session.execute(CREATE_CONDITION_SQL, {**data, 'created_at': datetime.utcnow()}).scalar_one()
+    except IntegrityError as e:
+        return write_error(e, {'patient_id': 'Patient not found'})
+    emit_change('conditions', 'created', cid, data['patient_id'])
     db.session.commit()
-    return jsonify({'message': 'Condition created', 'cid': condition.cid}), 201
+    return jsonify({'message': 'Condition created', 'cid': cid}), 201
 
 @conditions_bp.route('/<int:cid>', methods=['GET'])
 def get_condition(cid):
@@ -43,7 +58,10 @@ def get_condition(cid):
 
 @conditions_bp.route('/', methods=['GET'])
 def list_conditions():
-    conditions = Condition.query.all()
+    query = Condition.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    conditions = query.all()
     return jsonify([
         {
             'cid': c.cid,
@@ -57,22 +75,28 @@ def list_conditions():
     ])
 
 @conditions_bp.route('/<int:cid>', methods=['PUT'])
-def update_condition(cid):
-    condition = Condition.query.get(cid)
-    if not condition:
+@accepts(CONDITION_UPDATE_SCHEMA)
+def update_condition(data, cid):
+    changed = update_returning(Condition, cid, data)
+    if changed is None:
         return jsonify({'error': 'Condition not found'}), 404
-    data = request.get_json()
-    for field in ['status', 'onset_date', 'note', 'active']:
-        if field in data:
-            setattr(condition, field, data[field])
+    before, condition = changed
+    if condition.status != before.status:
+        # Status history feeds the wellness trend engine
+        db.session.add(ConditionStatusChange(
+            condition_id=condition.cid,
+            patient_id=condition.patient_id,
+            status=condition.status
+        ))
+    emit_change('conditions', 'updated', condition.cid, condition.patient_id)
     db.session.commit()
     return jsonify({'message': 'Condition updated'})
 
 @conditions_bp.route('/<int:cid>', methods=['DELETE'])
 def delete_condition(cid):
-    condition = Condition.query.get(cid)
-    if not condition:
+    changed = update_returning(Condition, cid, {'active': False})
+    if changed is None:
         return jsonify({'error': 'Condition not found'}), 404
-    db.session.delete(condition)
+    emit_change('conditions', 'deleted', cid, changed[1].patient_id)
     db.session.commit()
     return jsonify({'message': 'Condition deleted'})
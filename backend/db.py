@@ -1,6 +1,10 @@
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
 import os
+import random
 
 load_dotenv()
 
@@ -9,8 +13,36 @@ POSTGRES_PASSWORD = "POSTGRES_PASSWORD"
 POSTGRES_HOST = "POSTGRES_HOST"
 POSTGRES_PORT = "POSTGRES_PORT"
 POSTGRES_DB = "POSTGRES_DB"
+# Comma-separated host:port list of read replicas, e.g. "localhost:5433,localhost:5434"
+POSTGRES_REPLICAS = "POSTGRES_REPLICAS"
+
+replica_engines = []
+
+
+class RoutingSession(Session):
+    """
+    Sends a request's queries to a read replica when the request was marked as
+    read-only (see routing.py), and everything else to the primary. Flushes and
+    DML always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and replica_engines and not self._flushing
+                and not getattr(clause, 'is_dml', False)
+                and has_request_context() and g.get('db_target') == 'replica'):
+            return g.setdefault('db_replica', random.choice(replica_engines))
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def database_url(host, port):
+    user = os.getenv(POSTGRES_USER)
+    password = os.getenv(POSTGRES_PASSWORD)
+    database = os.getenv(POSTGRES_DB)
+    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{database}"
 
-db = SQLAlchemy()
 
 def init_db(app):
     user = os.getenv(POSTGRES_USER)
@@ -18,10 +50,18 @@ def init_db(app):
     host = os.getenv(POSTGRES_HOST)
     port = os.getenv(POSTGRES_PORT)
     database = os.getenv(POSTGRES_DB)
-    
+
     if not all([user, password, host, port, database]):
         raise ValueError("Missing required database environment variables")
-    
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url(host, port)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db.init_app(app)
\ No newline at end of file
+    db.init_app(app)
+
+    replica_engines.clear()
+    for replica in filter(None, (os.getenv(POSTGRES_REPLICAS) or '').split(',')):
+        replica_host, _, replica_port = replica.strip().partition(':')
+        replica_engines.append(create_engine(
+            database_url(replica_host, replica_port or port),
+            pool_pre_ping=True
+        ))
@@ -0,0 +1,197 @@
+"""
+Change notifications for connected clients.
+
+Blueprints call ``emit_change`` inside their write transaction. It issues a
+Postgres NOTIFY, which the database delivers only if that transaction commits,
+and to every worker process. Each process runs one LISTEN thread that fans an
+event out to the subscribers of the caretaker it belongs to, so the cost of an
+event is proportional to that caretaker's open streams, not to all connections.
+
+The stream endpoint holds a connection open per client; run it under a green
+thread worker (gevent) to keep thousands of them per process. Under a thread
+worker every stream pins a thread, so EVENTS_MAX_STREAMS caps them per process
+(``gunicorn.conf.py`` sets it for gthread) and further clients get 503 until
+one disconnects.
+"""
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+from models import db
+
+CHANNEL = 'care_changes'
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+# Open streams per process; 0 for no limit
+MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', '0'))
+LISTEN_POLL_S = 5.0
+RECONNECT_DELAY_S = 2.0
+
+NOTIFY_SQL = text("""
+SELECT pg_notify(:channel, json_build_object(
+    'caretaker_id', p.caretaker_id,
+    'patient_id', p.pid,
+    'type', CAST(:type AS text),
+    'action', CAST(:action AS text),
+    'id', CAST(:id AS integer)
+)::text)
+FROM patients p
+WHERE p.pid = :patient_id
+""")
+
+NOTIFY_MANY_SQL = text("""
+SELECT pg_notify(:channel, json_build_object(
+    'caretaker_id', p.caretaker_id,
+    'patient_id', p.pid,
+    'type', CAST(:type AS text),
+    'action', CAST(:action AS text),
+    'id', r.id
+)::text)
+FROM patients p, unnest(CAST(:ids AS integer[])) AS r(id)
+WHERE p.pid = :patient_id
+""")
+
+# Sent to a subscriber that fell too far behind; it should resync and reconnect
+OVERFLOW = object()
+
+
+def emit_change(type_, action, row_id, patient_id):
+    """Queue a change notification; it is delivered when the current transaction commits"""
+    db.session.execute(NOTIFY_SQL, {
+        'channel': CHANNEL,
+        'type': type_,
+        'action': action,
+        'id': row_id,
+        'patient_id': patient_id,
+    })
+
+
+def emit_changes(type_, action, row_ids, patient_id):
+    """``emit_change`` for several rows of one patient, in one statement"""
+    if not row_ids:
+        return
+    db.session.execute(NOTIFY_MANY_SQL, {
+        'channel': CHANNEL,
+        'type': type_,
+        'action': action,
+        'ids': list(row_ids),
+        'patient_id': patient_id,
+    })
+
+
+class Hub:
+    def __init__(self):
+        self._subscribers = {}
+        self._handlers = {CHANNEL: self.publish}
+        self._watchers = []
+        self._lock = threading.Lock()
+        self._listener = None
+        self._dsn = None
+
+    def subscribe(self, caretaker_id):
+        """A queue of the caretaker's changes, or None when MAX_STREAMS are open"""
+        self._ensure_listener()
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if MAX_STREAMS and sum(len(s) for s in self._subscribers.values()) >= MAX_STREAMS:
+                return None
+            self._subscribers.setdefault(caretaker_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, caretaker_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(caretaker_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[caretaker_id]
+
+    def add_handler(self, channel, handler):
+        """Also LISTEN on ``channel`` and pass its payloads to ``handler``; call before start()"""
+        self._handlers[channel] = handler
+
+    def watch(self, callback):
+        """Also call ``callback(change)`` with every change written by any worker"""
+        self._watchers.append(callback)
+
+    def start(self):
+        """Start the LISTEN thread if it is not running; needs an app context"""
+        self._ensure_listener()
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, payload):
+        """Deliver a raw NOTIFY payload to the local subscribers of its caretaker"""
+        try:
+            change = json.loads(payload)
+            caretaker_id = change['caretaker_id']
+        except (ValueError, KeyError, TypeError):
+            return
+        for callback in self._watchers:
+            callback(change)
+        with self._lock:
+            subscribers = list(self._subscribers.get(caretaker_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # A slow client must not hold up the others
+                self.unsubscribe(caretaker_id, subscriber)
+                _force_put(subscriber, OVERFLOW)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            # psycopg2 wants a plain libpq URL without the SQLAlchemy driver suffix
+            self._dsn = db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+            self._listener = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self._dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    for channel in self._handlers:
+                        cursor.execute(f'LISTEN {channel}')
+                while True:
+                    if select.select([conn], [], [], LISTEN_POLL_S) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        handler = self._handlers.get(notify.channel)
+                        if handler is not None:
+                            handler(notify.payload)
+            except Exception as e:
+                print(f"Events listener error: {e}")
+                if conn is not None:
+                    conn.close()
+                time.sleep(RECONNECT_DELAY_S)
+
+
+def _force_put(subscriber, item):
+    try:
+        subscriber.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        subscriber.put_nowait(item)
+    except queue.Full:
+        pass
+
+
+hub = Hub()
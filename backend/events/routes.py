@@ -0,0 +1,48 @@
+from flask import Blueprint, Response, request, jsonify
+import os
+import queue
+from events.hub import hub, OVERFLOW
+
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_S = float(os.getenv('EVENTS_HEARTBEAT_S', '20'))
+RETRY_S = 5
+
+
+@events_bp.route('/stream', methods=['GET'])
+def stream_events():
+    caretaker_id = request.args.get('caretaker_id', type=int)
+    if caretaker_id is None:
+        return jsonify({'error': 'Missing required parameter: caretaker_id'}), 400
+    subscriber = hub.subscribe(caretaker_id)
+    if subscriber is None:
+        response = jsonify({'error': 'Too many open event streams', 'retry_after': RETRY_S})
+        response.headers['Retry-After'] = str(RETRY_S)
+        return response, 503
+
+    def generate():
+        try:
+            yield f'retry: {RETRY_S * 1000}\n\n'
+            while True:
+                try:
+                    payload = subscriber.get(timeout=HEARTBEAT_S)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                if payload is OVERFLOW:
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                yield f'event: change\ndata: {payload}\n\n'
+        finally:
+            hub.unsubscribe(caretaker_id, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@events_bp.route('/stats', methods=['GET'])
+def event_stats():
+    return jsonify({'connections': hub.connection_count()})
@@ -0,0 +1,145 @@
+"""
+Local fake of the Gemini generateContent API for offline and load testing.
+
+Point the backend at it with:
+
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://localhost:5055 python main.py
+
+and start it with, for example:
+
+    python fake_model_server.py --latency-ms 800 --jitter-ms 400 --error-rate 0.1 --function-call-rate 0.5
+
+Settings can also be changed while it runs with POST /_fake/config.
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+
+config = {
+    'latency_ms': 300,
+    'jitter_ms': 200,
+    'error_rate': 0.0,
+    'rate_limit_rate': 0.0,
+    'stall_rate': 0.0,
+    'stall_s': 120,
+    'function_call_rate': 0.3,
+}
+_config_lock = threading.Lock()
+
+# Plausible arguments for the tools declared in chat/routes.py
+CANNED_ARGS = {
+    'create_appointment': lambda: {
+        'title': 'Follow-up visit',
+        'date': (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%d'),
+        'start_time': '10:00',
+        'end_time': '10:30',
+        'location': 'Community Clinic',
+    },
+    'generate_health_report': lambda: {'patient_id': 1},
+    'recommend_community_events': lambda: {'category': 'health', 'limit': 3},
+}
+
+
+def error_body(code, status, message):
+    return jsonify({'error': {'code': code, 'status': status, 'message': message}}), code
+
+
+def text_response(text):
+    return jsonify({
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'text': text}]},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': len(text.split()), 'totalTokenCount': 0},
+        'modelVersion': 'fake-model',
+    })
+
+
+def function_call_response(name, args):
+    return jsonify({
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'functionCall': {'name': name, 'args': args}}]},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'modelVersion': 'fake-model',
+    })
+
+
+def declared_functions(body):
+    names = []
+    for tool in body.get('tools') or []:
+        for decl in tool.get('functionDeclarations') or []:
+            names.append(decl['name'])
+    return names
+
+
+@app.route('/_fake/config', methods=['GET', 'POST'])
+def fake_config():
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        with _config_lock:
+            for key, value in data.items():
+                if key in config:
+                    config[key] = type(config[key])(value)
+    return jsonify(config)
+
+
+@app.route('/<version>/models/<path:target>', methods=['POST'])
+def generate_content(version, target):
+    model, _, method = target.partition(':')
+    if method not in ('generateContent', 'streamGenerateContent'):
+        return error_body(404, 'NOT_FOUND', f'Unknown method {method}')
+    with _config_lock:
+        cfg = dict(config)
+
+    time.sleep((cfg['latency_ms'] + random.uniform(0, cfg['jitter_ms'])) / 1000)
+    roll = random.random()
+    if roll < cfg['stall_rate']:
+        time.sleep(cfg['stall_s'])
+    roll = random.random()
+    if roll < cfg['error_rate']:
+        return error_body(503, 'UNAVAILABLE', 'The model is overloaded. Please try again later.')
+    if roll < cfg['error_rate'] + cfg['rate_limit_rate']:
+        return error_body(429, 'RESOURCE_EXHAUSTED', 'Resource has been exhausted.')
+
+    body = request.get_json() or {}
+    contents = body.get('contents') or []
+    last_parts = contents[-1].get('parts', []) if contents else []
+    responses = [p['functionResponse'] for p in last_parts if 'functionResponse' in p]
+    if responses:
+        names = ', '.join(r.get('name', '?') for r in responses)
+        return text_response(f'[{model}] Here is what I found using {names}.')
+
+    functions = declared_functions(body)
+    if functions and random.random() < cfg['function_call_rate']:
+        name = random.choice(functions)
+        args = CANNED_ARGS.get(name, dict)()
+        return function_call_response(name, args)
+
+    user_text = ' '.join(p.get('text', '') for p in last_parts)
+    return text_response(f'[{model}] You said: {user_text[:200]}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Gemini model server')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency-ms', type=int, default=config['latency_ms'])
+    parser.add_argument('--jitter-ms', type=int, default=config['jitter_ms'])
+    parser.add_argument('--error-rate', type=float, default=config['error_rate'])
+    parser.add_argument('--rate-limit-rate', type=float, default=config['rate_limit_rate'])
+    parser.add_argument('--stall-rate', type=float, default=config['stall_rate'])
+    parser.add_argument('--stall-s', type=int, default=config['stall_s'])
+    parser.add_argument('--function-call-rate', type=float, default=config['function_call_rate'])
+    args = parser.parse_args()
+    for key in config:
+        config[key] = getattr(args, key)
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
@@ -0,0 +1,91 @@
+"""
+Gunicorn settings for ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Everything is read from the environment, so one file covers every deployment:
+
+- WEB_WORKER_CLASS: ``gevent`` (default), ``gthread`` or ``sync``. Chat turns
+  wait seconds on the model and every ``/events`` stream stays open for as long
+  as the client is connected, so a worker needs many requests in flight. gevent
+  holds each one in a green thread. gthread ties up one OS thread per request
+  for its whole length, so a few streams would take every thread. It is the
+  fallback when gevent is not installed. A ``sync`` worker serves one request at
+  a time and kills streams after WEB_TIMEOUT.
+- WEB_WORKERS: processes, default ``2 * CPUs + 1`` for sync and ``CPUs + 1``
+  otherwise.
+- WEB_THREADS: threads per gthread worker (default 8). Keep it above
+  CHAT_MAX_CONCURRENT so chat cannot take every thread. Under gthread,
+  EVENTS_MAX_STREAMS defaults to ``WEB_THREADS - CHAT_MAX_CONCURRENT - 1``, so
+  streams and chat together always leave a thread for the other routes.
+- WEB_WORKER_CONNECTIONS: concurrent requests per gevent worker (default 200).
+  gevent needs ``pip install gevent psycogreen``.
+- WEB_PRELOAD: build the app in the master and fork workers from it (default 1).
+- WEB_MAX_REQUESTS / WEB_MAX_REQUESTS_JITTER: recycle a worker after about this
+  many requests (default 2000 +- 200, 0 turns it off). The jitter keeps workers
+  from restarting together. A recycled worker finishes its in-flight requests
+  within WEB_GRACEFUL_TIMEOUT.
+"""
+
+import gc
+import importlib.util
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+worker_class = os.getenv('WEB_WORKER_CLASS') or (
+    'gevent' if importlib.util.find_spec('gevent') is not None else 'gthread')
+cpus = multiprocessing.cpu_count()
+workers = int(os.getenv('WEB_WORKERS', str(2 * cpus + 1 if worker_class == 'sync' else cpus + 1)))
+threads = int(os.getenv('WEB_THREADS', '8')) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', '200'))
+preload_app = os.getenv('WEB_PRELOAD', '1') == '1'
+
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '200'))
+# Longer than a chat turn (CHAT_TURN_DEADLINE_S) so no turn is cut off. gthread and
+# gevent workers keep heartbeating while requests run, so this only catches hung
+# workers there
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+if worker_class == 'gthread':
+    # Each stream pins a thread; keep them and the chat bulkhead (default 4 in
+    # chat/admission.py) from taking all of them. Set before the app is loaded
+    chat_slots = int(os.getenv('CHAT_MAX_CONCURRENT', '4'))
+    os.environ.setdefault('EVENTS_MAX_STREAMS', str(max(1, threads - chat_slots - 1)))
+
+if worker_class == 'gevent':
+    # Patch before the app is preloaded, so the locks and sockets it creates are
+    # cooperative
+    from gevent import monkey
+    # aggressive=False keeps select.epoll for now: httpcore, under the model
+    # SDK's client, imports trio when it is installed, and trio needs epoll at
+    # import. It is loaded below, before gunicorn's worker patches again and
+    # removes epoll; the workers inherit it
+    monkey.patch_all(aggressive=False)
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        print('psycogreen is not installed; database calls will block the gevent worker')
+    try:
+        import httpcore  # noqa: F401
+    except ImportError:
+        pass
+
+
+def when_ready(server):
+    # Objects created while preloading never change; keep the collector from
+    # touching them in the workers, which would copy their pages
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import wsgi
+        wsgi.reset_after_fork()
@@ -0,0 +1,350 @@
+"""
+Bulk import of medications, tasks and appointments.
+
+Records come from ``imports.parsers`` one at a time. They are validated,
+collected into batches of IMPORT_BATCH_SIZE, and each batch resolves its
+patient and user references with one query per table. The batch is then written
+with a single multi-row INSERT and committed on its own. A bad line is reported
+with its line number and does not stop the import. Text fields are checked
+against their column lengths with the request schema parsers. If the database
+still rejects a batch, its rows are retried one at a time, so only the lines
+that fail are reported. Memory use depends on the batch size, not the file size.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+import os
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import insert, text
+
+from models import db, Medication, Task, Appointment, TaskStatus, Priority
+from stats.counters import apply_change, OPEN_STATUSES, PRIORITY_COLUMNS
+from events.hub import emit_change
+from imports.parsers import iter_csv, iter_ics
+from schemas import ValidationError, parse_field, string
+from writes import NOT_NULL_VIOLATION, FOREIGN_KEY_VIOLATION, UNIQUE_VIOLATION, CHECK_VIOLATION
+
+BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+MAX_REPORTED_ERRORS = 1000
+DEFAULT_APPOINTMENT_MINUTES = 60
+
+PATIENTS_SQL = text("SELECT pid, caretaker_id FROM patients WHERE pid = ANY(:ids) AND active")
+USERS_BY_ID_SQL = text("SELECT uid FROM users WHERE uid = ANY(:ids)")
+USERS_BY_EMAIL_SQL = text("SELECT uid, lower(email) AS email FROM users WHERE lower(email) = ANY(:emails)")
+
+# Reported for a row the database rejects; the driver's message is not shown to the uploader
+WRITE_ERRORS = {
+    NOT_NULL_VIOLATION: 'a required value is missing',
+    FOREIGN_KEY_VIOLATION: 'references a record that does not exist',
+    UNIQUE_VIOLATION: 'duplicates an existing record',
+    CHECK_VIOLATION: 'has an invalid value',
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError(f'invalid date/time: {value!r}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_ics_datetime(value, params=None):
+    """DTSTART/DTEND value as naive UTC; floating times are taken as UTC"""
+    params = params or {}
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            return datetime.strptime(value, '%Y%m%d')
+        if value.endswith('Z'):
+            return datetime.strptime(value, '%Y%m%dT%H%M%SZ')
+        parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise RowError(f'invalid date/time: {value!r}')
+    if 'TZID' in params:
+        try:
+            zone = ZoneInfo(params['TZID'].strip('"'))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise RowError(f"unknown time zone: {params['TZID']!r}")
+        parsed = parsed.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_int(record, key, required=False):
+    value = record.get(key)
+    if value is None or value == '':
+        if required:
+            raise RowError(f'missing {key}')
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{key} must be an integer')
+
+
+def parse_text(record, key, max_length=None, value=None):
+    """A text field checked like the write routes check it; empty values become None"""
+    value = record.get(key) if value is None else value
+    if value is None or value == '':
+        return None
+    try:
+        return parse_field(key, string(max_length), value)
+    except ValidationError as e:
+        raise RowError(str(e))
+
+
+def parse_enum(enum_type, value, default):
+    if not value:
+        return default
+    try:
+        return enum_type(value.lower())
+    except ValueError:
+        raise RowError(f'invalid {enum_type.__name__.lower()}: {value!r}')
+
+
+def ics_to_appointment(event):
+    """Map a VEVENT to appointment fields; X-PATIENT-ID / X-DOCTOR-ID or ORGANIZER name the people"""
+    if 'DTSTART' not in event:
+        raise RowError('missing DTSTART')
+    start = parse_ics_datetime(event['DTSTART'], event.get('DTSTART;params'))
+    if 'DTEND' in event:
+        end = parse_ics_datetime(event['DTEND'], event.get('DTEND;params'))
+    else:
+        end = start + timedelta(minutes=DEFAULT_APPOINTMENT_MINUTES)
+    record = {
+        'start_time': start,
+        'end_time': end,
+        'location': event.get('LOCATION') or event.get('SUMMARY'),
+        'patient_id': event.get('X-PATIENT-ID'),
+        'doctor_id': event.get('X-DOCTOR-ID'),
+    }
+    organizer = event.get('ORGANIZER', '')
+    if organizer.lower().startswith('mailto:'):
+        record['doctor_email'] = organizer[len('mailto:'):]
+    return record
+
+
+# Each builder turns a record into (column values, user column, user email to resolve)
+
+def build_medication(record):
+    if not record.get('name'):
+        raise RowError('missing name')
+    row = {
+        'patient_id': parse_int(record, 'patient_id', required=True),
+        'name': parse_text(record, 'name', 200),
+        'dose': parse_text(record, 'dose', 100),
+        'schedule_text': parse_text(record, 'schedule_text', value=record.get('schedule_text') or record.get('schedule')),
+        'start_date': parse_datetime(record['start_date']) if record.get('start_date') else None,
+        'end_date': parse_datetime(record['end_date']) if record.get('end_date') else None,
+        'prescriber_id': parse_int(record, 'prescriber_id'),
+    }
+    return row, 'prescriber_id', record.get('prescriber_email')
+
+
+def build_task(record):
+    if not record.get('title'):
+        raise RowError('missing title')
+    row = {
+        'patient_id': parse_int(record, 'patient_id', required=True),
+        'caretaker_id': parse_int(record, 'caretaker_id'),
+        'title': parse_text(record, 'title', 200),
+        'description': parse_text(record, 'description'),
+        'due_at': parse_datetime(record['due_at']) if record.get('due_at') else None,
+        'status': parse_enum(TaskStatus, record.get('status'), TaskStatus.PENDING),
+        'priority': parse_enum(Priority, record.get('priority'), Priority.MEDIUM),
+    }
+    return row, 'caretaker_id', None
+
+
+def build_appointment(record):
+    for key in ('start_time', 'end_time'):
+        if not record.get(key):
+            raise RowError(f'missing {key}')
+    row = {
+        'patient_id': parse_int(record, 'patient_id', required=True),
+        'doctor_id': parse_int(record, 'doctor_id'),
+        'start_time': parse_datetime(record['start_time']),
+        'end_time': parse_datetime(record['end_time']),
+        'location': parse_text(record, 'location', 200),
+    }
+    if row['end_time'] < row['start_time']:
+        raise RowError('end_time is before start_time')
+    if row['doctor_id'] is None and not record.get('doctor_email'):
+        raise RowError('missing doctor_id or doctor_email')
+    return row, 'doctor_id', record.get('doctor_email')
+
+
+KINDS = {
+    'medications': (Medication, build_medication),
+    'tasks': (Task, build_task),
+    'appointments': (Appointment, build_appointment),
+}
+FORMATS = ('csv', 'ics')
+
+
+def stats_counts(kind, row):
+    if kind == 'tasks':
+        return {PRIORITY_COLUMNS[row['priority']]: 1} if row['status'] in OPEN_STATUSES else {}
+    return {'active_medications' if kind == 'medications' else 'active_appointments': 1}
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.lines = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'lines': self.lines,
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        }
+
+
+def resolve_batch(batch, report):
+    """Check patient and user references for a batch in one query per table; drop rows that fail"""
+    patient_ids = {row['patient_id'] for _, row, _, _ in batch}
+    user_ids = {row[column] for _, row, column, _ in batch} - {None}
+    emails = {email.lower() for _, _, _, email in batch if email}
+
+    caretakers = dict(db.session.execute(PATIENTS_SQL, {'ids': list(patient_ids)}).all())
+    known_users = {uid for uid, in db.session.execute(USERS_BY_ID_SQL, {'ids': list(user_ids)})} if user_ids else set()
+    users_by_email = ({email: uid for uid, email in db.session.execute(USERS_BY_EMAIL_SQL, {'emails': list(emails)})}
+                      if emails else {})
+
+    resolved = []
+    for line, row, column, email in batch:
+        if row['patient_id'] not in caretakers:
+            report.error(line, f"patient {row['patient_id']} not found")
+            continue
+        user_id = row[column]
+        if user_id is not None and user_id not in known_users:
+            report.error(line, f'{column} {user_id} not found')
+            continue
+        if user_id is None and email:
+            if email.lower() not in users_by_email:
+                report.error(line, f'no user with email {email}')
+                continue
+            row[column] = users_by_email[email.lower()]
+        if column == 'caretaker_id' and row[column] is None:
+            # Tasks default to the patient's caretaker
+            row[column] = caretakers[row['patient_id']]
+        resolved.append((line, row))
+    return resolved
+
+
+def insert_rows(kind, model, rows):
+    """Insert resolved rows with their stats and change events in one transaction"""
+    now = datetime.utcnow()
+    values = [dict(row, active=True, created_at=now) for _, row in rows]
+    counts = defaultdict(Counter)
+    for row in values:
+        counts[row['patient_id']].update(stats_counts(kind, row))
+    db.session.execute(insert(model.__table__), values)
+    for patient_id, patient_counts in counts.items():
+        apply_change(after=(patient_id, patient_counts))
+        emit_change(kind, 'imported', None, patient_id)
+    db.session.commit()
+
+
+def write_error_message(error):
+    code = getattr(getattr(error, 'orig', None), 'pgcode', None)
+    return f"could not be saved: {WRITE_ERRORS.get(code, 'the database rejected it')}"
+
+
+def write_batch(kind, model, batch, report):
+    rows = resolve_batch(batch, report)
+    if not rows:
+        db.session.rollback()
+        return
+    try:
+        insert_rows(kind, model, rows)
+        report.inserted += len(rows)
+        return
+    except Exception:
+        db.session.rollback()
+    # Find the lines the database rejects; the rest still go in
+    for line, row in rows:
+        try:
+            insert_rows(kind, model, [(line, row)])
+            report.inserted += 1
+        except Exception as e:
+            db.session.rollback()
+            report.error(line, write_error_message(e))
+
+
+def import_stream(kind, fmt, stream, defaults=None, batch_size=BATCH_SIZE):
+    """
+    Import every record in a text stream; returns an ImportReport.
+
+    ``defaults`` fills fields a record leaves empty, e.g. ``{'patient_id': 3}``
+    for a calendar that belongs to one patient.
+    """
+    model, build = KINDS[kind]
+    if fmt == 'ics' and kind != 'appointments':
+        raise ValueError('iCalendar files can only be imported as appointments')
+    defaults = {key: value for key, value in (defaults or {}).items() if value is not None}
+    report = ImportReport(kind)
+    batch = []
+    for line, record in (iter_ics(stream) if fmt == 'ics' else iter_csv(stream)):
+        report.lines += 1
+        try:
+            if fmt == 'ics':
+                record = ics_to_appointment(record)
+            for key, value in defaults.items():
+                if record.get(key) in (None, ''):
+                    record[key] = value
+            row, user_column, user_email = build(record)
+        except RowError as e:
+            report.error(line, str(e))
+            continue
+        batch.append((line, row, user_column, user_email))
+        if len(batch) >= batch_size:
+            write_batch(kind, model, batch, report)
+            batch = []
+    if batch:
+        write_batch(kind, model, batch, report)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import medications, tasks or appointments from CSV or iCalendar')
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension')
+    parser.add_argument('--patient-id', type=int, help='for records that do not name a patient')
+    parser.add_argument('--doctor-id', type=int, help='for appointments that do not name a doctor')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = args.format or ('ics' if args.path.lower().endswith('.ics') else 'csv')
+
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        with open(args.path, encoding='utf-8-sig', newline='') as f:
+            report = import_stream(args.kind, fmt, f, {'patient_id': args.patient_id, 'doctor_id': args.doctor_id},
+                                   batch_size=args.batch_size)
+    result = report.as_dict()
+    print(f"{result['inserted']} of {result['lines']} {args.kind} imported, {result['error_count']} errors")
+    for error in result['errors']:
+        print(f"  line {error['line']}: {error['error']}")
@@ -0,0 +1,71 @@
+"""
+Streaming readers for imported files.
+
+Both readers take a text stream and yield ``(line number, record)`` one record
+at a time, so memory stays flat however large the file is.
+"""
+
+import csv
+import re
+
+ESCAPE = re.compile(r'\\([\\;,nN])')
+
+
+def iter_csv(stream):
+    """Rows of a CSV file with a header line, as dicts with stripped values"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {}
+        for key, value in row.items():
+            if key is None:
+                continue
+            value = (value or '').strip()
+            if value:
+                record[key.strip().lower()] = value
+        yield reader.line_num, record
+
+
+def _unfold(stream):
+    """Join RFC 5545 folded lines; yields (line number of the first physical line, line)"""
+    pending, start = None, 0
+    for number, raw in enumerate(stream, start=1):
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = line, number
+    if pending is not None:
+        yield start, pending
+
+
+def _unescape(value):
+    return ESCAPE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def iter_ics(stream):
+    """
+    VEVENTs of an iCalendar file as dicts of property name -> value.
+
+    Parameters are kept under ``<NAME>;params`` (e.g. ``DTSTART;params`` holds
+    ``{'TZID': 'Europe/London'}``) so the loader can interpret times.
+    """
+    event, start = None, 0
+    for number, line in _unfold(stream):
+        if line == 'BEGIN:VEVENT':
+            event, start = {}, number
+            continue
+        if line == 'END:VEVENT':
+            if event is not None:
+                yield start, event
+            event = None
+            continue
+        if event is None or ':' not in line:
+            continue
+        head, value = line.split(':', 1)
+        name, *params = head.split(';')
+        name = name.upper()
+        event[name] = _unescape(value)
+        if params:
+            event[f'{name};params'] = dict(p.split('=', 1) for p in params if '=' in p)
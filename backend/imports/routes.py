@@ -0,0 +1,39 @@
+from flask import Blueprint, request, jsonify
+import io
+from models import db
+from imports.loader import import_stream, KINDS, FORMATS
+
+imports_bp = Blueprint('imports', __name__)
+
+
+def request_text_stream():
+    """The uploaded file (multipart ``file`` field) or the raw body, decoded as it is read"""
+    if 'file' in request.files:
+        return request.files['file'].stream, request.files['file'].filename or ''
+    return io.BufferedReader(request.stream), ''
+
+
+# Body is the CSV or .ics file itself, or a multipart upload in "file". CSV
+# columns are the model's field names; see README for the details.
+@imports_bp.route('/<kind>', methods=['POST'])
+def import_file(kind):
+    if kind not in KINDS:
+        return jsonify({'error': f'kind must be one of: {", ".join(sorted(KINDS))}'}), 400
+    binary, filename = request_text_stream()
+    fmt = request.args.get('format')
+    if fmt is None:
+        is_ics = filename.lower().endswith('.ics') or request.mimetype == 'text/calendar'
+        fmt = 'ics' if is_ics else 'csv'
+    if fmt not in FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(FORMATS)}'}), 400
+    defaults = {
+        'patient_id': request.args.get('patient_id', type=int),
+        'doctor_id': request.args.get('doctor_id', type=int),
+    }
+    stream = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+    try:
+        report = import_stream(kind, fmt, stream, defaults)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report.as_dict()), 200
@@ -0,0 +1,80 @@
+"""
+Job handlers by kind.
+
+A handler takes the job payload and returns a JSON-serializable result. Heavy
+modules are imported inside the handler so registering them stays cheap.
+"""
+
+HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+@job_handler('health_report')
+def health_report(payload):
+    from chat.routes import generate_health_report_impl
+    result = generate_health_report_impl(payload['patient_id'])
+    if not result.get('success'):
+        raise ValueError(result.get('error', 'Report generation failed'))
+    return result['report']
+
+
+@job_handler('patient_export')
+def patient_export(payload):
+    from models import Patient, Task, Appointment, Medication, Condition, Reminder, Recommendation
+    from sync.routes import serialize_row
+    patient = Patient.query.get(payload['patient_id'])
+    if not patient:
+        raise ValueError('Patient not found')
+    export = {'patient': serialize_row(Patient, patient)}
+    for name, model in [('tasks', Task), ('appointments', Appointment), ('medications', Medication),
+                        ('conditions', Condition), ('reminders', Reminder), ('recommendations', Recommendation)]:
+        rows = model.query.filter_by(patient_id=patient.pid).yield_per(1000)
+        export[name] = [serialize_row(model, row) for row in rows]
+    return export
+
+
+@job_handler('wellness_recompute')
+def wellness_recompute(payload):
+    from wellness import engine
+    if payload.get('patient_ids'):
+        count = engine.recompute_patients(sorted(payload['patient_ids']))
+    else:
+        count = engine.recompute_all()
+    return {'patients': count}
+
+
+@job_handler('archive_inactive')
+def archive_inactive(payload):
+    from archival import archive_inactive
+    options = {key: payload[key] for key in ('after_days', 'batch_size') if key in payload}
+    return archive_inactive(**options)
+
+
+@job_handler('report_render')
+def report_render(payload):
+    from reports.render import render_report
+    return render_report(payload['patient_id'], payload.get('format', 'html'))
+
+
+@job_handler('recommendations_refresh')
+def recommendations_refresh(payload):
+    from recommendations.batch import refresh_range, MAX_PID
+    return refresh_range(payload.get('from_pid', 1), payload.get('to_pid', MAX_PID))
+
+
+@job_handler('patient_purge')
+def patient_purge(payload):
+    from patients.purge import purge_patient
+    return purge_patient(payload['patient_id'])
+
+
+@job_handler('user_purge')
+def user_purge(payload):
+    from patients.purge import purge_user
+    return purge_user(payload['user_id'])
@@ -0,0 +1,134 @@
+"""
+Database-backed job queue.
+
+Jobs live in the ``jobs`` table. Workers claim the most urgent runnable job with
+``FOR UPDATE SKIP LOCKED`` so any number of them can poll concurrently without
+blocking each other; failures are retried with jittered backoff until
+``max_attempts``, and jobs held by a worker that died are requeued by
+``requeue_stale``.
+
+A claim is a lease: the worker bumps ``locked_at`` with ``heartbeat`` while the
+job runs, so only a job whose worker stopped heartbeating for JOB_TIMEOUT_S is
+requeued, however long the job itself takes. Completing or failing a job only
+counts for the worker that still holds it, so a worker that lost its lease
+cannot overwrite the outcome of the one that took the job over.
+"""
+
+from datetime import datetime, timedelta
+import os
+import random
+
+from sqlalchemy import text
+
+from models import db, Job
+
+JOB_TIMEOUT_S = int(os.getenv('JOB_TIMEOUT_S', '600'))
+RETRY_BASE_S = float(os.getenv('JOB_RETRY_BASE_S', '10'))
+RETRY_MAX_S = float(os.getenv('JOB_RETRY_MAX_S', '600'))
+HEARTBEAT_INTERVAL_S = float(os.getenv('JOB_HEARTBEAT_INTERVAL_S', str(JOB_TIMEOUT_S / 4)))
+
+CLAIM_SQL = text("""
+UPDATE jobs
+SET status = 'RUNNING', attempts = attempts + 1, locked_by = :worker,
+    locked_at = timezone('utc', now())
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE status = 'QUEUED' AND run_after <= timezone('utc', now())
+    ORDER BY priority DESC, run_after, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, payload, attempts, max_attempts
+""")
+
+COMPLETE_SQL = text("""
+UPDATE jobs
+SET status = 'SUCCEEDED', result = CAST(:result AS json), error = NULL,
+    locked_by = NULL, finished_at = timezone('utc', now())
+WHERE id = :id AND locked_by = :worker
+""")
+
+HEARTBEAT_SQL = text("""
+UPDATE jobs SET locked_at = timezone('utc', now())
+WHERE id = :id AND locked_by = :worker AND status = 'RUNNING'
+""")
+
+RETRY_SQL = text("""
+UPDATE jobs
+SET status = 'QUEUED', error = :error, locked_by = NULL, locked_at = NULL, run_after = :run_after
+WHERE id = :id AND locked_by = :worker
+""")
+
+FAIL_SQL = text("""
+UPDATE jobs
+SET status = 'FAILED', error = :error, locked_by = NULL, finished_at = timezone('utc', now())
+WHERE id = :id AND locked_by = :worker
+""")
+
+REQUEUE_STALE_SQL = text("""
+UPDATE jobs
+SET status = CASE WHEN attempts >= max_attempts THEN 'FAILED'::jobstatus ELSE 'QUEUED'::jobstatus END,
+    error = 'Worker stopped responding',
+    finished_at = CASE WHEN attempts >= max_attempts THEN timezone('utc', now()) END,
+    locked_by = NULL, locked_at = NULL
+WHERE status = 'RUNNING' AND locked_at < timezone('utc', now()) - make_interval(secs => :timeout)
+""")
+
+
+def enqueue(kind, payload=None, priority=0, max_attempts=3, run_after=None):
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        priority=priority,
+        max_attempts=max_attempts,
+        run_after=run_after or datetime.utcnow(),
+        created_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim(worker_id):
+    """Claim the next runnable job, or return None if there is none"""
+    row = db.session.execute(CLAIM_SQL, {'worker': worker_id}).mappings().first()
+    db.session.commit()
+    return {**row, 'worker': worker_id} if row else None
+
+
+def heartbeat(engine, job):
+    """
+    Renew the lease on a running job; returns False if the worker no longer
+    holds it. Takes an engine rather than the session so it can run from a
+    thread next to the job.
+    """
+    with engine.begin() as conn:
+        return conn.execute(HEARTBEAT_SQL, {'id': job['id'], 'worker': job['worker']}).rowcount == 1
+
+
+def complete(job, result_json):
+    """Record the result; returns False if the lease was lost and nothing was written"""
+    result = db.session.execute(COMPLETE_SQL, {'id': job['id'], 'worker': job['worker'], 'result': result_json})
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def fail(job, error):
+    """
+    Record a failed attempt; retry later unless the job is out of attempts.
+    Returns False if the lease was lost and nothing was written.
+    """
+    params = {'id': job['id'], 'worker': job['worker'], 'error': error}
+    if job['attempts'] < job['max_attempts']:
+        delay = random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * 2 ** job['attempts']))
+        result = db.session.execute(RETRY_SQL, {**params, 'run_after': datetime.utcnow() + timedelta(seconds=delay)})
+    else:
+        result = db.session.execute(FAIL_SQL, params)
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def requeue_stale(timeout_s=JOB_TIMEOUT_S):
+    result = db.session.execute(REQUEUE_STALE_SQL, {'timeout': timeout_s})
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,62 @@
+from flask import Blueprint, jsonify
+from models import db, Job
+from jobs import queue
+from schemas import Schema, Field, ValidationError, accepts, integer
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Kinds anyone may queue here. The purges are queued only by the authenticated
+# DELETE /patients/<pid>?purge=true route, or from the command line
+PUBLIC_KINDS = ('health_report', 'patient_export', 'wellness_recompute', 'archive_inactive', 'report_render',
+                'recommendations_refresh')
+
+
+def public_kind(value):
+    if value not in PUBLIC_KINDS:
+        raise ValidationError(f'must be one of {", ".join(sorted(PUBLIC_KINDS))}')
+    return value
+
+
+def json_object(value):
+    if not isinstance(value, dict):
+        raise ValidationError('expected an object')
+    return value
+
+
+JOB_SCHEMA = Schema({
+    'kind': Field(public_kind, required=True),
+    'payload': Field(json_object, default={}),
+    'priority': Field(integer, default=0, nullable=False),
+})
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status.value,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': job.result,
+        'error': job.error,
+    }
+
+
+# Queue a slow operation; poll GET /jobs/<id> for the result
+@jobs_bp.route('/', methods=['POST'])
+@accepts(JOB_SCHEMA)
+def create_job(data):
+    job = queue.enqueue(data['kind'], data['payload'] or {}, priority=data['priority'])
+    response = jsonify({'job_id': job.id, 'status': job.status.value})
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(serialize_job(job)), 200
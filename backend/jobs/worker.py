@@ -0,0 +1,118 @@
+"""
+Job worker pool.
+
+    python -m jobs.worker --processes 4
+
+Each process builds its own app (no web layer) and polls the queue. While a job
+runs, a thread renews its lease every JOB_HEARTBEAT_INTERVAL_S. Every
+REAP_INTERVAL_S, busy or idle, a worker also requeues the jobs of workers that
+stopped renewing theirs. SIGTERM or
+Ctrl-C lets running jobs finish before the processes exit.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+
+POLL_INTERVAL_S = float(os.getenv('JOB_POLL_INTERVAL_S', '1'))
+REAP_INTERVAL_S = 60
+
+
+def keep_lease(engine, job, stop):
+    """Heartbeat the job's lease until ``stop`` is set or the lease is lost"""
+    from jobs import queue
+    while not stop.wait(queue.HEARTBEAT_INTERVAL_S):
+        try:
+            if not queue.heartbeat(engine, job):
+                print(f"[{job['worker']}] lost the lease on job {job['id']}")
+                return
+        except Exception:
+            traceback.print_exc()
+
+
+def run_job(job):
+    from jobs import queue
+    from jobs.handlers import HANDLERS
+    from models import db
+
+    handler = HANDLERS.get(job['kind'])
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=keep_lease, args=(db.engine, job, stop_heartbeat), daemon=True).start()
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job['kind']}")
+        result = handler(job['payload'] or {})
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        db.session.rollback()
+    else:
+        error = None
+    finally:
+        stop_heartbeat.set()
+    if error is not None:
+        recorded = queue.fail(job, error)
+    else:
+        recorded = queue.complete(job, json.dumps(result, default=str))
+    if not recorded:
+        print(f"[{job['worker']}] job {job['id']} was taken over by another worker; its outcome was dropped")
+    return error is None
+
+
+def worker_loop(index, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from main import create_app
+    from jobs import queue
+    from models import db
+
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+    app = create_app(with_blueprints=False)
+    with app.app_context():
+        next_reap = time.monotonic()
+        while not stop.is_set():
+            try:
+                if time.monotonic() >= next_reap:
+                    next_reap = time.monotonic() + REAP_INTERVAL_S
+                    requeued = queue.requeue_stale()
+                    if requeued:
+                        print(f"[{worker_id}] requeued {requeued} stale jobs")
+                job = queue.claim(worker_id)
+            except Exception:
+                db.session.rollback()
+                traceback.print_exc()
+                stop.wait(POLL_INTERVAL_S)
+                continue
+            if job is not None:
+                run_job(job)
+                db.session.remove()
+                continue
+            stop.wait(POLL_INTERVAL_S)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run job workers')
+    parser.add_argument('--processes', type=int, default=int(os.getenv('JOB_WORKERS', '2')))
+    args = parser.parse_args()
+
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=worker_loop, args=(i, stop), daemon=False)
+               for i in range(args.processes)]
+    for worker in workers:
+        worker.start()
+
+    def shutdown(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == '__main__':
+    main()
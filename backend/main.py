@@ -1,36 +1,34 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager
-from sqlalchemy import text
-from db import init_db, db
-from models import *
-from auth.routes import auth_bp
-from chat.routes import chat_bp
-from patients.routes import patients_bp
-from tasks.routes import tasks_bp
-from resources.routes import resources_bp
-from conditions.routes import conditions_bp
-from medications.routes import medications_bp
-from recommendations.routes import recommendations_bp
-from appointments.routes import appointments_bp
+from flask import Flask, jsonify, request
 from dotenv import load_dotenv
+import importlib
 import os
 
-load_dotenv()
+# (module, blueprint attribute, url prefix). Modules are imported when the app is
+# built, not when this file is imported, and keep their heavy dependencies (the
+# model SDK, NumPy) behind function-level imports.
+BLUEPRINTS = [
+    ('auth.routes', 'auth_bp', '/auth'),
+    ('chat.routes', 'chat_bp', '/chat'),
+    ('patients.routes', 'patients_bp', '/patients'),
+    ('tasks.routes', 'tasks_bp', '/tasks'),
+    ('resources.routes', 'resources_bp', '/resources'),
+    ('conditions.routes', 'conditions_bp', '/conditions'),
+    ('medications.routes', 'medications_bp', '/medications'),
+    ('recommendations.routes', 'recommendations_bp', '/recommendations'),
+    ('appointments.routes', 'appointments_bp', '/appointments'),
+    ('reminders.routes', 'reminders_bp', '/reminders'),
+    ('stats.routes', 'stats_bp', '/stats'),
+    ('wellness.routes', 'wellness_bp', '/wellness'),
+    ('sync.routes', 'sync_bp', '/sync'),
+    ('events.routes', 'events_bp', '/events'),
+    ('jobs.routes', 'jobs_bp', '/jobs'),
+    ('reports.routes', 'reports_bp', '/reports'),
+    ('imports.routes', 'imports_bp', '/imports'),
+    ('calendars.routes', 'calendars_bp', '/calendars'),
+]
 
-app = Flask(__name__)
-app.config['JWT_SECRET_KEY'] = os.getenv('SECRET_KEY')
 
-CORS(app, 
-     resources={r"/*": {"origins": "*"}},
-     allow_headers=["Content-Type", "Authorization"],
-     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     supports_credentials=True)
-
-@app.before_request
 def handle_preflight():
-    from flask import request
     if request.method == "OPTIONS":
         response = jsonify({'status': 'ok'})
         response.headers.add("Access-Control-Allow-Origin", "*")
@@ -38,23 +36,56 @@ def handle_preflight():
         response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
         return response, 200
 
-init_db(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(chat_bp, url_prefix='/chat')
-app.register_blueprint(patients_bp, url_prefix='/patients')
-app.register_blueprint(tasks_bp, url_prefix='/tasks')
-app.register_blueprint(resources_bp, url_prefix='/resources')
-app.register_blueprint(conditions_bp, url_prefix='/conditions')
-app.register_blueprint(medications_bp, url_prefix='/medications')
-app.register_blueprint(recommendations_bp, url_prefix='/recommendations')
-app.register_blueprint(appointments_bp, url_prefix='/appointments')
-
-@app.route('/', methods=['GET'])
+
 def health():
     return jsonify({'status': 'ok'}), 200
 
+
+def register_blueprints(app):
+    for module_name, attr, url_prefix in BLUEPRINTS:
+        module = importlib.import_module(module_name)
+        app.register_blueprint(getattr(module, attr), url_prefix=url_prefix)
+
+
+def create_app(with_blueprints=True):
+    """
+    Build the Flask app.
+
+    CLI scripts that only need the database pass ``with_blueprints=False`` and
+    skip the web layer entirely.
+    """
+    from db import init_db, db
+    from schemas import FastJSONProvider
+    import models  # noqa: F401 - registers the models with Flask-Migrate
+
+    load_dotenv()
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config['JWT_SECRET_KEY'] = os.getenv('SECRET_KEY')
+    init_db(app)
+
+    if with_blueprints:
+        from flask_cors import CORS
+        from flask_migrate import Migrate
+        from flask_jwt_extended import JWTManager
+
+        CORS(app,
+             resources={r"/*": {"origins": "*"}},
+             allow_headers=["Content-Type", "Authorization"],
+             methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+             supports_credentials=True)
+        app.before_request(handle_preflight)
+        import routing
+        routing.init_app(app)
+        from audit import log as audit_log
+        audit_log.init_app(app)
+        Migrate(app, db)
+        JWTManager(app)
+        register_blueprints(app)
+        app.add_url_rule('/', 'health', health, methods=['GET'])
+
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True, port=5001)
+    create_app().run(host='0.0.0.0', debug=True, port=5001)
@@ -1,36 +1,38 @@
 from flask import Blueprint, request, jsonify
-from models import Medication, Patient, User, db
+from models import Medication, db
+from stats.counters import apply_change, medication_snapshot
+from events.hub import emit_change
+from writes import insert_returning, update_returning, write_error
+from schemas import Schema, Field, accepts, integer, string, boolean, timestamp
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 
 medications_bp = Blueprint('medications', __name__)
 
+MEDICATION_REFERENCES = {'patient_id': 'Patient not found', 'prescriber_id': 'Prescriber not found'}
+
+MEDICATION_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'name': Field(string(200), required=True),
+    'dose': Field(string(100)),
+    'schedule_text': Field(string()),
+    'start_date': Field(timestamp),
+    'end_date': Field(timestamp),
+    'prescriber_id': Field(integer),
+    'active': Field(boolean, default=True, nullable=False),
+})
+MEDICATION_UPDATE_SCHEMA = MEDICATION_SCHEMA.partial('name', 'dose', 'schedule_text', 'start_date', 'end_date',
+                                                     'prescriber_id', 'active')
+
 @medications_bp.route('/', methods=['POST'])
-def create_medication():
-    data = request.get_json()
-    required_fields = ['patient_id', 'name']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    patient = Patient.query.get(data['patient_id'])
-    if not patient:
-        return jsonify({'error': 'Patient not found'}), 404
-    prescriber = None
-    if data.get('prescriber_id'):
-        prescriber = User.query.get(data['prescriber_id'])
-        if not prescriber:
-            return jsonify({'error': 'Prescriber not found'}), 404
-    medication = Medication(
-        patient_id=data['patient_id'],
-        name=data['name'],
-        dose=data.get('dose'),
-        schedule_text=data.get('schedule_text'),
-        start_date=data.get('start_date'),
-        end_date=data.get('end_date'),
-        prescriber_id=data.get('prescriber_id'),
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
-    db.session.add(medication)
+@accepts(MEDICATION_SCHEMA)
+def create_medication(data):
+    try:
+        medication = insert_returning(Medication, {**data, 'created_at': datetime.utcnow()})
+    except IntegrityError as e:
+        return write_error(e, MEDICATION_REFERENCES)
+    apply_change(after=medication_snapshot(medication))
+    emit_change('medications', 'created', medication.mid, medication.patient_id)
     db.session.commit()
     return jsonify({'message': 'Medication created', 'mid': medication.mid}), 201
 
@@ -54,7 +56,10 @@ def get_medication(mid):
 
 @medications_bp.route('/', methods=['GET'])
 def list_medications():
-    medications = Medication.query.all()
+    query = Medication.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    medications = query.all()
     return jsonify([
         {
             'mid': m.mid,
@@ -71,22 +76,27 @@ def list_medications():
     ])
 
 @medications_bp.route('/<int:mid>', methods=['PUT'])
-def update_medication(mid):
-    medication = Medication.query.get(mid)
-    if not medication:
+@accepts(MEDICATION_UPDATE_SCHEMA)
+def update_medication(data, mid):
+    try:
+        changed = update_returning(Medication, mid, data)
+    except IntegrityError as e:
+        return write_error(e, MEDICATION_REFERENCES)
+    if changed is None:
         return jsonify({'error': 'Medication not found'}), 404
-    data = request.get_json()
-    for field in ['name', 'dose', 'schedule_text', 'start_date', 'end_date', 'prescriber_id', 'active']:
-        if field in data:
-            setattr(medication, field, data[field])
+    before, medication = changed
+    apply_change(medication_snapshot(before), medication_snapshot(medication))
+    emit_change('medications', 'updated', medication.mid, medication.patient_id)
     db.session.commit()
     return jsonify({'message': 'Medication updated'})
 
 @medications_bp.route('/<int:mid>', methods=['DELETE'])
 def delete_medication(mid):
-    medication = Medication.query.get(mid)
-    if not medication:
+    changed = update_returning(Medication, mid, {'active': False})
+    if changed is None:
         return jsonify({'error': 'Medication not found'}), 404
-    db.session.delete(medication)
+    before, medication = changed
+    apply_change(medication_snapshot(before), medication_snapshot(medication))
+    emit_change('medications', 'deleted', medication.mid, medication.patient_id)
     db.session.commit()
     return jsonify({'message': 'Medication deleted'})
@@ -0,0 +1,47 @@
+"""jobs queue
+
+Revision ID: 01b339a3a092
+Revises: 49d38d324b40
+Create Date: 2026-10-19 13:52:16.470093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '01b339a3a092'
+down_revision = '49d38d324b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='jobstatus'), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_claimable', 'jobs', [sa.text('priority DESC'), 'run_after', 'id'],
+                    postgresql_where=sa.text("status = 'QUEUED'"))
+    op.create_index('ix_jobs_running_locked', 'jobs', ['locked_at'],
+                    postgresql_where=sa.text("status = 'RUNNING'"))
+
+
+def downgrade():
+    op.drop_index('ix_jobs_running_locked', table_name='jobs')
+    op.drop_index('ix_jobs_claimable', table_name='jobs')
+    op.drop_table('jobs')
+    sa.Enum(name='jobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,55 @@
+"""wellness aggregates
+
+Revision ID: 2748bf9bf201
+Revises: dfe982aff327
+Create Date: 2026-10-19 10:48:55.201377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2748bf9bf201'
+down_revision = 'dfe982aff327'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('condition_status_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('condition_id', sa.Integer(), nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['condition_id'], ['conditions.cid'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.pid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_condition_status_changes_patient_changed', 'condition_status_changes',
+                    ['patient_id', 'changed_at'])
+    op.create_table('wellness_aggregates',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('series', sa.JSON(), nullable=False),
+    sa.Column('trend', sa.String(length=20), nullable=False),
+    sa.Column('slope', sa.Float(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.pid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id', 'granularity')
+    )
+
+    # Existing conditions only have their current status; record it at onset
+    op.execute("""
+        INSERT INTO condition_status_changes (condition_id, patient_id, status, changed_at)
+        SELECT cid, patient_id, status, coalesce(onset_date, created_at, now())
+        FROM conditions
+    """)
+
+
+def downgrade():
+    op.drop_table('wellness_aggregates')
+    op.drop_index('ix_condition_status_changes_patient_changed', table_name='condition_status_changes')
+    op.drop_table('condition_status_changes')
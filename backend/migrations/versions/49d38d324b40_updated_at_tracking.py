@@ -0,0 +1,50 @@
+"""updated_at tracking for delta sync
+
+Revision ID: 49d38d324b40
+Revises: 8245ed9da891
+Create Date: 2026-10-19 12:20:48.307519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '49d38d324b40'
+down_revision = '8245ed9da891'
+branch_labels = None
+depends_on = None
+
+SYNCED_TABLES = ['tasks', 'appointments', 'medications', 'conditions', 'reminders']
+
+
+def upgrade():
+    # clock_timestamp() rather than now() so a row's stamp is close to its commit
+    # time even inside a longer transaction
+    op.execute("""
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := timezone('utc', clock_timestamp());
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in SYNCED_TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("timezone('utc', now())")))
+        op.add_column(f'{table}_archive', sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table}_patient_updated', table, ['patient_id', 'updated_at'])
+        op.execute(f"""
+            CREATE TRIGGER trg_{table}_updated_at
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at()
+        """)
+
+
+def downgrade():
+    for table in SYNCED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_updated_at ON {table}")
+        op.drop_index(f'ix_{table}_patient_updated', table_name=table)
+        op.drop_column(f'{table}_archive', 'updated_at')
+        op.drop_column(table, 'updated_at')
+    op.execute("DROP FUNCTION IF EXISTS set_updated_at()")
@@ -0,0 +1,34 @@
+"""generated recommendations
+
+Revision ID: 4a9c0d7e3b58
+Revises: e81d4c2a9f06
+Create Date: 2026-10-19 17:42:09.861530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9c0d7e3b58'
+down_revision = 'e81d4c2a9f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('recommendations', 'recommendations_archive'):
+        op.add_column(table, sa.Column('resource_id', sa.Integer(), nullable=True))
+        op.add_column(table, sa.Column('score', sa.Float(), nullable=True))
+    op.create_foreign_key('recommendations_resource_id_fkey', 'recommendations', 'resources',
+                          ['resource_id'], ['rid'])
+    op.create_index('ux_recommendations_patient_resource', 'recommendations', ['patient_id', 'resource_id'],
+                    unique=True, postgresql_where=sa.text('resource_id IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ux_recommendations_patient_resource', table_name='recommendations')
+    op.drop_constraint('recommendations_resource_id_fkey', 'recommendations', type_='foreignkey')
+    for table in ('recommendations', 'recommendations_archive'):
+        op.drop_column(table, 'score')
+        op.drop_column(table, 'resource_id')
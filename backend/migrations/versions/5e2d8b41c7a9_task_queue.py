@@ -0,0 +1,48 @@
+"""task priority rank and claims
+
+Revision ID: 5e2d8b41c7a9
+Revises: a7c3e91f5d20
+Create Date: 2026-10-19 15:22:47.903118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2d8b41c7a9'
+down_revision = 'a7c3e91f5d20'
+branch_labels = None
+depends_on = None
+
+PRIORITY_RANK_SQL = "CASE priority WHEN 'URGENT' THEN 4 WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 ELSE 1 END"
+OPEN_TASK_SQL = "active AND status IN ('PENDING', 'IN_PROGRESS')"
+
+
+def upgrade():
+    op.add_column('tasks', sa.Column('priority_rank', sa.SmallInteger(),
+                                     sa.Computed(PRIORITY_RANK_SQL, persisted=True), nullable=True))
+    op.add_column('tasks', sa.Column('claimed_by', sa.Integer(), nullable=True))
+    op.add_column('tasks', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.create_foreign_key('tasks_claimed_by_fkey', 'tasks', 'users', ['claimed_by'], ['uid'])
+    for column, type_ in [('priority_rank', sa.SmallInteger()), ('claimed_by', sa.Integer()),
+                          ('claimed_at', sa.DateTime())]:
+        op.add_column('tasks_archive', sa.Column(column, type_, nullable=True))
+
+    op.create_index('ix_tasks_next_caretaker', 'tasks',
+                    ['caretaker_id', sa.text('priority_rank DESC'), 'due_at', 'tid'],
+                    postgresql_where=sa.text(OPEN_TASK_SQL))
+    op.create_index('ix_tasks_next_patient', 'tasks',
+                    ['patient_id', sa.text('priority_rank DESC'), 'due_at', 'tid'],
+                    postgresql_where=sa.text(OPEN_TASK_SQL))
+
+
+def downgrade():
+    op.drop_index('ix_tasks_next_patient', table_name='tasks')
+    op.drop_index('ix_tasks_next_caretaker', table_name='tasks')
+    for column in ['claimed_at', 'claimed_by', 'priority_rank']:
+        op.drop_column('tasks_archive', column)
+    op.drop_constraint('tasks_claimed_by_fkey', 'tasks', type_='foreignkey')
+    op.drop_column('tasks', 'claimed_at')
+    op.drop_column('tasks', 'claimed_by')
+    op.drop_column('tasks', 'priority_rank')
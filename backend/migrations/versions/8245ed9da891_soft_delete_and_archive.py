@@ -0,0 +1,71 @@
+"""soft delete and archive tables
+
+Revision ID: 8245ed9da891
+Revises: 2748bf9bf201
+Create Date: 2026-10-19 11:37:02.664120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8245ed9da891'
+down_revision = '2748bf9bf201'
+branch_labels = None
+depends_on = None
+
+SOFT_DELETE_TABLES = ['patients', 'tasks', 'reminders', 'resources', 'conditions',
+                      'medications', 'appointments', 'recommendations']
+
+# table -> primary key column
+ARCHIVE_TABLES = {
+    'reminders': 'rid',
+    'tasks': 'tid',
+    'appointments': 'aid',
+    'medications': 'mid',
+    'conditions': 'cid',
+    'recommendations': 'rid',
+    'resources': 'rid',
+}
+
+# index name -> (table, columns)
+ACTIVE_INDEXES = {
+    'ix_tasks_active_patient': ('tasks', ['patient_id']),
+    'ix_reminders_active_task': ('reminders', ['task_id']),
+    'ix_resources_active_category': ('resources', ['category']),
+    'ix_conditions_active_patient': ('conditions', ['patient_id']),
+    'ix_medications_active_patient': ('medications', ['patient_id']),
+    'ix_recommendations_active_patient': ('recommendations', ['patient_id']),
+}
+
+
+def upgrade():
+    for table in SOFT_DELETE_TABLES:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    # Rows that were already inactive start ageing from their creation time
+    for table in SOFT_DELETE_TABLES:
+        created = 'now()' if table == 'reminders' else 'coalesce(created_at, now())'
+        op.execute(f"UPDATE {table} SET deleted_at = {created} WHERE NOT active")
+
+    for name, (table, columns) in ACTIVE_INDEXES.items():
+        op.create_index(name, table, columns, postgresql_where=sa.text('active'))
+    for table in ARCHIVE_TABLES:
+        op.create_index(f'ix_{table}_inactive_deleted', table, ['deleted_at'],
+                        postgresql_where=sa.text('NOT active'))
+
+    for table, pk in ARCHIVE_TABLES.items():
+        op.execute(f"CREATE TABLE {table}_archive (LIKE {table})")
+        op.execute(f"ALTER TABLE {table}_archive ADD PRIMARY KEY ({pk})")
+        op.add_column(f'{table}_archive', sa.Column('archived_at', sa.DateTime(), nullable=False,
+                                                    server_default=sa.text('now()')))
+
+
+def downgrade():
+    for table in ARCHIVE_TABLES:
+        op.drop_table(f'{table}_archive')
+        op.drop_index(f'ix_{table}_inactive_deleted', table_name=table)
+    for name, (table, columns) in ACTIVE_INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in SOFT_DELETE_TABLES:
+        op.drop_column(table, 'deleted_at')
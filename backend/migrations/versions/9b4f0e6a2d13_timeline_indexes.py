@@ -0,0 +1,49 @@
+"""timeline indexes
+
+Revision ID: 9b4f0e6a2d13
+Revises: 5e2d8b41c7a9
+Create Date: 2026-10-19 15:58:31.640271
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4f0e6a2d13'
+down_revision = '5e2d8b41c7a9'
+branch_labels = None
+depends_on = None
+
+# index name -> (table, columns, predicate)
+TIMELINE_INDEXES = {
+    'ix_tasks_active_patient_created': ('tasks', ['patient_id', 'created_at', 'tid'], 'active'),
+    'ix_reminders_active_patient_remind': ('reminders', ['patient_id', 'remind_at', 'rid'], 'active'),
+    'ix_conditions_active_patient_onset': ('conditions', ['patient_id', 'onset_date', 'cid'], 'active'),
+    'ix_medications_active_patient_start': ('medications', ['patient_id', 'start_date', 'mid'], 'active'),
+    'ix_medications_active_patient_end': ('medications', ['patient_id', 'end_date', 'mid'],
+                                          'active AND end_date IS NOT NULL'),
+}
+
+
+def upgrade():
+    for name, (table, columns, predicate) in TIMELINE_INDEXES.items():
+        op.create_index(name, table, columns, postgresql_where=sa.text(predicate))
+    # Existing indexes gain the id so pages come back in full (timestamp, id) order
+    op.drop_index('ix_appointments_active_patient_start', table_name='appointments')
+    op.create_index('ix_appointments_active_patient_start', 'appointments', ['patient_id', 'start_time', 'aid'],
+                    postgresql_where=sa.text('active'))
+    op.drop_index('ix_condition_status_changes_patient_changed', table_name='condition_status_changes')
+    op.create_index('ix_condition_status_changes_patient_changed', 'condition_status_changes',
+                    ['patient_id', 'changed_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_condition_status_changes_patient_changed', table_name='condition_status_changes')
+    op.create_index('ix_condition_status_changes_patient_changed', 'condition_status_changes',
+                    ['patient_id', 'changed_at'])
+    op.drop_index('ix_appointments_active_patient_start', table_name='appointments')
+    op.create_index('ix_appointments_active_patient_start', 'appointments', ['patient_id', 'start_time'],
+                    postgresql_where=sa.text('active'))
+    for name, (table, _, _) in TIMELINE_INDEXES.items():
+        op.drop_index(name, table_name=table)
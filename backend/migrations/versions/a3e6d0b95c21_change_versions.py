@@ -0,0 +1,56 @@
+"""commit-ordered change versions, starting with the resource catalog
+
+Revision ID: a3e6d0b95c21
+Revises: f2b7c94a1d38
+Create Date: 2026-10-19 22:31:40.918254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e6d0b95c21'
+down_revision = 'f2b7c94a1d38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('change_versions',
+    sa.Column('scope', sa.String(length=30), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'owner_id')
+    )
+    # The SET runs with the row locked, so each bump is stamped after the last
+    # committed one and concurrent writers count up one at a time
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_change_version(p_scope text, p_owner_id integer) RETURNS void AS $$
+            INSERT INTO change_versions (scope, owner_id, version, changed_at)
+            VALUES (p_scope, p_owner_id, 1, timezone('utc', clock_timestamp()))
+            ON CONFLICT (scope, owner_id) DO UPDATE
+            SET version = change_versions.version + 1, changed_at = timezone('utc', clock_timestamp())
+        $$ LANGUAGE sql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_resources_version() RETURNS trigger AS $$
+        BEGIN
+            PERFORM bump_change_version('resources', 0);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_resources_version
+        AFTER INSERT OR UPDATE OR DELETE ON resources
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_resources_version()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_resources_version ON resources")
+    op.execute("DROP FUNCTION IF EXISTS bump_resources_version()")
+    op.execute("DROP FUNCTION IF EXISTS bump_change_version(text, integer)")
+    op.drop_table('change_versions')
@@ -0,0 +1,55 @@
+"""audit log
+
+Revision ID: a7c3e91f5d20
+Revises: 01b339a3a092
+Create Date: 2026-10-19 14:41:08.215337
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e91f5d20'
+down_revision = '01b339a3a092'
+branch_labels = None
+depends_on = None
+
+INITIAL_MONTHS = 3
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE audit_log_id_seq")
+    op.create_table('audit_log',
+    sa.Column('id', sa.BigInteger(), server_default=sa.text("nextval('audit_log_id_seq')"), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('actor', sa.String(length=100), nullable=True),
+    sa.Column('ip', sa.String(length=64), nullable=True),
+    sa.Column('action', sa.String(length=20), nullable=False),
+    sa.Column('resource', sa.String(length=50), nullable=False),
+    sa.Column('resource_id', sa.String(length=64), nullable=True),
+    sa.Column('patient_id', sa.Integer(), nullable=True),
+    sa.Column('method', sa.String(length=10), nullable=True),
+    sa.Column('path', sa.String(length=500), nullable=True),
+    sa.Column('status', sa.SmallInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'occurred_at'),
+    postgresql_partition_by='RANGE (occurred_at)'
+    )
+    op.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+    op.create_index('ix_audit_log_patient_time', 'audit_log', ['patient_id', 'occurred_at'])
+    op.create_index('ix_audit_log_actor_time', 'audit_log', ['actor', 'occurred_at'])
+
+    # Monthly partitions from this month on; audit.partitions keeps them ahead of time
+    month = date.today().replace(day=1)
+    for _ in range(INITIAL_MONTHS):
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        op.execute(f"CREATE TABLE audit_log_{month:%Y_%m} PARTITION OF audit_log "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')")
+        month = following
+    op.execute("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT")
+
+
+def downgrade():
+    op.drop_table('audit_log')
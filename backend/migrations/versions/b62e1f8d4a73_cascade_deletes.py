@@ -0,0 +1,68 @@
+"""cascade deletes from patients and users
+
+Revision ID: b62e1f8d4a73
+Revises: 4a9c0d7e3b58
+Create Date: 2026-10-19 18:20:33.104826
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b62e1f8d4a73'
+down_revision = '4a9c0d7e3b58'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, referred column, ON DELETE)
+FOREIGN_KEYS = [
+    ('patients', 'caretaker_id', 'users', 'uid', 'CASCADE'),
+    ('tasks', 'patient_id', 'patients', 'pid', 'CASCADE'),
+    ('tasks', 'claimed_by', 'users', 'uid', 'SET NULL'),
+    ('reminders', 'patient_id', 'patients', 'pid', 'CASCADE'),
+    ('reminders', 'task_id', 'tasks', 'tid', 'CASCADE'),
+    ('conditions', 'patient_id', 'patients', 'pid', 'CASCADE'),
+    ('medications', 'patient_id', 'patients', 'pid', 'CASCADE'),
+    ('medications', 'prescriber_id', 'users', 'uid', 'SET NULL'),
+    ('appointments', 'patient_id', 'patients', 'pid', 'CASCADE'),
+    ('recommendations', 'patient_id', 'patients', 'pid', 'CASCADE'),
+]
+
+# Cascades and SET NULL look rows up by the referencing column
+INDEXES = [
+    ('ix_reminders_task', 'reminders', ['task_id'], None),
+    ('ix_recommendations_patient', 'recommendations', ['patient_id'], None),
+    ('ix_condition_status_changes_condition', 'condition_status_changes', ['condition_id'], None),
+    ('ix_tasks_claimed_by', 'tasks', ['claimed_by'], 'claimed_by IS NOT NULL'),
+    ('ix_medications_prescriber', 'medications', ['prescriber_id'], 'prescriber_id IS NOT NULL'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    names = []
+    for table, column, referred, referred_column, action in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        # NOT VALID skips the full-table check under the ALTER's lock
+        op.create_foreign_key(name, table, referred, [column], [referred_column],
+                              ondelete=action if ondelete else None, postgresql_not_valid=True)
+        names.append((table, name))
+    # Alembic runs a migration in one transaction, which would keep the ALTERs'
+    # locks through the scans. The block commits them first; each VALIDATE then
+    # runs on its own with a lock that does not block writes
+    with op.get_context().autocommit_block():
+        for table, name in names:
+            op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}')
+
+
+def upgrade():
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, postgresql_where=sa.text(where) if where else None)
+    replace_foreign_keys(ondelete=True)
+
+
+def downgrade():
+    replace_foreign_keys(ondelete=False)
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,27 @@
+"""calendar feed indexes
+
+Revision ID: c3a7f5e19b42
+Revises: 9b4f0e6a2d13
+Create Date: 2026-10-19 16:37:12.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a7f5e19b42'
+down_revision = '9b4f0e6a2d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_appointments_doctor_updated', 'appointments', ['doctor_id', 'updated_at'])
+    op.create_index('ix_appointments_active_doctor_start', 'appointments', ['doctor_id', 'start_time', 'aid'],
+                    postgresql_where=sa.text('active'))
+
+
+def downgrade():
+    op.drop_index('ix_appointments_active_doctor_start', table_name='appointments')
+    op.drop_index('ix_appointments_doctor_updated', table_name='appointments')
@@ -0,0 +1,28 @@
+"""index the archived generated recommendations the batch refresh reads
+
+Revision ID: c5e8a1f3b960
+Revises: a3e6d0b95c21
+Create Date: 2026-10-19 23:12:05.331870
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a1f3b960'
+down_revision = 'a3e6d0b95c21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The archive tables are copied without indexes; the refresh reads the
+    # deleted generated pairs of each chunk's pid range from here
+    op.execute("""
+        CREATE INDEX ix_recommendations_archive_generated ON recommendations_archive (patient_id)
+        WHERE resource_id IS NOT NULL AND score IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_recommendations_archive_generated")
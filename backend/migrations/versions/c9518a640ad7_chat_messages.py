@@ -0,0 +1,33 @@
+"""chat messages
+
+Revision ID: c9518a640ad7
+Revises: 2f3139333124
+Create Date: 2026-10-19 09:12:41.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9518a640ad7'
+down_revision = '2f3139333124'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_messages',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('session_id', sa.String(length=128), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=20), nullable=False),
+    sa.Column('content', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('session_id', 'seq', name='uq_chat_messages_session_seq')
+    )
+
+
+def downgrade():
+    op.drop_table('chat_messages')
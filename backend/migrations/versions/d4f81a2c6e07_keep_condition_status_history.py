@@ -0,0 +1,31 @@
+"""keep condition status history when conditions are archived
+
+Revision ID: d4f81a2c6e07
+Revises: b62e1f8d4a73
+Create Date: 2026-10-19 21:04:51.327690
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f81a2c6e07'
+down_revision = 'b62e1f8d4a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The history outlives its condition: archival moves the condition to
+    # conditions_archive, and the wellness trends still read its status changes
+    op.drop_constraint('condition_status_changes_condition_id_fkey', 'condition_status_changes',
+                       type_='foreignkey')
+
+
+def downgrade():
+    op.execute("""
+        DELETE FROM condition_status_changes s
+        WHERE NOT EXISTS (SELECT 1 FROM conditions c WHERE c.cid = s.condition_id)
+    """)
+    op.create_foreign_key('condition_status_changes_condition_id_fkey', 'condition_status_changes',
+                          'conditions', ['condition_id'], ['cid'], ondelete='CASCADE')
@@ -0,0 +1,60 @@
+"""patient stats
+
+Revision ID: dfe982aff327
+Revises: c9518a640ad7
+Create Date: 2026-10-19 10:03:27.540918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dfe982aff327'
+down_revision = 'c9518a640ad7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('patient_stats',
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('open_tasks_low', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('open_tasks_medium', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('open_tasks_high', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('open_tasks_urgent', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('active_medications', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('active_appointments', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.pid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('patient_id')
+    )
+    op.create_index('ix_tasks_open_patient_due', 'tasks', ['patient_id', 'due_at'],
+                    postgresql_where=sa.text("active AND status IN ('PENDING', 'IN_PROGRESS')"))
+    op.create_index('ix_appointments_active_patient_start', 'appointments', ['patient_id', 'start_time'],
+                    postgresql_where=sa.text('active'))
+
+    # Backfill counters from existing rows
+    op.execute("""
+        INSERT INTO patient_stats (patient_id, open_tasks_low, open_tasks_medium, open_tasks_high,
+                                   open_tasks_urgent, active_medications, active_appointments, updated_at)
+        SELECT p.pid,
+               (SELECT count(*) FROM tasks t WHERE t.patient_id = p.pid AND t.active
+                   AND t.status IN ('PENDING', 'IN_PROGRESS') AND t.priority = 'LOW'),
+               (SELECT count(*) FROM tasks t WHERE t.patient_id = p.pid AND t.active
+                   AND t.status IN ('PENDING', 'IN_PROGRESS') AND t.priority = 'MEDIUM'),
+               (SELECT count(*) FROM tasks t WHERE t.patient_id = p.pid AND t.active
+                   AND t.status IN ('PENDING', 'IN_PROGRESS') AND t.priority = 'HIGH'),
+               (SELECT count(*) FROM tasks t WHERE t.patient_id = p.pid AND t.active
+                   AND t.status IN ('PENDING', 'IN_PROGRESS') AND t.priority = 'URGENT'),
+               (SELECT count(*) FROM medications m WHERE m.patient_id = p.pid AND m.active),
+               (SELECT count(*) FROM appointments a WHERE a.patient_id = p.pid AND a.active),
+               now()
+        FROM patients p
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_appointments_active_patient_start', table_name='appointments')
+    op.drop_index('ix_tasks_open_patient_due', table_name='tasks')
+    op.drop_table('patient_stats')
@@ -0,0 +1,36 @@
+"""resource updated_at for the recommendation engine
+
+Revision ID: e81d4c2a9f06
+Revises: c3a7f5e19b42
+Create Date: 2026-10-19 17:05:41.220317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81d4c2a9f06'
+down_revision = 'c3a7f5e19b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('resources', sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                         server_default=sa.text("timezone('utc', now())")))
+    op.add_column('resources_archive', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_resources_updated', 'resources', ['updated_at'])
+    # set_updated_at() was created with the sync tables
+    op.execute("""
+        CREATE TRIGGER trg_resources_updated_at
+        BEFORE INSERT OR UPDATE ON resources
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_resources_updated_at ON resources")
+    op.drop_index('ix_resources_updated', table_name='resources')
+    op.drop_column('resources_archive', 'updated_at')
+    op.drop_column('resources', 'updated_at')
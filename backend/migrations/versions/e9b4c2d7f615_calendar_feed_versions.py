@@ -0,0 +1,49 @@
+"""commit-ordered change versions for the calendar feeds
+
+Revision ID: e9b4c2d7f615
+Revises: c5e8a1f3b960
+Create Date: 2026-10-20 09:14:52.207316
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b4c2d7f615'
+down_revision = 'c5e8a1f3b960'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumps the feed of the patient and doctor on both sides of a change. NEW is
+    # NULL on DELETE and OLD on INSERT, so each side is only read when it exists
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_appointment_versions() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM bump_change_version('appointments:patient', OLD.patient_id);
+                PERFORM bump_change_version('appointments:doctor', OLD.doctor_id);
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.patient_id IS DISTINCT FROM OLD.patient_id) THEN
+                PERFORM bump_change_version('appointments:patient', NEW.patient_id);
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.doctor_id IS DISTINCT FROM OLD.doctor_id) THEN
+                PERFORM bump_change_version('appointments:doctor', NEW.doctor_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Databases that ran an earlier a3e6d0b95c21 already have the trigger
+    op.execute("DROP TRIGGER IF EXISTS trg_appointments_versions ON appointments")
+    op.execute("""
+        CREATE TRIGGER trg_appointments_versions
+        AFTER INSERT OR UPDATE OR DELETE ON appointments
+        FOR EACH ROW EXECUTE FUNCTION bump_appointment_versions()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_appointments_versions ON appointments")
+    op.execute("DROP FUNCTION IF EXISTS bump_appointment_versions()")
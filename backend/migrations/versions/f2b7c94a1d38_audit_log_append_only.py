@@ -0,0 +1,48 @@
+"""audit log is append-only
+
+Revision ID: f2b7c94a1d38
+Revises: d4f81a2c6e07
+Create Date: 2026-10-19 21:48:12.604113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c94a1d38'
+down_revision = 'd4f81a2c6e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # audit.partitions moves rows out of the default partition with
+    # audit.maintenance set for its own transaction; nothing else may change a row.
+    # Old data is removed by detaching or dropping whole partitions
+    op.execute("""
+        CREATE OR REPLACE FUNCTION audit_log_append_only() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('audit.maintenance', true) = 'on' THEN
+                RETURN OLD;
+            END IF;
+            RAISE EXCEPTION 'audit_log is append-only';
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_audit_log_append_only
+        BEFORE UPDATE OR DELETE ON audit_log
+        FOR EACH ROW EXECUTE FUNCTION audit_log_append_only()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_audit_log_no_truncate
+        BEFORE TRUNCATE ON audit_log
+        FOR EACH STATEMENT EXECUTE FUNCTION audit_log_append_only()
+    """)
+    op.execute("REVOKE UPDATE, DELETE, TRUNCATE ON audit_log FROM PUBLIC")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_audit_log_no_truncate ON audit_log")
+    op.execute("DROP TRIGGER IF EXISTS trg_audit_log_append_only ON audit_log")
+    op.execute("DROP FUNCTION IF EXISTS audit_log_append_only()")
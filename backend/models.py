@@ -7,6 +7,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import os
 os.environ["WERKZEUG_PASSWORD_HASH"] = "pbkdf2:sha256"
 
+UTC_NOW = db.text("timezone('utc', now())")
+
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -30,7 +32,7 @@ class Patient(db.Model):
     __tablename__ = 'patients'
 
     pid = db.Column(db.Integer, primary_key=True)
-    caretaker_id = db.Column(db.Integer, db.ForeignKey('users.uid'), unique=True, nullable=False)
+    caretaker_id = db.Column(db.Integer, db.ForeignKey('users.uid', ondelete='CASCADE'), unique=True, nullable=False)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(20))
@@ -38,8 +40,9 @@ class Patient(db.Model):
     emergency_contact = db.Column(db.Text)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
 
-    caretaker = db.relationship('User', backref=db.backref('patient', uselist=False))
+    caretaker = db.relationship('User', backref=db.backref('patient', uselist=False, passive_deletes=True))
 
 
 
@@ -57,39 +60,79 @@ class Priority(enum.Enum):
     HIGH = 'high'
     URGENT = 'urgent'
 
+# Urgency order for ranking; kept explicit so it does not depend on how the enum is declared
+PRIORITY_RANK_SQL = "CASE priority WHEN 'URGENT' THEN 4 WHEN 'HIGH' THEN 3 WHEN 'MEDIUM' THEN 2 ELSE 1 END"
+OPEN_TASK_SQL = "active AND status IN ('PENDING', 'IN_PROGRESS')"
+
 class Task(db.Model):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        db.Index('ix_tasks_patient_updated', 'patient_id', 'updated_at'),
+        db.Index('ix_tasks_active_patient', 'patient_id', postgresql_where=db.text('active')),
+        db.Index('ix_tasks_claimed_by', 'claimed_by', postgresql_where=db.text('claimed_by IS NOT NULL')),
+        db.Index('ix_tasks_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_tasks_active_patient_created', 'patient_id', 'created_at', 'tid',
+                 postgresql_where=db.text('active')),
+        db.Index('ix_tasks_open_patient_due', 'patient_id', 'due_at',
+                 postgresql_where=db.text(OPEN_TASK_SQL)),
+        db.Index('ix_tasks_next_caretaker', 'caretaker_id', db.text('priority_rank DESC'), 'due_at', 'tid',
+                 postgresql_where=db.text(OPEN_TASK_SQL)),
+        db.Index('ix_tasks_next_patient', 'patient_id', db.text('priority_rank DESC'), 'due_at', 'tid',
+                 postgresql_where=db.text(OPEN_TASK_SQL)),
+    )
 
     tid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
     caretaker_id = db.Column(db.Integer, db.ForeignKey('users.uid'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     due_at = db.Column(db.DateTime)
     status = db.Column(db.Enum(TaskStatus), default=TaskStatus.PENDING, nullable=False)
     priority = db.Column(db.Enum(Priority), default=Priority.MEDIUM, nullable=False)
+    priority_rank = db.Column(db.SmallInteger, db.Computed(PRIORITY_RANK_SQL, persisted=True))
+    claimed_by = db.Column(db.Integer, db.ForeignKey('users.uid', ondelete='SET NULL'))
+    claimed_at = db.Column(db.DateTime)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; drives the /sync delta feed
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
-    patient = db.relationship('Patient', backref='tasks')
-    caretaker = db.relationship('User', backref='tasks')
-    reminders = db.relationship('Reminder', backref='task', cascade="all, delete-orphan")
+    patient = db.relationship('Patient', backref=db.backref('tasks', passive_deletes=True))
+    caretaker = db.relationship('User', backref='tasks', foreign_keys=[caretaker_id])
+    reminders = db.relationship('Reminder', backref='task', cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Reminder(db.Model):
     __tablename__ = 'reminders'
+    __table_args__ = (
+        db.Index('ix_reminders_patient_updated', 'patient_id', 'updated_at'),
+        db.Index('ix_reminders_active_task', 'task_id', postgresql_where=db.text('active')),
+        db.Index('ix_reminders_task', 'task_id'),
+        db.Index('ix_reminders_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_reminders_active_patient_remind', 'patient_id', 'remind_at', 'rid',
+                 postgresql_where=db.text('active')),
+    )
 
     rid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
-    task_id = db.Column(db.Integer, db.ForeignKey('tasks.tid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.tid', ondelete='CASCADE'), nullable=False)
     channel = db.Column(db.String(20))
     remind_at = db.Column(db.DateTime, nullable=False)
     sent = db.Column(db.Boolean, default=False)
     active = db.Column(db.Boolean, default=True)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; drives the /sync delta feed
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
 
 class Resource(db.Model):
     __tablename__ = 'resources'
+    __table_args__ = (
+        db.Index('ix_resources_active_category', 'category', postgresql_where=db.text('active')),
+        db.Index('ix_resources_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_resources_updated', 'updated_at'),
+    )
 
     rid = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -98,64 +141,248 @@ class Resource(db.Model):
     url = db.Column(db.String(500))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; tells the recommendation engine to reload
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
 
 class Condition(db.Model):
     __tablename__ = 'conditions'
+    __table_args__ = (
+        db.Index('ix_conditions_patient_updated', 'patient_id', 'updated_at'),
+        db.Index('ix_conditions_active_patient', 'patient_id', postgresql_where=db.text('active')),
+        db.Index('ix_conditions_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_conditions_active_patient_onset', 'patient_id', 'onset_date', 'cid',
+                 postgresql_where=db.text('active')),
+    )
 
     cid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
     status = db.Column(db.String(50))
     onset_date = db.Column(db.DateTime)
     note = db.Column(db.Text)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; drives the /sync delta feed
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
-    patient = db.relationship('Patient', backref='conditions')
+    patient = db.relationship('Patient', backref=db.backref('conditions', passive_deletes=True))
 
 
 class Medication(db.Model):
     __tablename__ = 'medications'
+    __table_args__ = (
+        db.Index('ix_medications_patient_updated', 'patient_id', 'updated_at'),
+        db.Index('ix_medications_active_patient', 'patient_id', postgresql_where=db.text('active')),
+        db.Index('ix_medications_prescriber', 'prescriber_id', postgresql_where=db.text('prescriber_id IS NOT NULL')),
+        db.Index('ix_medications_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_medications_active_patient_start', 'patient_id', 'start_date', 'mid',
+                 postgresql_where=db.text('active')),
+        db.Index('ix_medications_active_patient_end', 'patient_id', 'end_date', 'mid',
+                 postgresql_where=db.text('active AND end_date IS NOT NULL')),
+    )
 
     mid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
     dose = db.Column(db.String(100))
     schedule_text = db.Column(db.Text)
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
-    prescriber_id = db.Column(db.Integer, db.ForeignKey('users.uid'))
+    prescriber_id = db.Column(db.Integer, db.ForeignKey('users.uid', ondelete='SET NULL'))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; drives the /sync delta feed
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
-    patient = db.relationship('Patient', backref='medications')
-    prescriber = db.relationship('User', backref='prescriptions')
+    patient = db.relationship('Patient', backref=db.backref('medications', passive_deletes=True))
+    prescriber = db.relationship('User', backref=db.backref('prescriptions', passive_deletes=True))
 
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_patient_updated', 'patient_id', 'updated_at'),
+        db.Index('ix_appointments_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ix_appointments_active_patient_start', 'patient_id', 'start_time', 'aid',
+                 postgresql_where=db.text('active')),
+        db.Index('ix_appointments_doctor_updated', 'doctor_id', 'updated_at'),
+        db.Index('ix_appointments_active_doctor_start', 'doctor_id', 'start_time', 'aid',
+                 postgresql_where=db.text('active')),
+    )
 
     aid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.uid'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     location = db.Column(db.String(200))
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+    # Maintained by a database trigger; drives the /sync delta feed
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=UTC_NOW, server_onupdate=db.FetchedValue())
 
-    patient = db.relationship('Patient', backref='appointments')
+    patient = db.relationship('Patient', backref=db.backref('appointments', passive_deletes=True))
     doctor = db.relationship('User', backref='appointments')
 
 
 class Recommendation(db.Model):
     __tablename__ = 'recommendations'
+    __table_args__ = (
+        db.Index('ix_recommendations_active_patient', 'patient_id', postgresql_where=db.text('active')),
+        db.Index('ix_recommendations_patient', 'patient_id'),
+        db.Index('ix_recommendations_inactive_deleted', 'deleted_at', postgresql_where=db.text('NOT active')),
+        db.Index('ux_recommendations_patient_resource', 'patient_id', 'resource_id', unique=True,
+                 postgresql_where=db.text('resource_id IS NOT NULL')),
+    )
 
     rid = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     sources = db.Column(db.Text)
+    # Set on rows written by the batch recommender; hand-written ones have neither.
+    # The batch clears score when it soft-deletes a pair that fell out of the top k
+    resource_id = db.Column(db.Integer, db.ForeignKey('resources.rid'))
+    score = db.Column(db.Float)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deleted_at = db.Column(db.DateTime)
+
+    patient = db.relationship('Patient', backref=db.backref('recommendations', passive_deletes=True))
+
+
+def _track_deactivation(target, value, oldvalue, initiator):
+    """Stamp deleted_at when a row is soft-deleted so the archival job can age it out"""
+    if value is False and oldvalue is not False:
+        target.deleted_at = datetime.utcnow()
+    elif value:
+        target.deleted_at = None
 
-    patient = db.relationship('Patient', backref='recommendations')
\ No newline at end of file
+
+for _model in (Patient, Task, Reminder, Resource, Condition, Medication, Appointment, Recommendation):
+    db.event.listen(_model.active, 'set', _track_deactivation)
+
+class ChatMessage(db.Model):
+    __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'seq', name='uq_chat_messages_session_seq'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    session_id = db.Column(db.String(128), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    content = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PatientStats(db.Model):
+    __tablename__ = 'patient_stats'
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), primary_key=True)
+    open_tasks_low = db.Column(db.Integer, nullable=False, default=0)
+    open_tasks_medium = db.Column(db.Integer, nullable=False, default=0)
+    open_tasks_high = db.Column(db.Integer, nullable=False, default=0)
+    open_tasks_urgent = db.Column(db.Integer, nullable=False, default=0)
+    active_medications = db.Column(db.Integer, nullable=False, default=0)
+    active_appointments = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ConditionStatusChange(db.Model):
+    __tablename__ = 'condition_status_changes'
+    __table_args__ = (
+        db.Index('ix_condition_status_changes_patient_changed', 'patient_id', 'changed_at', 'id'),
+        db.Index('ix_condition_status_changes_condition', 'condition_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the history stays when archival moves the condition to
+    # conditions_archive. The patient cascade still removes it on a purge
+    condition_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), nullable=False)
+    status = db.Column(db.String(50))
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class WellnessAggregate(db.Model):
+    __tablename__ = 'wellness_aggregates'
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.pid', ondelete='CASCADE'), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    series = db.Column(db.JSON, nullable=False)
+    trend = db.Column(db.String(20), nullable=False)
+    slope = db.Column(db.Float)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class JobStatus(enum.Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claimable', db.text('priority DESC'), 'run_after', 'id',
+                 postgresql_where=db.text("status = 'QUEUED'")),
+        db.Index('ix_jobs_running_locked', 'locked_at', postgresql_where=db.text("status = 'RUNNING'")),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    priority = db.Column(db.Integer, default=0, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+
+class AuditEvent(db.Model):
+    """Append-only record of who read or changed what; partitioned by month on occurred_at"""
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_patient_time', 'patient_id', 'occurred_at'),
+        db.Index('ix_audit_log_actor_time', 'actor', 'occurred_at'),
+        {'postgresql_partition_by': 'RANGE (occurred_at)'},
+    )
+
+    id = db.Column(db.BigInteger, db.Sequence('audit_log_id_seq'), primary_key=True)
+    occurred_at = db.Column(db.DateTime, primary_key=True, default=datetime.utcnow)
+    actor = db.Column(db.String(100))
+    ip = db.Column(db.String(64))
+    action = db.Column(db.String(20), nullable=False)
+    resource = db.Column(db.String(50), nullable=False)
+    resource_id = db.Column(db.String(64))
+    # No foreign key: audit rows outlive the rows they describe
+    patient_id = db.Column(db.Integer)
+    method = db.Column(db.String(10))
+    path = db.Column(db.String(500))
+    status = db.Column(db.SmallInteger)
+
+
+class ChangeVersion(db.Model):
+    """
+    Counters bumped by triggers in the writing transaction, so a reader sees a
+    new version exactly when the change is committed. Caches key on these
+    instead of max(updated_at), whose stamps are not in commit order.
+    """
+    __tablename__ = 'change_versions'
+
+    scope = db.Column(db.String(30), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
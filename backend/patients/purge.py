@@ -0,0 +1,151 @@
+"""
+Permanent removal of a patient and everything recorded about them.
+
+The foreign keys cascade, so ``DELETE FROM patients`` alone is correct. For a
+patient with years of history, though, that one statement would delete every
+child row in a single transaction, holding row locks on all of them. This purge
+empties the child tables first, PURGE_BATCH_SIZE rows per committed batch with
+a short pause between batches, deepest tables first so each cascade stays
+small. The final patient delete then only cascades into the few rows left
+(stats, wellness aggregates, anything written meanwhile). Rows already moved to
+the *_archive tables are removed too, as are the patient's finished jobs, whose
+payloads and results hold their data, and the report files those jobs rendered
+(from REPORTS_DIR on the host running the purge).
+
+Chat history is not removed: ``chat_messages`` is keyed by the client's session
+id, with nothing linking it to a patient. Clients clear a conversation with
+``clearHistory``.
+
+The purge's audit event is written in the transaction that deletes the patient,
+so it is kept when the purge runs from the command line.
+
+Run it through the job queue (``DELETE /patients/<pid>?purge=true`` queues a
+``patient_purge`` job) or from the command line:
+
+    python -m patients.purge --patient-id 42
+    python -m patients.purge --user-id 7
+"""
+
+import os
+import time
+
+from sqlalchemy import text
+
+from audit.log import record_now
+from models import db
+from reports.render import artifact_path
+
+BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '1000'))
+BATCH_PAUSE_S = float(os.getenv('PURGE_BATCH_PAUSE_S', '0.05'))
+
+# Children before parents: reminders reference tasks, status changes reference conditions
+PATIENT_TABLES = [
+    ('reminders', 'rid'),
+    ('condition_status_changes', 'id'),
+    ('tasks', 'tid'),
+    ('appointments', 'aid'),
+    ('medications', 'mid'),
+    ('conditions', 'cid'),
+    ('recommendations', 'rid'),
+]
+ARCHIVE_TABLES = ['reminders_archive', 'tasks_archive', 'appointments_archive', 'medications_archive',
+                  'conditions_archive', 'recommendations_archive']
+
+DELETE_PATIENT_SQL = text("DELETE FROM patients WHERE pid = :pid")
+# jobs.payload has no index; a purge is rare enough to scan it. The running
+# purge job itself is left to finish
+DELETE_JOBS_SQL = text("""
+    DELETE FROM jobs WHERE payload->>'patient_id' = :pid AND kind <> 'patient_purge'
+    RETURNING kind, result
+""")
+USER_PATIENT_SQL = text("SELECT pid FROM patients WHERE caretaker_id = :uid")
+DELETE_USER_SQL = text("DELETE FROM users WHERE uid = :uid")
+
+
+def delete_batch(table, pk, patient_id, batch_size=BATCH_SIZE):
+    """Delete one batch of a patient's rows from a table; returns the number deleted"""
+    sql = text(f"""
+        DELETE FROM {table} WHERE {pk} IN (
+            SELECT {pk} FROM {table} WHERE patient_id = :pid LIMIT :batch_size
+        )
+    """)
+    result = db.session.execute(sql, {'pid': patient_id, 'batch_size': batch_size})
+    db.session.commit()
+    return result.rowcount
+
+
+def purge_patient(patient_id, batch_size=BATCH_SIZE):
+    """Delete a patient and all their rows; returns counts per table"""
+    counts = {}
+    for table, pk in PATIENT_TABLES:
+        total = 0
+        while True:
+            deleted = delete_batch(table, pk, patient_id, batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+            time.sleep(BATCH_PAUSE_S)
+        counts[table] = total
+    # Archive tables have no indexes to batch by, and no foreign keys to hold locks on
+    for table in ARCHIVE_TABLES:
+        counts[table] = db.session.execute(text(f"DELETE FROM {table} WHERE patient_id = :pid"),
+                                           {'pid': patient_id}).rowcount
+    jobs = db.session.execute(DELETE_JOBS_SQL, {'pid': str(patient_id)}).all()
+    counts['jobs'] = len(jobs)
+    counts['patients'] = db.session.execute(DELETE_PATIENT_SQL, {'pid': patient_id}).rowcount
+    record_now('purge', 'patients', patient_id, patient_id)
+    db.session.commit()
+    counts['report_files'] = remove_report_files(jobs)
+    return counts
+
+
+def remove_report_files(jobs):
+    """Delete the files rendered by report_render jobs; returns how many were removed"""
+    removed = 0
+    for kind, result in jobs:
+        if kind != 'report_render' or not result:
+            continue
+        try:
+            os.remove(artifact_path(result['hash'], result['format']))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def purge_user(user_id, batch_size=BATCH_SIZE):
+    """
+    Delete a user and their patient's records; returns counts per table.
+
+    Task claims and prescriptions by the user are kept with the user cleared.
+    A user who is still the doctor on appointments, or assigned tasks of
+    another patient, cannot be deleted. The IntegrityError is raised.
+    """
+    counts = {}
+    patient_id = db.session.execute(USER_PATIENT_SQL, {'uid': user_id}).scalar()
+    if patient_id is not None:
+        counts = purge_patient(patient_id, batch_size)
+    counts['users'] = db.session.execute(DELETE_USER_SQL, {'uid': user_id}).rowcount
+    record_now('purge', 'users', user_id)
+    db.session.commit()
+    return counts
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Permanently delete a patient or a user and their records')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--patient-id', type=int)
+    group.add_argument('--user-id', type=int)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        if args.patient_id is not None:
+            counts = purge_patient(args.patient_id, args.batch_size)
+        else:
+            counts = purge_user(args.user_id, args.batch_size)
+    for table, count in counts.items():
+        print(f"Deleted {count} rows from {table}")
@@ -1,10 +1,31 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
-from models import Patient, User, db
+from models import Patient, db
 from datetime import datetime
+from patients.timeline import timeline_page, InvalidCursor, KINDS
+from writes import insert_returning, update_returning, write_error
+from events.hub import emit_change
+from schemas import Schema, Field, accepts, integer, string, boolean
+from jobs import queue
+from sqlalchemy.exc import IntegrityError
+
+DEFAULT_TIMELINE_PAGE = 50
+MAX_TIMELINE_PAGE = 200
 
 patients_bp = Blueprint('patients', __name__)
 
+PATIENT_SCHEMA = Schema({
+    'caretaker_id': Field(integer, required=True),
+    'name': Field(string(100), required=True),
+    'age': Field(integer),
+    'gender': Field(string(20)),
+    'medical_summary': Field(string()),
+    'emergency_contact': Field(string()),
+    'active': Field(boolean, default=True, nullable=False),
+})
+PATIENT_UPDATE_SCHEMA = PATIENT_SCHEMA.partial('name', 'age', 'gender', 'medical_summary', 'emergency_contact',
+                                               'active')
+
 @patients_bp.before_request
 def handle_preflight():
     if request.method == "OPTIONS":
@@ -15,28 +36,14 @@ def handle_preflight():
         return response, 200
 
 @patients_bp.route('/', methods=['POST', 'OPTIONS'])
-def create_patient():
+@accepts(PATIENT_SCHEMA)
+def create_patient(data):
     if request.method == 'OPTIONS':
         return '', 200
-    data = request.get_json()
-    required_fields = ['caretaker_id', 'name']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    caretaker = User.query.get(data['caretaker_id'])
-    if not caretaker:
-        return jsonify({'error': 'Caretaker not found'}), 404
-    patient = Patient(
-        caretaker_id=data['caretaker_id'],
-        name=data['name'],
-        age=data.get('age'),
-        gender=data.get('gender'),
-        medical_summary=data.get('medical_summary'),
-        emergency_contact=data.get('emergency_contact'),
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
-    db.session.add(patient)
+    try:
+        patient = insert_returning(Patient, {**data, 'created_at': datetime.utcnow()})
+    except IntegrityError as e:
+        return write_error(e, {'caretaker_id': 'Caretaker not found'}, conflict='Caretaker already has a patient')
     db.session.commit()
     return jsonify({'message': 'Patient created', 'pid': patient.pid}), 201
 
@@ -60,11 +67,36 @@ def get_patient(pid):
         'created_at': patient.created_at
     })
 
+# Newest-first feed across the patient's records; pass next_cursor back as
+# ?cursor= to scroll further back
+@patients_bp.route('/<int:pid>/timeline', methods=['GET', 'OPTIONS'])
+@jwt_required()
+def get_patient_timeline(pid):
+    if request.method == 'OPTIONS':
+        return '', 200
+    if not db.session.get(Patient, pid):
+        return jsonify({'error': 'Patient not found'}), 404
+    limit = min(max(request.args.get('limit', DEFAULT_TIMELINE_PAGE, type=int), 1), MAX_TIMELINE_PAGE)
+    kinds = None
+    if request.args.get('kinds'):
+        kinds = set(request.args['kinds'].split(','))
+        unknown = kinds - set(KINDS)
+        if unknown:
+            return jsonify({'error': f'Unknown kinds: {", ".join(sorted(unknown))}', 'kinds': KINDS}), 400
+    try:
+        events, next_cursor = timeline_page(db.session, pid, limit, request.args.get('cursor'), kinds)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'events': events, 'next_cursor': next_cursor})
+
 @patients_bp.route('/', methods=['GET', 'OPTIONS'])
 def list_patients():
     if request.method == 'OPTIONS':
         return '', 200
-    patients = Patient.query.all()
+    query = Patient.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    patients = query.all()
     return jsonify([
         {
             'pid': p.pid,
@@ -81,16 +113,15 @@ def list_patients():
 
 @patients_bp.route('/<int:pid>', methods=['PUT', 'OPTIONS'])
 @jwt_required()
-def update_patient(pid):
+@accepts(PATIENT_UPDATE_SCHEMA)
+def update_patient(data, pid):
     if request.method == 'OPTIONS':
         return '', 200
-    patient = Patient.query.get(pid)
-    if not patient:
+    changed = update_returning(Patient, pid, data)
+    if changed is None:
         return jsonify({'error': 'Patient not found'}), 404
-    data = request.get_json()
-    for field in ['name', 'age', 'gender', 'medical_summary', 'emergency_contact', 'active']:
-        if field in data:
-            setattr(patient, field, data[field])
+    _, patient = changed
+    emit_change('patients', 'updated', pid, pid)
     db.session.commit()
     return jsonify({'message': 'Patient updated', 'patient': {
         'pid': patient.pid,
@@ -109,9 +140,13 @@ def update_patient(pid):
 def delete_patient(pid):
     if request.method == 'OPTIONS':
         return '', 200
-    patient = Patient.query.get(pid)
-    if not patient:
+    if update_returning(Patient, pid, {'active': False}) is None:
         return jsonify({'error': 'Patient not found'}), 404
-    db.session.delete(patient)
-    db.session.commit()
-    return jsonify({'message': 'Patient deleted'})
+    if request.args.get('purge') != 'true':
+        db.session.commit()
+        return jsonify({'message': 'Patient deleted'})
+    # Permanent removal runs in the background in small batches; see patients/purge.py
+    job = queue.enqueue('patient_purge', {'patient_id': pid}, priority=5)
+    response = jsonify({'message': 'Patient deleted, purge queued', 'job_id': job.id})
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
@@ -0,0 +1,92 @@
+"""
+Patient timeline: one newest-first feed over a patient's tasks, appointments,
+medication starts and stops, condition onsets and status changes, and reminders.
+
+Each stream reads at most one page from its own (patient_id, timestamp, id)
+index, starting just past the cursor, and Postgres merges the streams. A page
+therefore costs at most (page size x number of streams) index rows, however far
+back the cursor is. The cursor is (timestamp, stream rank, id), which is the
+order of the merged feed.
+"""
+
+from sqlalchemy import text
+
+from sync.routes import encode_token, decode_token
+
+# kind, table, timestamp column, id column, title, detail, has an active flag
+STREAMS = [
+    ('appointment', 'appointments', 'start_time', 'aid', "coalesce(location, 'Appointment')",
+     "json_build_object('end_time', end_time, 'doctor_id', doctor_id)", True),
+    ('condition_onset', 'conditions', 'onset_date', 'cid', "coalesce(status, 'Condition')",
+     "json_build_object('note', note)", True),
+    ('condition_status', 'condition_status_changes', 'changed_at', 'id', "coalesce(status, 'Status change')",
+     "json_build_object('condition_id', condition_id)", False),
+    ('medication_start', 'medications', 'start_date', 'mid', 'name',
+     "json_build_object('dose', dose, 'schedule', schedule_text)", True),
+    ('medication_stop', 'medications', 'end_date', 'mid', 'name',
+     "json_build_object('dose', dose)", True),
+    ('reminder', 'reminders', 'remind_at', 'rid', "coalesce(channel, 'Reminder')",
+     "json_build_object('task_id', task_id, 'sent', sent)", True),
+    ('task', 'tasks', 'created_at', 'tid', 'title',
+     "json_build_object('status', lower(status::text), 'priority', lower(priority::text), 'due_at', due_at)", True),
+]
+KINDS = [stream[0] for stream in STREAMS]
+RANKS = {kind: rank for rank, kind in enumerate(KINDS, start=1)}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(event):
+    return f"{encode_token(event['at'])}:{RANKS[event['kind']]}:{event['id']}"
+
+
+def decode_cursor(cursor):
+    try:
+        ts, rank, row_id = cursor.split(':')
+        return decode_token(ts), int(rank), int(row_id)
+    except (ValueError, OverflowError):
+        raise InvalidCursor(cursor)
+
+
+def stream_sql(rank, kind, table, ts, pk, title, detail, has_active, cursor):
+    conditions = ['patient_id = :pid', f'{ts} IS NOT NULL']
+    if has_active:
+        conditions.append('active')
+    if cursor is not None:
+        _, cursor_rank, _ = cursor
+        # Rows that sort after the cursor in (timestamp DESC, rank DESC, id DESC) order
+        if rank == cursor_rank:
+            conditions.append(f'({ts}, {pk}) < (:cursor_ts, :cursor_id)')
+        elif rank < cursor_rank:
+            conditions.append(f'{ts} <= :cursor_ts')
+        else:
+            conditions.append(f'{ts} < :cursor_ts')
+    return f"""
+        (SELECT '{kind}' AS kind, {rank} AS rank, {ts} AS at, {pk} AS id, {title} AS title, {detail} AS detail
+           FROM {table}
+          WHERE {' AND '.join(conditions)}
+          ORDER BY {ts} DESC, {pk} DESC
+          LIMIT :limit)"""
+
+
+def timeline_page(session, patient_id, limit, cursor=None, kinds=None):
+    """Return (events, next cursor or None) for one page, newest first"""
+    position = decode_cursor(cursor) if cursor else None
+    branches = [
+        stream_sql(RANKS[kind], kind, table, ts, pk, title, detail, has_active, position)
+        for kind, table, ts, pk, title, detail, has_active in STREAMS
+        if kinds is None or kind in kinds
+    ]
+    sql = text(' UNION ALL '.join(branches) + ' ORDER BY at DESC, rank DESC, id DESC LIMIT :limit')
+    params = {'pid': patient_id, 'limit': limit + 1}
+    if position is not None:
+        params['cursor_ts'], _, params['cursor_id'] = position
+    rows = session.execute(sql, params).mappings().all()
+    events = [
+        {'kind': row['kind'], 'at': row['at'], 'id': row['id'], 'title': row['title'], 'detail': row['detail']}
+        for row in rows[:limit]
+    ]
+    next_cursor = encode_cursor(events[-1]) if len(rows) > limit else None
+    return events, next_cursor
@@ -0,0 +1,206 @@
+"""
+Nightly refresh of generated recommendations.
+
+Every active patient is scored against the resource catalog (see
+``recommendations.engine``), and their top RECOMMEND_BATCH_K resources are
+stored as recommendations with ``resource_id`` and ``score`` set. Patients are
+read in pid-ordered chunks of RECOMMEND_CHUNK_SIZE. Each chunk:
+
+- loads its existing generated recommendations with one range query,
+- writes only what changed: one multi-row upsert for new, re-scored or
+  returning pairs, and one UPDATE that soft-deletes pairs that fell out of the
+  top k,
+- commits on its own.
+
+Re-running a chunk that is already current writes nothing, so an interrupted
+range can simply be run again. Hand-written recommendations (no
+``resource_id``) are never touched.
+
+A pair the refresh dropped is soft-deleted with its score cleared, and comes
+back if it ranks again. A caretaker's delete keeps the score and is final, also
+after archival has moved the row to recommendations_archive: those pairs are
+read from there too, so the refresh does not insert them again.
+
+To spread a refresh over the job worker pool, enqueue one
+``recommendations_refresh`` job per pid range:
+
+    python -m recommendations.batch --enqueue --range-size 20000
+    python -m jobs.worker --processes 8
+
+Or run one range in this process, e.g. to resume from a given pid:
+
+    python -m recommendations.batch --from-pid 120001 --to-pid 140000
+"""
+
+from datetime import datetime
+import os
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Recommendation
+from recommendations.engine import engine, profile_text, PROFILES_SQL
+
+BATCH_K = int(os.getenv('RECOMMEND_BATCH_K', '5'))
+MIN_SCORE = float(os.getenv('RECOMMEND_MIN_SCORE', '0.1'))
+CHUNK_SIZE = int(os.getenv('RECOMMEND_CHUNK_SIZE', '2000'))
+RANGE_SIZE = int(os.getenv('RECOMMEND_RANGE_SIZE', '20000'))
+SCORE_EPSILON = 0.001
+MAX_PID = 2 ** 31 - 1
+
+EXISTING_SQL = text("""
+    SELECT rid, patient_id, resource_id, score, active
+    FROM recommendations
+    WHERE resource_id IS NOT NULL AND patient_id BETWEEN :lo AND :hi
+""")
+# Archived pairs a caretaker deleted; ones the refresh dropped have no score
+ARCHIVED_SQL = text("""
+    SELECT rid, patient_id, resource_id, score
+    FROM recommendations_archive
+    WHERE resource_id IS NOT NULL AND score IS NOT NULL AND patient_id BETWEEN :lo AND :hi
+""")
+RESOURCE_TITLES_SQL = text("SELECT rid, title, url FROM resources WHERE rid = ANY(:ids)")
+RETIRE_SQL = text("""
+    UPDATE recommendations SET active = false, deleted_at = :now, score = NULL
+    WHERE rid = ANY(:ids) AND active
+""")
+# First pid of every range_size active patients
+RANGE_STARTS_SQL = text("""
+    SELECT pid FROM (
+        SELECT pid, row_number() OVER (ORDER BY pid) AS n FROM patients WHERE active
+    ) t
+    WHERE n % :size = 1
+    ORDER BY pid
+""")
+
+
+def diff_chunk(ranked, existing):
+    """
+    Compare fresh rankings with stored rows.
+
+    ``ranked`` maps pid -> [(resource id, score)] and ``existing`` maps
+    (pid, resource id) -> (rid, score, active). Returns the (pid, resource id,
+    score) triples to upsert and the rids to soft-delete. An inactive row without
+    a score was dropped by an earlier refresh and is brought back.
+    """
+    upserts, stale = [], []
+    for pid, resources in ranked.items():
+        for resource_id, score in resources:
+            current = existing.get((pid, resource_id))
+            if current is None:
+                upserts.append((pid, resource_id, score))
+            elif current[2] and abs((current[1] or 0.0) - score) >= SCORE_EPSILON:
+                upserts.append((pid, resource_id, score))
+            elif not current[2] and current[1] is None:
+                upserts.append((pid, resource_id, score))
+    wanted = {(pid, resource_id) for pid, resources in ranked.items() for resource_id, _ in resources}
+    for key, (rid, _, active) in existing.items():
+        if active and key not in wanted:
+            stale.append(rid)
+    return upserts, stale
+
+
+def store_upserts(upserts, now):
+    if not upserts:
+        return
+    resources = {rid: (title, url) for rid, title, url in
+                 db.session.execute(RESOURCE_TITLES_SQL, {'ids': sorted({r for _, r, _ in upserts})})}
+    rows = [
+        {'patient_id': pid, 'resource_id': resource_id, 'score': score, 'title': resources[resource_id][0][:200],
+         'sources': resources[resource_id][1], 'active': True, 'created_at': now, 'deleted_at': None}
+        for pid, resource_id, score in upserts if resource_id in resources
+    ]
+    if not rows:
+        return
+    stmt = insert(Recommendation).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Recommendation.patient_id, Recommendation.resource_id],
+        index_where=Recommendation.resource_id.isnot(None),
+        set_={column: stmt.excluded[column] for column in ('score', 'title', 'sources', 'active', 'deleted_at')},
+        # A caretaker's delete is final; a row the refresh dropped has no score
+        where=Recommendation.active | Recommendation.score.is_(None),
+    )
+    db.session.execute(stmt)
+
+
+def refresh_chunk(profiles, catalog, now):
+    """Rank and store one chunk of patient profiles; returns (upserted, removed)"""
+    pids = [row['pid'] for row in profiles]
+    vectors = catalog.vectorize_many([profile_text(row) for row in profiles])
+    ranked = {
+        pid: [(rid, score) for rid, score in resources if score >= MIN_SCORE]
+        for pid, resources in zip(pids, catalog.top_k_many(vectors, BATCH_K))
+    }
+    bounds = {'lo': pids[0], 'hi': pids[-1]}
+    existing = {
+        (row.patient_id, row.resource_id): (row.rid, row.score, False)
+        for row in db.session.execute(ARCHIVED_SQL, bounds)
+    }
+    existing.update(
+        ((row.patient_id, row.resource_id), (row.rid, row.score, row.active))
+        for row in db.session.execute(EXISTING_SQL, bounds)
+    )
+    upserts, stale = diff_chunk(ranked, existing)
+    store_upserts(upserts, now)
+    if stale:
+        db.session.execute(RETIRE_SQL, {'ids': stale, 'now': now})
+    db.session.commit()
+    return len(upserts), len(stale)
+
+
+def refresh_range(from_pid=1, to_pid=MAX_PID, chunk_size=CHUNK_SIZE, progress=None):
+    """Refresh every active patient with from_pid <= pid <= to_pid, one committed chunk at a time"""
+    totals = {'patients': 0, 'upserted': 0, 'removed': 0, 'last_pid': None}
+    after = from_pid - 1
+    while True:
+        profiles = db.session.execute(PROFILES_SQL, {'after': after, 'hi': to_pid, 'limit': chunk_size}).mappings().all()
+        if not profiles:
+            break
+        catalog = engine.catalog(db.session)
+        upserted, removed = refresh_chunk(profiles, catalog, datetime.utcnow())
+        after = profiles[-1]['pid']
+        totals['patients'] += len(profiles)
+        totals['upserted'] += upserted
+        totals['removed'] += removed
+        totals['last_pid'] = after
+        if progress:
+            progress(totals)
+    return totals
+
+
+def plan_ranges(range_size=RANGE_SIZE):
+    """Inclusive (from_pid, to_pid) ranges of about range_size active patients each"""
+    starts = [pid for pid, in db.session.execute(RANGE_STARTS_SQL, {'size': range_size})]
+    ends = [start - 1 for start in starts[1:]] + [MAX_PID]
+    return list(zip(starts, ends))
+
+
+def enqueue_refresh(range_size=RANGE_SIZE):
+    from jobs import queue
+    ranges = plan_ranges(range_size)
+    for from_pid, to_pid in ranges:
+        queue.enqueue('recommendations_refresh', {'from_pid': from_pid, 'to_pid': to_pid})
+    return ranges
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh generated recommendations')
+    parser.add_argument('--enqueue', action='store_true', help='queue one job per pid range instead of running here')
+    parser.add_argument('--range-size', type=int, default=RANGE_SIZE)
+    parser.add_argument('--from-pid', type=int, default=1)
+    parser.add_argument('--to-pid', type=int, default=MAX_PID)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        if args.enqueue:
+            ranges = enqueue_refresh(args.range_size)
+            print(f"Queued {len(ranges)} recommendations_refresh jobs")
+        else:
+            totals = refresh_range(args.from_pid, args.to_pid, args.chunk_size,
+                                   progress=lambda t: print(f"through pid {t['last_pid']}: {t['patients']} patients, "
+                                                            f"{t['upserted']} upserted, {t['removed']} removed"))
+            print(f"Refreshed recommendations for {totals['patients']} patients")
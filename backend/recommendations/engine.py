@@ -0,0 +1,212 @@
+"""
+Resource recommendations by text similarity.
+
+Every active resource (title, category, description) is turned into a
+fixed-width vector with a signed hashing vectorizer. Terms are weighted by
+their IDF over the catalog, and each row is L2-normalized. The rows are kept in
+memory as one float32 matrix of RECOMMEND_DIM columns (about 100 MB for 100k
+resources at the default 256). A patient profile (medical summary, age band,
+active conditions and their notes) is vectorized the same way, and the top k
+resources come from one matrix-vector product and an argpartition.
+
+``recommendations.batch`` scores whole chunks of patients the same way, one
+matrix product per SCORE_BLOCK patients.
+
+The matrix is rebuilt when the catalog version changes. A statement trigger on
+resources bumps it in change_versions inside the writing transaction, so it
+changes exactly when a write commits. max(updated_at) would not do: a row
+stamped earlier can commit after a later one, and the cache would never see it.
+Checking the version is a single primary key probe per request.
+"""
+
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from sqlalchemy import text
+
+DIM = int(os.getenv('RECOMMEND_DIM', '256'))
+FETCH_SIZE = 5000
+# Patients scored per matrix product; the score block is SCORE_BLOCK x resources floats
+SCORE_BLOCK = int(os.getenv('RECOMMEND_SCORE_BLOCK', '64'))
+DEFAULT_K = 5
+MAX_K = 50
+
+TOKEN = re.compile(r'[a-z][a-z0-9]+')
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in is it its of on or the to was were will with
+    this that these those who which into about over under not no patient patients
+""".split())
+
+VERSION_SQL = text("SELECT version FROM change_versions WHERE scope = 'resources' AND owner_id = 0")
+RESOURCES_SQL = text("""
+    SELECT rid, coalesce(category, '') AS category,
+           concat_ws(' ', title, category, category, description) AS body
+    FROM resources
+    WHERE active
+    ORDER BY rid
+""")
+PROFILE_COLUMNS = """
+    p.pid, p.age, p.medical_summary,
+    (SELECT string_agg(concat_ws(' ', c.status, c.note), ' ')
+       FROM conditions c WHERE c.patient_id = p.pid AND c.active) AS conditions
+"""
+PROFILE_SQL = text(f"SELECT {PROFILE_COLUMNS} FROM patients p WHERE p.pid = :pid AND p.active")
+# One keyset page of active patients in (after, hi]
+PROFILES_SQL = text(f"""
+    SELECT {PROFILE_COLUMNS}
+    FROM patients p
+    WHERE p.active AND p.pid > :after AND p.pid <= :hi
+    ORDER BY p.pid
+    LIMIT :limit
+""")
+
+
+def tokens(value):
+    for token in TOKEN.findall(value.lower()):
+        if token in STOPWORDS:
+            continue
+        # Fold simple plurals so "seniors" matches "senior"
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        yield token
+
+
+_buckets = {}
+
+
+def bucket(token):
+    """(column, sign) for a token; the sign halves the bias from hash collisions"""
+    hit = _buckets.get(token)
+    if hit is None:
+        digest = zlib.crc32(token.encode('utf-8'))
+        hit = _buckets[token] = (digest % DIM, 1.0 if digest & 0x80000000 else -1.0)
+    return hit
+
+
+def age_terms(age):
+    if age is None:
+        return ''
+    if age >= 80:
+        return 'senior elderly older adult aging'
+    if age >= 65:
+        return 'senior older adult aging'
+    return 'adult'
+
+
+def profile_text(row):
+    return ' '.join(part for part in (age_terms(row['age']), row['medical_summary'], row['conditions']) if part)
+
+
+class Catalog:
+    """Immutable snapshot of the resource matrix; swapped whole on reload"""
+
+    def __init__(self, version, ids, category_names, category_codes, matrix, idf):
+        self.version = version
+        self.ids = ids
+        self.category_index = {name: code for code, name in enumerate(category_names)}
+        self.category_codes = category_codes
+        self.matrix = matrix
+        self.idf = idf
+
+    @classmethod
+    def load(cls, session, version):
+        ids, categories, rows, cols, signs = [], [], [], [], []
+        result = session.execute(RESOURCES_SQL, execution_options={'yield_per': FETCH_SIZE})
+        for i, (rid, category, body) in enumerate(result):
+            ids.append(rid)
+            categories.append(category.lower())
+            for token in tokens(body):
+                col, sign = bucket(token)
+                rows.append(i)
+                cols.append(col)
+                signs.append(sign)
+        matrix = np.zeros((len(ids), DIM), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)),
+                  np.array(signs, dtype=np.float32))
+        df = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1.0 + len(ids)) / (1.0 + df)) + 1.0).astype(np.float32)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        names, codes = np.unique(np.array(categories, dtype=str), return_inverse=True)
+        return cls(version, np.array(ids, dtype=np.int64), names.tolist(), codes.astype(np.int32), matrix, idf)
+
+    def vectorize(self, value):
+        return self.vectorize_many([value])[0]
+
+    def vectorize_many(self, values):
+        vectors = np.zeros((len(values), DIM), dtype=np.float32)
+        for i, value in enumerate(values):
+            for token in tokens(value):
+                col, sign = bucket(token)
+                vectors[i, col] += sign
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def top_k(self, vector, k, category=None):
+        """[(rid, cosine score)] best first, leaving out resources with no overlap"""
+        if not len(self.ids) or not vector.any():
+            return []
+        scores = self.matrix @ vector
+        if category:
+            code = self.category_index.get(category.lower())
+            if code is None:
+                return []
+            scores[self.category_codes != code] = -np.inf
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(self.ids[i]), round(float(scores[i]), 4)) for i in best if scores[i] > 0]
+
+    def top_k_many(self, vectors, k):
+        """[[(rid, cosine score)]] per row of vectors, SCORE_BLOCK rows per matrix product"""
+        if not len(self.ids):
+            return [[] for _ in range(len(vectors))]
+        k = min(k, len(self.ids))
+        ranked = []
+        for start in range(0, len(vectors), SCORE_BLOCK):
+            scores = vectors[start:start + SCORE_BLOCK] @ self.matrix.T
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind='stable')
+            best = np.take_along_axis(best, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1).astype(np.float64).round(4)
+            ids = self.ids[best]
+            for row_ids, row_scores in zip(ids.tolist(), best_scores.tolist()):
+                ranked.append([(rid, score) for rid, score in zip(row_ids, row_scores) if score > 0])
+        return ranked
+
+
+class Engine:
+    def __init__(self):
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def catalog(self, session):
+        """Current snapshot, reloading it if any resource changed since it was built"""
+        version = session.execute(VERSION_SQL).scalar()
+        catalog = self._catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        with self._lock:
+            # Another thread may have reloaded while this one waited
+            if self._catalog is None or self._catalog.version != version:
+                self._catalog = Catalog.load(session, version)
+            return self._catalog
+
+
+engine = Engine()
+
+
+def recommend_for_patient(session, patient_id, k=DEFAULT_K, category=None):
+    """[(rid, score)] for a patient, or None if the patient does not exist"""
+    profile = session.execute(PROFILE_SQL, {'pid': patient_id}).mappings().first()
+    if profile is None:
+        return None
+    catalog = engine.catalog(session)
+    return catalog.top_k(catalog.vectorize(profile_text(profile)), k, category)
@@ -1,27 +1,27 @@
 from flask import Blueprint, request, jsonify
-from models import Recommendation, Patient, db
+from models import Recommendation, Resource, db
+from writes import insert_returning, update_returning, write_error
+from schemas import Schema, Field, accepts, integer, string, boolean
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 
 recommendations_bp = Blueprint('recommendations', __name__)
 
+RECOMMENDATION_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'title': Field(string(200), required=True),
+    'sources': Field(string()),
+    'active': Field(boolean, default=True, nullable=False),
+})
+RECOMMENDATION_UPDATE_SCHEMA = RECOMMENDATION_SCHEMA.partial('title', 'sources', 'active')
+
 @recommendations_bp.route('/', methods=['POST'])
-def create_recommendation():
-    data = request.get_json()
-    required_fields = ['patient_id', 'title']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    patient = Patient.query.get(data['patient_id'])
-    if not patient:
-        return jsonify({'error': 'Patient not found'}), 404
-    recommendation = Recommendation(
-        patient_id=data['patient_id'],
-        title=data['title'],
-        sources=data.get('sources'),
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
-    db.session.add(recommendation)
+@accepts(RECOMMENDATION_SCHEMA)
+def create_recommendation(data):
+    try:
+        recommendation = insert_returning(Recommendation, {**data, 'created_at': datetime.utcnow()})
+    except IntegrityError as e:
+        return write_error(e, {'patient_id': 'Patient not found'})
     db.session.commit()
     return jsonify({'message': 'Recommendation created', 'rid': recommendation.rid}), 201
 
@@ -35,41 +35,65 @@ def get_recommendation(rid):
         'patient_id': recommendation.patient_id,
         'title': recommendation.title,
         'sources': recommendation.sources,
+        'resource_id': recommendation.resource_id,
+        'score': recommendation.score,
         'active': recommendation.active,
         'created_at': recommendation.created_at
     })
 
 @recommendations_bp.route('/', methods=['GET'])
 def list_recommendations():
-    recommendations = Recommendation.query.all()
+    query = Recommendation.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    recommendations = query.all()
     return jsonify([
         {
             'rid': r.rid,
             'patient_id': r.patient_id,
             'title': r.title,
             'sources': r.sources,
+            'resource_id': r.resource_id,
+            'score': r.score,
             'active': r.active,
             'created_at': r.created_at
         } for r in recommendations
     ])
 
 @recommendations_bp.route('/<int:rid>', methods=['PUT'])
-def update_recommendation(rid):
-    recommendation = Recommendation.query.get(rid)
-    if not recommendation:
+@accepts(RECOMMENDATION_UPDATE_SCHEMA)
+def update_recommendation(data, rid):
+    if update_returning(Recommendation, rid, data) is None:
         return jsonify({'error': 'Recommendation not found'}), 404
-    data = request.get_json()
-    for field in ['title', 'sources', 'active']:
-        if field in data:
-            setattr(recommendation, field, data[field])
     db.session.commit()
     return jsonify({'message': 'Recommendation updated'})
 
 @recommendations_bp.route('/<int:rid>', methods=['DELETE'])
 def delete_recommendation(rid):
-    recommendation = Recommendation.query.get(rid)
-    if not recommendation:
+    if update_returning(Recommendation, rid, {'active': False}) is None:
         return jsonify({'error': 'Recommendation not found'}), 404
-    db.session.delete(recommendation)
     db.session.commit()
     return jsonify({'message': 'Recommendation deleted'})
+
+# Community resources ranked by similarity to the patient's profile
+@recommendations_bp.route('/resources/<int:pid>', methods=['GET'])
+def recommend_resources(pid):
+    # The engine brings in NumPy; load it on the first ranking, not at app startup
+    from recommendations.engine import recommend_for_patient, DEFAULT_K, MAX_K
+    k = request.args.get('k', DEFAULT_K, type=int)
+    if not 1 <= k <= MAX_K:
+        return jsonify({'error': f'k must be between 1 and {MAX_K}'}), 400
+    ranked = recommend_for_patient(db.session, pid, k, request.args.get('category'))
+    if ranked is None:
+        return jsonify({'error': 'Patient not found'}), 404
+    resources = {r.rid: r for r in Resource.query.filter(Resource.rid.in_([rid for rid, _ in ranked]))} if ranked else {}
+    return jsonify([
+        {
+            'rid': rid,
+            'title': resources[rid].title,
+            'category': resources[rid].category,
+            'description': resources[rid].description,
+            'url': resources[rid].url,
+            'score': score
+        } for rid, score in ranked if rid in resources
+    ])
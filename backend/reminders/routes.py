@@ -1,29 +1,36 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from models import Reminder, db
+from events.hub import emit_change
+from writes import insert_returning, write_error
+from schemas import Schema, Field, accepts, integer, string, timestamp
+from sqlalchemy.exc import IntegrityError
 
 reminders_bp = Blueprint('reminders', __name__)
 
+REMINDER_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'task_id': Field(integer, required=True),
+    'channel': Field(string(20)),
+    'remind_at': Field(timestamp, required=True),
+})
+
 @reminders_bp.route('/appointment', methods=['POST'])
-def create_reminder_for_appointment():
-    data = request.get_json()
+@accepts(REMINDER_SCHEMA)
+def create_reminder_for_appointment(data):
     try:
-        reminder = Reminder(
-            patient_id=data['patient_id'],
-            task_id=data.get('task_id'),
-            channel=data.get('channel'),
-            remind_at=data['remind_at'],
-            active=True
-        )
-        db.session.add(reminder)
+        reminder = insert_returning(Reminder, {**data, 'active': True})
+        emit_change('reminders', 'created', reminder.rid, reminder.patient_id)
         db.session.commit()
         return jsonify({'message': 'Reminder created', 'reminder_id': reminder.rid}), 201
+    except IntegrityError as e:
+        return write_error(e, {'patient_id': 'Patient not found', 'task_id': 'Task not found'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @reminders_bp.route('/appointment/<int:appointment_id>', methods=['GET'])
 def get_reminders_for_appointment(appointment_id):
-    reminders = Reminder.query.filter_by(task_id=appointment_id).all()
+    reminders = Reminder.query.filter_by(task_id=appointment_id, active=True).all()
     return jsonify([{
         'rid': r.rid,
         'patient_id': r.patient_id,
@@ -0,0 +1,150 @@
+"""
+Doctor-facing health report documents.
+
+A report is rendered from the patient's health report data plus the notes the
+caretaker and the assistant have left (open tasks and recommendations). Artifacts
+are stored under REPORTS_DIR named by a hash of those inputs and the template
+version, so rendering a patient whose data has not changed reuses the previous
+file. Rendering runs in the job worker (kind ``report_render``).
+
+The web nodes check for and serve the files the job workers write, so
+REPORTS_DIR must be storage they all share (a mounted volume), or the workers
+and the web server must run on the same host.
+
+Report URLs are signed with an HMAC of the file name and an expiry time, like
+the calendar feed tokens, so a link can be opened in a browser without a login
+header and stops working after REPORT_URL_TTL_S.
+"""
+
+from datetime import datetime
+import hashlib
+import hmac
+import importlib.util
+import json
+import os
+import time
+
+from flask import current_app
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from models import Task, TaskStatus, Recommendation
+
+REPORTS_DIR = os.getenv('REPORTS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                    'instance', 'reports'))
+# Bump when report.html changes so existing renders are not reused
+TEMPLATE_VERSION = '1'
+FORMATS = ('html', 'pdf')
+MAX_NOTES = 50
+URL_TTL_S = int(os.getenv('REPORT_URL_TTL_S', '86400'))
+
+_env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
+                   autoescape=select_autoescape(['html']))
+
+
+def pdf_available():
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def report_inputs(patient_id):
+    """Everything the rendered report depends on, or None if the patient does not exist"""
+    from chat.routes import generate_health_report_impl
+    result = generate_health_report_impl(patient_id)
+    if not result.get('success'):
+        return None
+    tasks = (Task.query
+             .filter(Task.patient_id == patient_id, Task.active,
+                     Task.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS]))
+             .order_by(Task.due_at, Task.tid)
+             .limit(MAX_NOTES)
+             .all())
+    recommendations = (Recommendation.query
+                       .filter_by(patient_id=patient_id, active=True)
+                       .order_by(Recommendation.created_at.desc(), Recommendation.rid.desc())
+                       .limit(MAX_NOTES)
+                       .all())
+    return {
+        'patient_id': patient_id,
+        'report': result['report'],
+        'open_tasks': [
+            {
+                'title': t.title,
+                'description': t.description,
+                'due_at': t.due_at.isoformat() if t.due_at else None,
+                'priority': t.priority.value,
+            } for t in tasks
+        ],
+        'recommendations': [
+            {'title': r.title, 'sources': r.sources} for r in recommendations
+        ],
+    }
+
+
+def content_hash(inputs):
+    canonical = json.dumps({'template': TEMPLATE_VERSION, 'inputs': inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def artifact_name(digest, fmt):
+    return f'{digest}.{fmt}'
+
+
+def artifact_path(digest, fmt):
+    return os.path.join(REPORTS_DIR, artifact_name(digest, fmt))
+
+
+def file_token(name, expires):
+    key = (current_app.config.get('JWT_SECRET_KEY') or '').encode('utf-8')
+    return hmac.new(key, f'{name}:{expires}'.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def file_url(name, ttl_s=URL_TTL_S):
+    """Signed URL for a report file, valid for ``ttl_s`` seconds"""
+    expires = int(time.time()) + ttl_s
+    return f'/reports/files/{name}?expires={expires}&token={file_token(name, expires)}'
+
+
+def check_file_token(name, expires, token):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return expires >= time.time() and bool(token) and hmac.compare_digest(file_token(name, expires), token)
+
+
+def render_html(inputs):
+    return _env.get_template('report.html').render(generated_at=datetime.utcnow(), **inputs)
+
+
+def render_pdf(html):
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def render_report(patient_id, fmt='html'):
+    """Render (or reuse) the patient's report and return where to fetch it"""
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of: {", ".join(FORMATS)}')
+    inputs = report_inputs(patient_id)
+    if inputs is None:
+        raise ValueError('Patient not found')
+    digest = content_hash(inputs)
+    path = artifact_path(digest, fmt)
+    cached = os.path.exists(path)
+    if not cached:
+        html = render_html(inputs)
+        write_atomic(path, render_pdf(html) if fmt == 'pdf' else html.encode('utf-8'))
+    return {
+        'patient_id': patient_id,
+        'format': fmt,
+        'hash': digest,
+        'cached': cached,
+        'url': file_url(artifact_name(digest, fmt)),
+    }
@@ -0,0 +1,58 @@
+import os
+import re
+
+from flask import Blueprint, request, jsonify, send_from_directory, abort
+from models import db
+from jobs import queue
+from reports import render
+
+reports_bp = Blueprint('reports', __name__)
+
+ARTIFACT_NAME = re.compile(r'^[0-9a-f]{64}\.(html|pdf)$')
+
+
+# Return the patient's current report, or queue a render if the data changed
+@reports_bp.route('/<int:patient_id>', methods=['POST'])
+def request_report(patient_id):
+    fmt = request.args.get('format', 'html')
+    if fmt not in render.FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(render.FORMATS)}'}), 400
+    if fmt == 'pdf' and not render.pdf_available():
+        return jsonify({'error': 'PDF rendering is not installed on this server'}), 501
+
+    inputs = render.report_inputs(patient_id)
+    if inputs is None:
+        return jsonify({'error': 'Patient not found'}), 404
+    digest = render.content_hash(inputs)
+    if os.path.exists(render.artifact_path(digest, fmt)):
+        return jsonify({
+            'patient_id': patient_id,
+            'format': fmt,
+            'hash': digest,
+            'cached': True,
+            'url': render.file_url(render.artifact_name(digest, fmt)),
+        }), 200
+
+    try:
+        job = queue.enqueue('report_render', {'patient_id': patient_id, 'format': fmt}, priority=10)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    response = jsonify({'patient_id': patient_id, 'format': fmt, 'hash': digest, 'job_id': job.id})
+    response.headers['Location'] = f'/jobs/{job.id}'
+    return response, 202
+
+
+# Artifacts are content-addressed, so they never change once written. They hold
+# patient data: only the browser may keep a copy, and only to revalidate by ETag
+@reports_bp.route('/files/<name>', methods=['GET'])
+def get_report_file(name):
+    if not ARTIFACT_NAME.match(name):
+        abort(404)
+    if not render.check_file_token(name, request.args.get('expires'), request.args.get('token')):
+        return jsonify({'error': 'Invalid or expired report link'}), 403
+    response = send_from_directory(render.REPORTS_DIR, name, conditional=True, max_age=None)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -1,24 +1,24 @@
 from flask import Blueprint, request, jsonify
 from models import Resource, db
+from writes import update_returning
+from schemas import Schema, Field, accepts, string, boolean
 from datetime import datetime
 
 resources_bp = Blueprint('resources', __name__)
 
+RESOURCE_SCHEMA = Schema({
+    'title': Field(string(200), required=True),
+    'category': Field(string(50)),
+    'description': Field(string()),
+    'url': Field(string(500)),
+    'active': Field(boolean, default=True, nullable=False),
+})
+RESOURCE_UPDATE_SCHEMA = RESOURCE_SCHEMA.partial('title', 'category', 'description', 'url', 'active')
+
 @resources_bp.route('/', methods=['POST'])
-def create_resource():
-    data = request.get_json()
-    required_fields = ['title']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    resource = Resource(
-        title=data['title'],
-        category=data.get('category'),
-        description=data.get('description'),
-        url=data.get('url'),
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
+@accepts(RESOURCE_SCHEMA)
+def create_resource(data):
+    resource = Resource(**data, created_at=datetime.utcnow())
     db.session.add(resource)
     db.session.commit()
     return jsonify({'message': 'Resource created', 'rid': resource.rid}), 201
@@ -40,7 +40,10 @@ def get_resource(rid):
 
 @resources_bp.route('/', methods=['GET'])
 def list_resources():
-    resources = Resource.query.all()
+    query = Resource.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    resources = query.all()
     return jsonify([
         {
             'rid': r.rid,
@@ -54,22 +57,16 @@ def list_resources():
     ])
 
 @resources_bp.route('/<int:rid>', methods=['PUT'])
-def update_resource(rid):
-    resource = Resource.query.get(rid)
-    if not resource:
+@accepts(RESOURCE_UPDATE_SCHEMA)
+def update_resource(data, rid):
+    if update_returning(Resource, rid, data) is None:
         return jsonify({'error': 'Resource not found'}), 404
-    data = request.get_json()
-    for field in ['title', 'category', 'description', 'url', 'active']:
-        if field in data:
-            setattr(resource, field, data[field])
     db.session.commit()
     return jsonify({'message': 'Resource updated'})
 
 @resources_bp.route('/<int:rid>', methods=['DELETE'])
 def delete_resource(rid):
-    resource = Resource.query.get(rid)
-    if not resource:
+    if update_returning(Resource, rid, {'active': False}) is None:
         return jsonify({'error': 'Resource not found'}), 404
-    db.session.delete(resource)
     db.session.commit()
     return jsonify({'message': 'Resource deleted'})
@@ -0,0 +1,124 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+When POSTGRES_REPLICAS is set, GET/HEAD requests run against a replica and all
+other requests against the primary (db.RoutingSession does the switching).
+After a successful write, the writer is pinned to the primary for DB_STICKY_S
+seconds so their next reads see their own changes. The pin is broadcast with
+a NOTIFY sent in the request's own transaction just before it commits, so it
+costs no extra connection and is only delivered if the write is.
+
+Some reads must see the primary itself. ``/sync/`` bounds each page by the
+oldest open write transaction in pg_stat_activity, which a replica cannot see,
+so it is listed in PRIMARY_ENDPOINTS.
+
+A writer is identified by JWT identity or caretaker_id when the request has
+one, and by client address only when it has neither. Keying identified writers
+by address too would pin everyone behind the same NAT or proxy.
+"""
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, text
+import os
+import threading
+import time
+
+from db import RoutingSession, replica_engines
+from events.hub import hub
+
+PIN_CHANNEL = 'db_pins'
+STICKY_S = float(os.getenv('DB_STICKY_S', '5'))
+READ_METHODS = {'GET', 'HEAD'}
+# Reads that always go to the primary
+PRIMARY_ENDPOINTS = {'sync.sync'}
+
+_pins = {}
+_lock = threading.Lock()
+
+
+def request_identity():
+    """JWT identity if the request carries a token, else its caretaker_id, else None"""
+    identity = None
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        pass
+    if identity is None:
+        identity = request.args.get('caretaker_id')
+    if identity is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            identity = body.get('caretaker_id')
+    return identity
+
+
+def request_keys():
+    identity = request_identity()
+    if identity is not None:
+        return [f'user:{identity}']
+    return [f'ip:{request.remote_addr}']
+
+
+def pin(keys):
+    until = time.monotonic() + STICKY_S
+    with _lock:
+        for key in keys:
+            _pins[key] = until
+        # Drop expired pins now and then so the dict stays small
+        if len(_pins) > 10000:
+            now = time.monotonic()
+            for key in [k for k, v in _pins.items() if v < now]:
+                del _pins[key]
+
+
+def is_pinned(keys):
+    now = time.monotonic()
+    with _lock:
+        return any(_pins.get(key, 0) > now for key in keys)
+
+
+def handle_pin_notification(payload):
+    pin(payload.split(','))
+
+
+def choose_target():
+    if not replica_engines:
+        return
+    hub.start()
+    if (request.method in READ_METHODS and request.endpoint not in PRIMARY_ENDPOINTS
+            and not is_pinned(request_keys())):
+        g.db_target = 'replica'
+    else:
+        g.db_target = 'primary'
+
+
+def is_write_request():
+    return request.method not in READ_METHODS and request.method != 'OPTIONS'
+
+
+def announce_pin(session):
+    """Queue the pin NOTIFY on a write request's transaction as it commits"""
+    if not replica_engines or not has_request_context() or not is_write_request() or g.get('pin_announced'):
+        return
+    g.pin_announced = True
+    session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                    {'channel': PIN_CHANNEL, 'payload': ','.join(request_keys())})
+
+
+def record_write(response):
+    if not replica_engines:
+        return response
+    if is_write_request() and response.status_code < 400:
+        pin(request_keys())
+    response.headers['X-DB-Target'] = g.get('db_target', 'primary')
+    return response
+
+
+def init_app(app):
+    hub.add_handler(PIN_CHANNEL, handle_pin_notification)
+    if not event.contains(RoutingSession, 'before_commit', announce_pin):
+        event.listen(RoutingSession, 'before_commit', announce_pin)
+    app.before_request(choose_target)
+    app.after_request(record_write)
@@ -3,11 +3,12 @@ Seed script to add sample community resources to the database
 Run this script once to populate initial resources
 """
 
-from main import app
+from main import create_app
 from models import db, Resource
 from datetime import datetime
 
 def seed_resources():
+    app = create_app(with_blueprints=False)
     with app.app_context():
         # Check if resources already exist
         existing = Resource.query.count()
@@ -0,0 +1,70 @@
+"""
+Incremental maintenance of the patient_stats counters.
+
+Blueprints take a snapshot of a row's contribution before and after a write and
+call ``apply_change`` in the same transaction, which upserts only the deltas.
+Time-dependent values (overdue tasks, next appointment) are not stored; they
+are read through partial indexes when the stats are served.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, PatientStats, Priority, TaskStatus
+
+OPEN_STATUSES = (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)
+
+PRIORITY_COLUMNS = {
+    Priority.LOW: 'open_tasks_low',
+    Priority.MEDIUM: 'open_tasks_medium',
+    Priority.HIGH: 'open_tasks_high',
+    Priority.URGENT: 'open_tasks_urgent',
+}
+
+
+def task_snapshot(task):
+    counts = {}
+    if task.active and task.status in OPEN_STATUSES:
+        counts[PRIORITY_COLUMNS[task.priority]] = 1
+    return task.patient_id, counts
+
+
+def medication_snapshot(medication):
+    return medication.patient_id, {'active_medications': 1} if medication.active else {}
+
+
+def appointment_snapshot(appointment):
+    return appointment.patient_id, {'active_appointments': 1} if appointment.active else {}
+
+
+def apply_change(before=None, after=None):
+    """
+    Apply the difference between two snapshots to patient_stats.
+
+    Pass only ``after`` for inserts and only ``before`` for deletes. The caller
+    commits.
+    """
+    deltas = defaultdict(Counter)
+    if before is not None:
+        patient_id, counts = before
+        deltas[patient_id].subtract(counts)
+    if after is not None:
+        patient_id, counts = after
+        deltas[patient_id].update(counts)
+    for patient_id, delta in deltas.items():
+        delta = {column: n for column, n in delta.items() if n}
+        if delta and patient_id is not None:
+            _upsert(patient_id, delta)
+
+
+def _upsert(patient_id, delta):
+    now = datetime.utcnow()
+    stmt = insert(PatientStats).values(patient_id=patient_id, updated_at=now, **delta)
+    update = {column: getattr(PatientStats, column) + stmt.excluded[column] for column in delta}
+    update['updated_at'] = now
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[PatientStats.patient_id],
+        set_=update
+    ))
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text
+from models import db
+
+stats_bp = Blueprint('stats', __name__)
+
+MAX_PATIENTS_PER_REQUEST = 500
+
+PATIENT_STATS_SQL = text("""
+SELECT p.pid AS patient_id,
+       coalesce(s.open_tasks_low, 0) AS open_tasks_low,
+       coalesce(s.open_tasks_medium, 0) AS open_tasks_medium,
+       coalesce(s.open_tasks_high, 0) AS open_tasks_high,
+       coalesce(s.open_tasks_urgent, 0) AS open_tasks_urgent,
+       coalesce(s.active_medications, 0) AS active_medications,
+       coalesce(s.active_appointments, 0) AS active_appointments,
+       (SELECT count(*) FROM tasks t
+         WHERE t.patient_id = p.pid AND t.active AND t.status IN ('PENDING', 'IN_PROGRESS')
+           AND t.due_at < now()) AS overdue_tasks,
+       (SELECT min(a.start_time) FROM appointments a
+         WHERE a.patient_id = p.pid AND a.active AND a.start_time >= now()) AS next_appointment
+FROM patients p
+LEFT JOIN patient_stats s ON s.patient_id = p.pid
+WHERE p.pid = ANY(:ids)
+ORDER BY p.pid
+""")
+
+
+def serialize_stats(row):
+    open_tasks = {
+        'low': row['open_tasks_low'],
+        'medium': row['open_tasks_medium'],
+        'high': row['open_tasks_high'],
+        'urgent': row['open_tasks_urgent'],
+    }
+    return {
+        'patient_id': row['patient_id'],
+        'open_tasks': open_tasks,
+        'open_tasks_total': sum(open_tasks.values()),
+        'overdue_tasks': row['overdue_tasks'],
+        'active_medications': row['active_medications'],
+        'active_appointments': row['active_appointments'],
+        'next_appointment': row['next_appointment'],
+    }
+
+
+def fetch_stats(patient_ids):
+    rows = db.session.execute(PATIENT_STATS_SQL, {'ids': list(patient_ids)}).mappings()
+    return [serialize_stats(row) for row in rows]
+
+
+@stats_bp.route('/patients', methods=['GET'])
+def list_patient_stats():
+    raw_ids = request.args.get('ids', '')
+    try:
+        patient_ids = sorted({int(pid) for pid in raw_ids.split(',') if pid.strip()})
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of patient ids'}), 400
+    if not patient_ids:
+        return jsonify({'error': 'Missing required parameter: ids'}), 400
+    if len(patient_ids) > MAX_PATIENTS_PER_REQUEST:
+        return jsonify({'error': f'At most {MAX_PATIENTS_PER_REQUEST} patients per request'}), 400
+    return jsonify(fetch_stats(patient_ids))
+
+
+@stats_bp.route('/patients/<int:pid>', methods=['GET'])
+def get_patient_stats(pid):
+    stats = fetch_stats([pid])
+    if not stats:
+        return jsonify({'error': 'Patient not found'}), 404
+    return jsonify(stats[0])
@@ -0,0 +1,137 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text, tuple_
+from datetime import datetime, timedelta
+import enum
+import os
+from models import db, Patient, Task, Appointment, Medication, Condition, Reminder
+from archival import ARCHIVE_AFTER_DAYS
+
+sync_bp = Blueprint('sync', __name__)
+
+SYNCED_MODELS = {
+    'tasks': Task,
+    'appointments': Appointment,
+    'medications': Medication,
+    'conditions': Condition,
+    'reminders': Reminder,
+}
+PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '500'))
+# Rows stamped within this window of "now" are left for the next sync, so a
+# transaction that stamped a row but has not committed yet is not skipped
+SAFETY_LAG = timedelta(seconds=float(os.getenv('SYNC_SAFETY_LAG_S', '2')))
+
+# Start of the oldest transaction that has written and not committed yet. Its
+# rows are stamped after this, so nothing from then on is served until it ends.
+# Only sessions of roles this one may inspect are visible (the same role, or one
+# with pg_read_all_stats)
+OLDEST_WRITER_SQL = text("""
+SELECT timezone('utc', min(xact_start)) FROM pg_stat_activity
+WHERE backend_xid IS NOT NULL AND datname = current_database() AND pid <> pg_backend_pid()
+""")
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_token(ts):
+    return str((ts - EPOCH) // ONE_MICROSECOND)
+
+
+def decode_token(token):
+    return EPOCH + timedelta(microseconds=int(token))
+
+
+def encode_position(position):
+    ts, index, pk = position
+    return f'{encode_token(ts)}.{index}.{pk}'
+
+
+def decode_position(token):
+    """
+    A sync token is the last position sent: (updated_at, collection index,
+    primary key). Rows sharing one updated_at are ordered by collection and key,
+    so a page can end inside such a run. A bare timestamp means every row up to it.
+    """
+    ts, *rest = token.split('.')
+    if not rest:
+        return decode_token(ts), len(SYNCED_MODELS), 0
+    index, pk = rest
+    return decode_token(ts), int(index), int(pk)
+
+
+def after(model, index, pk_column, since):
+    """Rows of the collection at ``index`` past the position ``since``"""
+    ts, since_index, since_pk = since
+    if index < since_index:
+        return model.updated_at > ts
+    if index > since_index:
+        return model.updated_at >= ts
+    return tuple_(model.updated_at, pk_column) > tuple_(ts, since_pk)
+
+
+def serialize_row(model, row):
+    data = {}
+    for column in model.__table__.columns:
+        value = getattr(row, column.key)
+        data[column.key] = value.value if isinstance(value, enum.Enum) else value
+    return data
+
+
+@sync_bp.route('/', methods=['GET'])
+def sync():
+    caretaker_id = request.args.get('caretaker_id', type=int)
+    if caretaker_id is None:
+        return jsonify({'error': 'Missing required parameter: caretaker_id'}), 400
+    token = request.args.get('since')
+    try:
+        since = decode_position(token) if token else None
+    except (ValueError, OverflowError):
+        return jsonify({'error': 'Invalid sync token'}), 400
+
+    db_now = db.session.execute(text("SELECT timezone('utc', clock_timestamp())")).scalar()
+    # Tombstones older than the archive horizon are gone; the client must start over
+    if since is not None and since[0] < db_now - timedelta(days=ARCHIVE_AFTER_DAYS):
+        return jsonify({'reset': True, 'error': 'Sync token expired, fetch a full snapshot'}), 410
+    upper = db_now - SAFETY_LAG
+    oldest_writer = db.session.execute(OLDEST_WRITER_SQL).scalar()
+    if oldest_writer is not None:
+        upper = min(upper, oldest_writer - ONE_MICROSECOND)
+
+    patient_ids = [pid for (pid,) in db.session.query(Patient.pid).filter_by(caretaker_id=caretaker_id)]
+    changes = {}
+    # Past every row up to ``upper``
+    next_position = (upper, len(SYNCED_MODELS), 0)
+    has_more = False
+    for index, (name, model) in enumerate(SYNCED_MODELS.items()):
+        changes[name] = {'upserts': [], 'deleted': []}
+        if not patient_ids:
+            continue
+        pk = model.__mapper__.primary_key[0].key
+        pk_column = getattr(model, pk)
+        query = model.query.filter(
+            model.patient_id.in_(patient_ids),
+            model.updated_at <= upper
+        )
+        if since is None:
+            # Initial snapshot: nothing to delete on the client yet
+            query = query.filter(model.active.is_(True))
+        else:
+            query = query.filter(after(model, index, pk_column, since))
+        rows = query.order_by(model.updated_at, pk_column).limit(PAGE_SIZE + 1).all()
+        if len(rows) > PAGE_SIZE:
+            rows = rows[:PAGE_SIZE]
+            has_more = True
+            # Resume after the last row sent, even inside a run of equal timestamps.
+            # Other collections may re-send rows past it, which clients apply twice
+            next_position = min(next_position, (rows[-1].updated_at, index, getattr(rows[-1], pk)))
+        for row in rows:
+            if row.active:
+                changes[name]['upserts'].append(serialize_row(model, row))
+            else:
+                changes[name]['deleted'].append(getattr(row, pk))
+
+    return jsonify({
+        'token': encode_position(next_position),
+        'has_more': has_more,
+        'changes': changes
+    })
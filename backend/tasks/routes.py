@@ -1,9 +1,62 @@
 from flask import Blueprint, request, jsonify
-from models import Task, Patient, User, db, TaskStatus, Priority
+from models import Task, Reminder, db, TaskStatus, Priority
+from stats.counters import apply_change, task_snapshot
+from events.hub import emit_change, emit_changes
+from writes import insert_returning, update_returning, write_error
+from schemas import Schema, Field, accepts, integer, string, boolean, timestamp, choice
 from datetime import datetime
+from sqlalchemy import text, update
+from sqlalchemy.exc import IntegrityError
 
 tasks_bp = Blueprint('tasks', __name__)
 
+TASK_REFERENCES = {'patient_id': 'Patient not found', 'caretaker_id': 'Caretaker not found'}
+
+TASK_SCHEMA = Schema({
+    'patient_id': Field(integer, required=True),
+    'caretaker_id': Field(integer, required=True),
+    'title': Field(string(200), required=True),
+    'description': Field(string()),
+    'due_at': Field(timestamp),
+    'status': Field(choice(TaskStatus), default=TaskStatus.PENDING, nullable=False),
+    'priority': Field(choice(Priority), default=Priority.MEDIUM, nullable=False),
+    'active': Field(boolean, default=True, nullable=False),
+})
+TASK_UPDATE_SCHEMA = TASK_SCHEMA.partial('title', 'description', 'due_at', 'status', 'priority', 'active')
+CLAIM_SCHEMA = Schema({'caretaker_id': Field(integer, required=True)})
+
+DEFAULT_NEXT_TASKS = 10
+MAX_NEXT_TASKS = 100
+
+# Served by ix_tasks_next_caretaker / ix_tasks_next_patient: an index range scan
+# that stops after :limit rows
+NEXT_TASKS_SQL = """
+SELECT tid, patient_id, caretaker_id, title, description, due_at, status, priority, claimed_by, claimed_at
+FROM tasks
+WHERE {scope} = :scope_id
+  AND active AND status IN ('PENDING', 'IN_PROGRESS')
+  AND (claimed_by IS NULL OR claimed_by = :caretaker_id)
+ORDER BY priority_rank DESC, due_at, tid
+LIMIT :limit
+"""
+NEXT_TASKS_BY_CARETAKER_SQL = text(NEXT_TASKS_SQL.format(scope='caretaker_id'))
+NEXT_TASKS_BY_PATIENT_SQL = text(NEXT_TASKS_SQL.format(scope='patient_id'))
+
+CLAIM_TASK_SQL = text("""
+UPDATE tasks
+SET claimed_by = :caretaker_id, claimed_at = timezone('utc', now()), status = 'IN_PROGRESS'
+WHERE tid = :tid AND active AND status IN ('PENDING', 'IN_PROGRESS')
+  AND (claimed_by IS NULL OR claimed_by = :caretaker_id)
+RETURNING tid, patient_id
+""")
+
+RELEASE_TASK_SQL = text("""
+UPDATE tasks
+SET claimed_by = NULL, claimed_at = NULL, status = 'PENDING'
+WHERE tid = :tid AND claimed_by = :caretaker_id AND status = 'IN_PROGRESS'
+RETURNING tid, patient_id
+""")
+
 @tasks_bp.before_request
 def handle_preflight():
     if request.method == "OPTIONS":
@@ -14,41 +67,85 @@ def handle_preflight():
         return response, 200
 
 @tasks_bp.route('/', methods=['POST', 'OPTIONS'])
-def create_task():
+@accepts(TASK_SCHEMA)
+def create_task(data):
     if request.method == 'OPTIONS':
         return '', 200
-    data = request.get_json()
-    required_fields = ['patient_id', 'caretaker_id', 'title']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    patient = Patient.query.get(data['patient_id'])
-    caretaker = User.query.get(data['caretaker_id'])
-    if not patient or not caretaker:
-        return jsonify({'error': 'Patient or caretaker not found'}), 404
     try:
-        status = TaskStatus(data.get('status', 'pending'))
-    except Exception:
-        status = TaskStatus.PENDING
-    try:
-        priority = Priority(data.get('priority', 'medium'))
-    except Exception:
-        priority = Priority.MEDIUM
-    task = Task(
-        patient_id=data['patient_id'],
-        caretaker_id=data['caretaker_id'],
-        title=data['title'],
-        description=data.get('description'),
-        due_at=data.get('due_at'),
-        status=status,
-        priority=priority,
-        active=data.get('active', True),
-        created_at=datetime.utcnow()
-    )
-    db.session.add(task)
+        task = insert_returning(Task, {**data, 'created_at': datetime.utcnow()})
+    except IntegrityError as e:
+        return write_error(e, TASK_REFERENCES)
+    apply_change(after=task_snapshot(task))
+    emit_change('tasks', 'created', task.tid, task.patient_id)
     db.session.commit()
     return jsonify({'message': 'Task created', 'tid': task.tid}), 201
 
+# What to do next: open tasks ranked by urgency, then due date. Without patient_id
+# the queue is the caretaker's own tasks; with it, the patient's whole household
+# queue. Tasks claimed by someone else are left out.
+@tasks_bp.route('/next', methods=['GET', 'OPTIONS'])
+def next_tasks():
+    if request.method == 'OPTIONS':
+        return '', 200
+    caretaker_id = request.args.get('caretaker_id', type=int)
+    if caretaker_id is None:
+        return jsonify({'error': 'Missing required parameter: caretaker_id'}), 400
+    patient_id = request.args.get('patient_id', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_NEXT_TASKS, type=int), 1), MAX_NEXT_TASKS)
+    if patient_id is None:
+        sql, scope_id = NEXT_TASKS_BY_CARETAKER_SQL, caretaker_id
+    else:
+        sql, scope_id = NEXT_TASKS_BY_PATIENT_SQL, patient_id
+    rows = db.session.execute(sql, {'scope_id': scope_id, 'caretaker_id': caretaker_id, 'limit': limit}).mappings()
+    return jsonify([
+        {
+            'tid': row['tid'],
+            'patient_id': row['patient_id'],
+            'caretaker_id': row['caretaker_id'],
+            'title': row['title'],
+            'description': row['description'],
+            'due_at': row['due_at'],
+            'status': TaskStatus[row['status']].value,
+            'priority': Priority[row['priority']].value,
+            'claimed_by': row['claimed_by'],
+            'claimed_at': row['claimed_at']
+        } for row in rows
+    ])
+
+@tasks_bp.route('/<int:tid>/claim', methods=['POST', 'OPTIONS'])
+@accepts(CLAIM_SCHEMA)
+def claim_task(data, tid):
+    if request.method == 'OPTIONS':
+        return '', 200
+    # One conditional UPDATE, so of two concurrent claims exactly one wins
+    claimed = db.session.execute(CLAIM_TASK_SQL, {'tid': tid, 'caretaker_id': data['caretaker_id']}).first()
+    if claimed is None:
+        db.session.rollback()
+        task = Task.query.get(tid)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        if task.active and task.status in (TaskStatus.PENDING, TaskStatus.IN_PROGRESS):
+            return jsonify({'error': 'Task already claimed', 'claimed_by': task.claimed_by}), 409
+        return jsonify({'error': 'Task is not open'}), 409
+    emit_change('tasks', 'updated', claimed.tid, claimed.patient_id)
+    db.session.commit()
+    return jsonify({'message': 'Task claimed', 'tid': tid, 'claimed_by': data['caretaker_id']})
+
+@tasks_bp.route('/<int:tid>/claim', methods=['DELETE'])
+def release_task(tid):
+    caretaker_id = request.args.get('caretaker_id', type=int)
+    if caretaker_id is None:
+        return jsonify({'error': 'Missing required parameter: caretaker_id'}), 400
+    released = db.session.execute(RELEASE_TASK_SQL, {'tid': tid, 'caretaker_id': caretaker_id}).first()
+    if released is None:
+        db.session.rollback()
+        if not Task.query.get(tid):
+            return jsonify({'error': 'Task not found'}), 404
+        return jsonify({'error': 'Task is not claimed by this caretaker'}), 409
+    emit_change('tasks', 'updated', released.tid, released.patient_id)
+    db.session.commit()
+    return jsonify({'message': 'Task released', 'tid': tid})
+
 @tasks_bp.route('/<int:tid>', methods=['GET', 'OPTIONS'])
 def get_task(tid):
     if request.method == 'OPTIONS':
@@ -73,7 +170,10 @@ def get_task(tid):
 def list_tasks():
     if request.method == 'OPTIONS':
         return '', 200
-    tasks = Task.query.all()
+    query = Task.query
+    if request.args.get('include_inactive') != 'true':
+        query = query.filter_by(active=True)
+    tasks = query.all()
     return jsonify([
         {
             'tid': t.tid,
@@ -90,26 +190,19 @@ def list_tasks():
     ])
 
 @tasks_bp.route('/<int:tid>', methods=['PUT', 'OPTIONS'])
-def update_task(tid):
+@accepts(TASK_UPDATE_SCHEMA)
+def update_task(data, tid):
     if request.method == 'OPTIONS':
         return '', 200
-    task = Task.query.get(tid)
-    if not task:
+    try:
+        changed = update_returning(Task, tid, data)
+    except IntegrityError as e:
+        return write_error(e, TASK_REFERENCES)
+    if changed is None:
         return jsonify({'error': 'Task not found'}), 404
-    data = request.get_json()
-    for field in ['title', 'description', 'due_at', 'active']:
-        if field in data:
-            setattr(task, field, data[field])
-    if 'status' in data:
-        try:
-            task.status = TaskStatus(data['status'])
-        except Exception:
-            pass
-    if 'priority' in data:
-        try:
-            task.priority = Priority(data['priority'])
-        except Exception:
-            pass
+    before, task = changed
+    apply_change(task_snapshot(before), task_snapshot(task))
+    emit_change('tasks', 'updated', task.tid, task.patient_id)
     db.session.commit()
     return jsonify({'message': 'Task updated'})
 
@@ -117,9 +210,16 @@ def update_task(tid):
 def delete_task(tid):
     if request.method == 'OPTIONS':
         return '', 200
-    task = Task.query.get(tid)
-    if not task:
+    changed = update_returning(Task, tid, {'active': False})
+    if changed is None:
         return jsonify({'error': 'Task not found'}), 404
-    db.session.delete(task)
+    before, task = changed
+    reminder_ids = db.session.execute(
+        update(Reminder).where(Reminder.task_id == tid, Reminder.active.is_(True))
+        .values(active=False, deleted_at=datetime.utcnow()).returning(Reminder.rid)
+    ).scalars().all()
+    apply_change(task_snapshot(before), task_snapshot(task))
+    emit_change('tasks', 'deleted', task.tid, task.patient_id)
+    emit_changes('reminders', 'deleted', reminder_ids, task.patient_id)
     db.session.commit()
     return jsonify({'message': 'Task deleted'})
@@ -0,0 +1,267 @@
+"""
+Wellness trend engine.
+
+Bins condition status changes, task completion and appointments into daily
+series for every active patient, derives a composite wellness score and its
+recent trend with vectorized NumPy over a (patients x days) matrix, and stores
+chart-ready daily and weekly series in wellness_aggregates.
+
+Run it on a schedule:
+
+    python -m wellness.engine
+"""
+
+from datetime import date, datetime, timedelta
+import os
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, WellnessAggregate
+
+WINDOW_DAYS = 91  # 13 whole weeks
+ROLLING_DAYS = 7
+TREND_DAYS = 28
+TREND_EPSILON = float(os.getenv('WELLNESS_TREND_EPSILON', '0.01'))
+CHUNK_SIZE = int(os.getenv('WELLNESS_CHUNK_SIZE', '5000'))
+
+CONDITION_WEIGHT = 1.0
+ADHERENCE_WEIGHT = 1.0
+NEW_CONDITION_SCORE = -1.0
+STATUS_SCORES = {
+    'resolved': 1.0,
+    'recovered': 1.0,
+    'improving': 1.0,
+    'improved': 1.0,
+    'stable': 0.0,
+    'active': 0.0,
+    'managed': 0.0,
+    'chronic': 0.0,
+    'worsening': -1.0,
+    'declining': -1.0,
+    'deteriorating': -1.0,
+    'severe': -1.0,
+    'critical': -2.0,
+}
+
+ACTIVE_PATIENTS_SQL = text("SELECT pid FROM patients WHERE active ORDER BY pid")
+
+TASK_BINS_SQL = text("""
+SELECT patient_id, due_at::date AS day,
+       count(*) AS due,
+       count(*) FILTER (WHERE status = 'COMPLETED') AS completed
+FROM tasks
+WHERE active AND status <> 'CANCELLED'
+  AND due_at >= :start AND due_at < :end
+  AND patient_id BETWEEN :lo AND :hi
+GROUP BY 1, 2
+""")
+
+APPOINTMENT_BINS_SQL = text("""
+SELECT patient_id, start_time::date AS day, count(*) AS n
+FROM appointments
+WHERE active AND start_time >= :start AND start_time < :end
+  AND patient_id BETWEEN :lo AND :hi
+GROUP BY 1, 2
+""")
+
+CONDITION_CHANGES_SQL = text("""
+SELECT patient_id, changed_at::date AS day, status,
+       lag(status) OVER (PARTITION BY condition_id ORDER BY changed_at, id) AS prev_status,
+       row_number() OVER (PARTITION BY condition_id ORDER BY changed_at, id) = 1 AS is_onset
+FROM condition_status_changes
+WHERE changed_at < :end AND patient_id BETWEEN :lo AND :hi
+""")
+
+
+def status_score(status):
+    return STATUS_SCORES.get((status or '').strip().lower(), 0.0)
+
+
+def _scatter(rows, pids, start, days, value_columns):
+    """Accumulate (patient_id, day, *values) rows into (len(pids), days) arrays"""
+    out = [np.zeros((len(pids), days)) for _ in value_columns]
+    if not rows:
+        return out
+    patient_ids = np.array([row[0] for row in rows])
+    day_offsets = np.array([(row[1] - start).days for row in rows])
+    rows_idx = np.searchsorted(pids, patient_ids)
+    # Drop rows for patients outside this chunk (e.g. inactive ones inside the pid range)
+    keep = (rows_idx < len(pids)) & (pids[np.minimum(rows_idx, len(pids) - 1)] == patient_ids)
+    # Changes before the window still count towards the starting level
+    day_idx = np.clip(day_offsets, 0, days - 1)
+    for arr, column in zip(out, value_columns):
+        values = np.array([row[column] for row in rows], dtype=float)
+        np.add.at(arr, (rows_idx[keep], day_idx[keep]), values[keep])
+    return out
+
+
+def rolling_sum(arr, window):
+    csum = np.cumsum(arr, axis=1)
+    shifted = np.zeros_like(csum)
+    shifted[:, window:] = csum[:, :-window]
+    return csum - shifted
+
+
+def trend_slopes(values, window):
+    """Least-squares slope of the last ``window`` columns of each row, ignoring NaNs"""
+    y = values[:, -window:]
+    mask = ~np.isnan(y)
+    x = np.broadcast_to(np.arange(window, dtype=float), y.shape)
+    y = np.where(mask, y, 0.0)
+    n = mask.sum(axis=1)
+    sx = (x * mask).sum(axis=1)
+    sy = y.sum(axis=1)
+    sxx = (x * x * mask).sum(axis=1)
+    sxy = (x * y).sum(axis=1)
+    denom = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(denom > 0, (n * sxy - sx * sy) / denom, np.nan)
+    return slope
+
+
+def classify(slopes, has_data):
+    labels = np.full(slopes.shape, 'stable', dtype=object)
+    labels[slopes > TREND_EPSILON] = 'improving'
+    labels[slopes < -TREND_EPSILON] = 'declining'
+    labels[~has_data | np.isnan(slopes)] = 'unknown'
+    return labels
+
+
+def compute_chunk(pids, start, days, task_rows, appointment_rows, condition_rows):
+    """Compute daily and weekly series for one chunk of patients"""
+    tasks_due, tasks_completed = _scatter(task_rows, pids, start, days, (2, 3))
+    (appointments,) = _scatter(appointment_rows, pids, start, days, (2,))
+    condition_deltas = []
+    for patient_id, day, status, prev_status, is_onset in condition_rows:
+        if is_onset:
+            delta = NEW_CONDITION_SCORE + status_score(status)
+        else:
+            delta = status_score(status) - status_score(prev_status)
+        condition_deltas.append((patient_id, day, delta))
+    (condition_delta,) = _scatter(condition_deltas, pids, start, days, (2,))
+    condition_level = np.cumsum(condition_delta, axis=1)
+
+    due_7d = rolling_sum(tasks_due, ROLLING_DAYS)
+    completed_7d = rolling_sum(tasks_completed, ROLLING_DAYS)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        adherence = np.where(due_7d > 0, completed_7d / due_7d, np.nan)
+    # Days without due tasks take the patient's average adherence so they don't drag the score
+    no_tasks = np.isnan(adherence).all(axis=1)
+    mean_adherence = np.full(len(pids), 0.5)
+    mean_adherence[~no_tasks] = np.nanmean(adherence[~no_tasks], axis=1)
+    filled = np.where(np.isnan(adherence), mean_adherence[:, None], adherence)
+    wellness = CONDITION_WEIGHT * condition_level + ADHERENCE_WEIGHT * filled
+
+    has_data = (tasks_due.sum(axis=1) + appointments.sum(axis=1) + np.abs(condition_delta).sum(axis=1)) > 0
+    daily_slopes = trend_slopes(wellness, TREND_DAYS)
+    daily_trend = classify(daily_slopes, has_data)
+
+    weeks = days // 7
+    def by_week(arr):
+        return arr[:, -weeks * 7:].reshape(len(pids), weeks, 7)
+    weekly_due = by_week(tasks_due).sum(axis=2)
+    weekly_completed = by_week(tasks_completed).sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weekly_adherence = np.where(weekly_due > 0, weekly_completed / weekly_due, np.nan)
+    weekly_wellness = by_week(wellness).mean(axis=2)
+    weekly_slopes = trend_slopes(weekly_wellness, TREND_DAYS // 7) / 7
+
+    return {
+        'day': {
+            'dates': [(start + timedelta(days=i)).isoformat() for i in range(days)],
+            'tasks_due': tasks_due,
+            'tasks_completed': tasks_completed,
+            'adherence': adherence,
+            'appointments': appointments,
+            'condition_level': condition_level,
+            'wellness': wellness,
+            'slope': daily_slopes,
+            'trend': daily_trend,
+        },
+        'week': {
+            'dates': [(start + timedelta(days=days - weeks * 7 + 7 * i)).isoformat() for i in range(weeks)],
+            'tasks_due': weekly_due,
+            'tasks_completed': weekly_completed,
+            'adherence': weekly_adherence,
+            'appointments': by_week(appointments).sum(axis=2),
+            'condition_level': by_week(condition_level)[:, :, -1],
+            'wellness': weekly_wellness,
+            'slope': weekly_slopes,
+            'trend': classify(weekly_slopes, has_data),
+        },
+    }
+
+
+SERIES_KEYS = ('tasks_due', 'tasks_completed', 'adherence', 'appointments', 'condition_level', 'wellness')
+
+
+def _series_json(values):
+    rounded = np.round(values, 3)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+def build_rows(pids, start, aggregates, computed_at):
+    rows = []
+    for granularity, agg in aggregates.items():
+        for i, pid in enumerate(pids.tolist()):
+            series = {'dates': agg['dates']}
+            for key in SERIES_KEYS:
+                series[key] = _series_json(agg[key][i])
+            slope = agg['slope'][i]
+            rows.append({
+                'patient_id': pid,
+                'granularity': granularity,
+                'start_date': date.fromisoformat(agg['dates'][0]) if agg['dates'] else start,
+                'series': series,
+                'trend': agg['trend'][i],
+                'slope': None if np.isnan(slope) else round(float(slope), 5),
+                'computed_at': computed_at,
+            })
+    return rows
+
+
+def store_rows(rows):
+    if not rows:
+        return
+    stmt = insert(WellnessAggregate).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WellnessAggregate.patient_id, WellnessAggregate.granularity],
+        set_={column: stmt.excluded[column] for column in ('start_date', 'series', 'trend', 'slope', 'computed_at')}
+    )
+    db.session.execute(stmt)
+
+
+def recompute_patients(pids, today=None):
+    """Recompute and store aggregates for the given sorted patient ids"""
+    pids = np.asarray(pids)
+    if not len(pids):
+        return 0
+    today = today or datetime.utcnow().date()
+    start = today - timedelta(days=WINDOW_DAYS - 1)
+    end = today + timedelta(days=1)
+    params = {'start': start, 'end': end, 'lo': int(pids[0]), 'hi': int(pids[-1])}
+    task_rows = db.session.execute(TASK_BINS_SQL, params).all()
+    appointment_rows = db.session.execute(APPOINTMENT_BINS_SQL, params).all()
+    condition_rows = db.session.execute(CONDITION_CHANGES_SQL, params).all()
+    aggregates = compute_chunk(pids, start, WINDOW_DAYS, task_rows, appointment_rows, condition_rows)
+    store_rows(build_rows(pids, start, aggregates, datetime.utcnow()))
+    db.session.commit()
+    return len(pids)
+
+
+def recompute_all(chunk_size=CHUNK_SIZE):
+    """Recompute aggregates for every active patient, one pid-ordered chunk at a time"""
+    pids = [row[0] for row in db.session.execute(ACTIVE_PATIENTS_SQL)]
+    total = 0
+    for i in range(0, len(pids), chunk_size):
+        total += recompute_patients(pids[i:i + chunk_size])
+    return total
+
+
+if __name__ == '__main__':
+    from main import create_app
+    with create_app(with_blueprints=False).app_context():
+        count = recompute_all()
+        print(f"Recomputed wellness trends for {count} patients")
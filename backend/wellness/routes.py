@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from models import WellnessAggregate
+
+wellness_bp = Blueprint('wellness', __name__)
+
+GRANULARITIES = ('day', 'week')
+
+
+@wellness_bp.route('/<int:pid>', methods=['GET'])
+def get_wellness(pid):
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of: {", ".join(GRANULARITIES)}'}), 400
+    aggregate = WellnessAggregate.query.get((pid, granularity))
+    if not aggregate:
+        return jsonify({'error': 'Wellness trend not computed for this patient yet'}), 404
+    return jsonify({
+        'patient_id': aggregate.patient_id,
+        'granularity': aggregate.granularity,
+        'start_date': aggregate.start_date.isoformat(),
+        'trend': aggregate.trend,
+        'slope': aggregate.slope,
+        'series': aggregate.series,
+        'computed_at': aggregate.computed_at
+    })
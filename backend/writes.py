@@ -0,0 +1,100 @@
+"""
+Single-statement writes for the CRUD routes.
+
+Creates are one ``INSERT ... RETURNING``. The foreign keys check that the
+patient or user exists, so the route does not look them up first. Updates and
+soft deletes are one ``UPDATE ... FROM (SELECT ... FOR UPDATE) ... RETURNING``,
+which returns the row as it was before and after the change. The stats counters
+need both. ``write_error`` turns the constraint violations into 404/409/400
+responses.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import jsonify
+from sqlalchemy import func, insert, select, update
+
+from models import db
+
+# SQLSTATE codes
+NOT_NULL_VIOLATION = '23502'
+FOREIGN_KEY_VIOLATION = '23503'
+UNIQUE_VIOLATION = '23505'
+CHECK_VIOLATION = '23514'
+
+
+def insert_returning(model, values):
+    """
+    Insert one row; returns it with every column, defaults included.
+
+    A row created with ``active`` false gets ``deleted_at`` stamped, like
+    ``update_returning`` does, so the archival job can age it out.
+    """
+    table = model.__table__
+    if values.get('active') is False and 'deleted_at' in table.c:
+        values = dict(values, deleted_at=datetime.utcnow())
+    row = db.session.execute(insert(table).values(**values).returning(*table.columns)).mappings().one()
+    return SimpleNamespace(**row)
+
+
+def update_returning(model, key, values):
+    """
+    Update one row by primary key; returns (before, after) or None if there is
+    no such row.
+
+    Setting ``active`` stamps or clears ``deleted_at`` the way the ORM listener
+    in models does.
+    """
+    table = model.__table__
+    pk = table.primary_key.columns[0]
+    if not values:
+        row = db.session.execute(select(table).where(pk == key)).mappings().first()
+        return None if row is None else (SimpleNamespace(**row), SimpleNamespace(**row))
+    values = dict(values)
+    if 'active' in values and 'deleted_at' in table.c:
+        values['deleted_at'] = None if values['active'] else func.coalesce(table.c.deleted_at, datetime.utcnow())
+    # FOR UPDATE makes a concurrent writer's change visible here, so the old values
+    # are the ones this update actually replaces
+    old = select(table).where(pk == key).with_for_update().subquery('old')
+    stmt = (
+        update(table)
+        .where(pk == old.c[pk.name])
+        .values(**values)
+        .returning(*(old.c[c.name].label(f'old_{c.name}') for c in table.columns), *table.columns)
+    )
+    row = db.session.execute(stmt).mappings().first()
+    if row is None:
+        return None
+    before = SimpleNamespace(**{c.name: row[f'old_{c.name}'] for c in table.columns})
+    after = SimpleNamespace(**{c.name: row[c.name] for c in table.columns})
+    return before, after
+
+
+def write_error(error, not_found=None, conflict=None):
+    """
+    Roll back and answer an IntegrityError from a write.
+
+    ``not_found`` maps a foreign key column to the 404 message for it, and
+    ``conflict`` the message for a unique violation.
+    """
+    db.session.rollback()
+    orig = getattr(error, 'orig', None)
+    code = getattr(orig, 'pgcode', None)
+    diag = getattr(orig, 'diag', None)
+    constraint = getattr(diag, 'constraint_name', None) or ''
+    column = getattr(diag, 'column_name', None)
+    if code == FOREIGN_KEY_VIOLATION:
+        for fk_column, message in (not_found or {}).items():
+            # Postgres names unnamed foreign keys <table>_<column>_fkey
+            if constraint.endswith(f'_{fk_column}_fkey'):
+                return jsonify({'error': message}), 404
+        return jsonify({'error': 'Referenced record not found'}), 404
+    if code == UNIQUE_VIOLATION:
+        return jsonify({'error': conflict or 'Record already exists'}), 409
+    if code == NOT_NULL_VIOLATION:
+        return jsonify({'error': f'Missing required field: {column}' if column else 'Missing required field'}), 400
+    if code == CHECK_VIOLATION:
+        return jsonify({'error': 'Invalid value'}), 400
+    raise error
+
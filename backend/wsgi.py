@@ -0,0 +1,44 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``gunicorn.conf.py`` preloads this module in the master process by default. It
+builds the app once and imports the modules that routes otherwise load on first
+use (the model SDK, NumPy), so the forked workers share those pages copy-on-write
+instead of each importing its own copy. ``reset_after_fork`` runs in each worker
+and drops anything that must not be shared across processes.
+"""
+
+import importlib
+import os
+
+from main import create_app
+
+# Imported lazily by the routes to keep startup fast; worth paying once in the
+# master when workers are forked from it
+WARM_MODULES = ['google.genai', 'google.genai.types', 'numpy', 'recommendations.engine']
+
+app = create_app()
+
+
+def warm_imports():
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def reset_after_fork():
+    """Give a forked worker its own database connections"""
+    from db import db, replica_engines
+    with app.app_context():
+        # close=False leaves the parent's sockets alone and just forgets them
+        db.engine.dispose(close=False)
+    for engine in replica_engines:
+        engine.dispose(close=False)
+
+
+if os.getenv('WEB_WARM_IMPORTS', '1') == '1':
+    warm_imports()